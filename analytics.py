@@ -0,0 +1,256 @@
+# analytics.py — аналитика прогресса по разобранной истории
+from datetime import date
+
+import numpy as np
+
+from workout_history import WorkoutHistory
+
+
+# -----------------------------
+# Кэш результатов по версии данных
+# -----------------------------
+_CACHE: dict[tuple, tuple] = {}
+
+
+def _cached(athlete_name: str, history: WorkoutHistory, key: tuple, compute):
+    """
+    Результат пересчитывается только если история атлета изменилась
+    (другой объект или другая version) или наступил новый день.
+    """
+    stamp = (id(history), history.version, date.today())
+    cache_key = (athlete_name,) + key
+    hit = _CACHE.get(cache_key)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+
+    result = compute(history)
+    _CACHE[cache_key] = (stamp, result)
+    return result
+
+
+def _columns(history: WorkoutHistory):
+    """
+    Копии колонок истории в numpy (array.array отдаёт буфер, копия — memcpy).
+    Копируем, а не делаем frombuffer: иначе array нельзя будет дописывать.
+    """
+    dates = np.array(history.dates, dtype=np.int64)
+    ex_ids = np.array(history.exercise_ids, dtype=np.int64)
+    weights = np.array(history.weights, dtype=np.float64)
+    reps = np.array(history.reps, dtype=np.float64)
+    return dates, ex_ids, weights, reps
+
+
+def _week_of(ordinals):
+    # date(1, 1, 1) — понедельник, поэтому недели начинаются с понедельника
+    return (ordinals - 1) // 7
+
+
+def _fmt_num(x: float) -> str:
+    return f"{x:.0f}" if abs(x - round(x)) < 0.05 else f"{x:.1f}"
+
+
+# -----------------------------
+# Тоннаж по неделям
+# -----------------------------
+def weekly_tonnage(history: WorkoutHistory, weeks: int = 4, today: date | None = None):
+    """
+    {упражнение: [тоннаж за неделю, ...]} за последние weeks недель,
+    последняя — текущая. Тоннаж = сумма вес × повторы.
+    """
+    dates, ex_ids, weights, reps = _columns(history)
+    n_ex = len(history.names)
+    if not len(dates) or not n_ex:
+        return {}
+
+    today = today or date.today()
+    last_week = _week_of(today.toordinal())
+    week_pos = _week_of(dates) - (last_week - weeks + 1)
+    mask = (week_pos >= 0) & (week_pos < weeks)
+
+    idx = ex_ids[mask] * weeks + week_pos[mask]
+    tonnage = np.bincount(
+        idx, weights=(weights * reps)[mask], minlength=n_ex * weeks
+    ).reshape(n_ex, weeks)
+
+    return {
+        history.names[i]: tonnage[i].tolist()
+        for i in np.flatnonzero(tonnage.sum(axis=1) > 0)
+        if not history.inactive[i]
+    }
+
+
+# -----------------------------
+# Оценка 1ПМ
+# -----------------------------
+def estimated_1rm(weights, reps):
+    """
+    Формула Эпли: вес × (1 + повторы / 30); для одного повтора — сам вес.
+    """
+    return np.where(reps <= 1, weights, weights * (1.0 + reps / 30.0))
+
+
+def best_e1rm(history: WorkoutHistory, months: int = 4, today: date | None = None):
+    """
+    {упражнение: (лучший 1ПМ, дата, [лучший 1ПМ по месяцам])}
+    Месяцы — последние months календарных месяцев, 0 если в месяце не было подходов.
+    """
+    dates, ex_ids, weights, reps = _columns(history)
+    n_ex = len(history.names)
+    mask = weights > 0
+    if not mask.any():
+        return {}
+
+    dates, ex_ids, e1rm = dates[mask], ex_ids[mask], estimated_1rm(
+        weights[mask], reps[mask]
+    )
+
+    # Лучший результат за всё время и его дата
+    order = np.lexsort((e1rm, ex_ids))
+    last_of_ex = np.flatnonzero(np.diff(ex_ids[order], append=-1) != 0)
+    best_pos = order[last_of_ex]
+
+    # Лучший результат по месяцам
+    today = today or date.today()
+    first_month = today.year * 12 + today.month - 1 - (months - 1)
+    days_, inverse = np.unique(dates, return_inverse=True)
+    month_of_day = np.array(
+        [d.year * 12 + d.month - 1 for d in map(date.fromordinal, days_.tolist())],
+        dtype=np.int64,
+    )
+    month_pos = month_of_day[inverse] - first_month
+    in_range = (month_pos >= 0) & (month_pos < months)
+    monthly = np.zeros(n_ex * months)
+    np.maximum.at(
+        monthly, ex_ids[in_range] * months + month_pos[in_range], e1rm[in_range]
+    )
+    monthly = monthly.reshape(n_ex, months)
+
+    result = {}
+    for pos in best_pos.tolist():
+        ex_id = int(ex_ids[pos])
+        if history.inactive[ex_id]:
+            continue
+        result[history.names[ex_id]] = (
+            float(e1rm[pos]),
+            date.fromordinal(int(dates[pos])),
+            monthly[ex_id].tolist(),
+        )
+    return result
+
+
+# -----------------------------
+# Тренд объёма
+# -----------------------------
+def volume_trend(history: WorkoutHistory, days: int = 90, today: date | None = None):
+    """
+    {упражнение: (наклон в единицах объёма за неделю, число тренировок)}
+    Наклон — МНК по объёму каждой тренировки за последние days дней.
+    Объём подхода — вес × повторы, для подходов без веса — повторы.
+    """
+    dates, ex_ids, weights, reps = _columns(history)
+    if not len(dates):
+        return {}
+
+    today = today or date.today()
+    mask = dates > today.toordinal() - days
+    dates, ex_ids = dates[mask], ex_ids[mask]
+    volume = np.where(weights > 0, weights * reps, reps)[mask]
+    if not len(dates):
+        return {}
+
+    # Объём за тренировку: группируем по (упражнение, дата)
+    session_key = ex_ids * 10_000_000 + dates
+    keys, inverse = np.unique(session_key, return_inverse=True)
+    y = np.bincount(inverse, weights=volume)
+    x = (keys % 10_000_000 - today.toordinal()) / 7.0  # в неделях
+    ex = keys // 10_000_000
+
+    n_ex = len(history.names)
+    n = np.bincount(ex, minlength=n_ex).astype(np.float64)
+    sx = np.bincount(ex, weights=x, minlength=n_ex)
+    sy = np.bincount(ex, weights=y, minlength=n_ex)
+    sxx = np.bincount(ex, weights=x * x, minlength=n_ex)
+    sxy = np.bincount(ex, weights=x * y, minlength=n_ex)
+
+    denom = n * sxx - sx * sx
+    slope = np.divide(
+        n * sxy - sx * sy, denom, out=np.zeros(n_ex), where=np.abs(denom) > 1e-9
+    )
+
+    return {
+        history.names[i]: (float(slope[i]), int(n[i]))
+        for i in np.flatnonzero(n >= 2)
+        if not history.inactive[i]
+    }
+
+
+# -----------------------------
+# Тексты отчётов (кэшируются по версии истории)
+# -----------------------------
+def tonnage_report(athlete_name: str, history: WorkoutHistory, weeks: int = 4) -> str:
+    def compute(h):
+        data = weekly_tonnage(h, weeks)
+        if not data:
+            return "Нет подходов с весом за последние недели."
+        lines = [f"Тоннаж по неделям (кг, последние {weeks}, справа — текущая):\n"]
+        for name, values in sorted(data.items(), key=lambda kv: -sum(kv[1])):
+            lines.append(f"<b>{name}</b>: " + " → ".join(_fmt_num(v) for v in values))
+        return "\n".join(lines)
+
+    return _cached(athlete_name, history, ("tonnage", weeks), compute)
+
+
+def e1rm_report(athlete_name: str, history: WorkoutHistory, months: int = 4) -> str:
+    def compute(h):
+        data = best_e1rm(h, months)
+        if not data:
+            return "Нет подходов с весом для оценки 1ПМ."
+        lines = [f"Лучший расчётный 1ПМ (Эпли), по месяцам за последние {months}:\n"]
+        for name, (best, day, monthly) in sorted(data.items(), key=lambda kv: -kv[1][0]):
+            lines.append(
+                f"<b>{name}</b>: {_fmt_num(best)} кг ({day:%d.%m.%Y})\n"
+                f"  " + " → ".join(_fmt_num(v) if v else "—" for v in monthly)
+            )
+        return "\n".join(lines)
+
+    return _cached(athlete_name, history, ("e1rm", months), compute)
+
+
+def trend_report(athlete_name: str, history: WorkoutHistory, days: int = 90) -> str:
+    def compute(h):
+        data = volume_trend(h, days)
+        if not data:
+            return f"Мало тренировок за последние {days} дней для тренда."
+        lines = [f"Тренд объёма за {days} дней (изменение за неделю):\n"]
+        for name, (slope, sessions) in sorted(data.items(), key=lambda kv: -kv[1][0]):
+            arrow = "📈" if slope > 0.5 else ("📉" if slope < -0.5 else "➡️")
+            sign = "+" if slope > 0 else ""
+            lines.append(
+                f"{arrow} <b>{name}</b>: {sign}{_fmt_num(slope)} "
+                f"({sessions} трен.)"
+            )
+        return "\n".join(lines)
+
+    return _cached(athlete_name, history, ("trend", days), compute)
+
+
+def dashboard_line(athlete_name: str, history: WorkoutHistory) -> str:
+    """
+    Одна строка сводки по атлету для общего экрана по всем атлетам.
+    """
+    def compute(h):
+        dates = np.array(h.dates, dtype=np.int64)
+        week_start = date.today().toordinal() - 6
+        recent = dates[dates >= week_start]
+        sessions = len(np.unique(recent))
+        tonnage = sum(values[-1] for values in weekly_tonnage(h, 1).values())
+        trends = volume_trend(h)
+        up = sum(1 for slope, _ in trends.values() if slope > 0.5)
+        down = sum(1 for slope, _ in trends.values() if slope < -0.5)
+        return (
+            f"<b>{athlete_name}</b>: дней с тренировками за 7 дн. — {sessions}, "
+            f"тоннаж недели — {_fmt_num(tonnage)} кг, "
+            f"объём растёт/падает — {up}/{down}"
+        )
+
+    return _cached(athlete_name, history, ("dashboard",), compute)
@@ -0,0 +1,318 @@
+# archive.py — перенос старых тренировок в листы архива по годам
+#
+# Строка упражнения растёт вправо годами, а с ней полное чтение листа,
+# copyPaste строки при деактивации и поиск старых упражнений. Здесь ячейки
+# старше горизонта переносятся на листы "Архив <год>" той же таблицы
+# (строка архива — по названию упражнения), в живом листе остаются последние
+# ARCHIVE_KEEP_CELLS ячеек каждой строки.
+#
+# Перенос — один batchUpdate: copyPaste (значения вместе с форматированием,
+# жирная дата остаётся жирной) и deleteRange со сдвигом ячеек строки влево.
+# Либо переносится всё, либо ничего.
+#
+# Листы архива меняет только бот (через перенос), поэтому читаются один раз;
+# история и аналитика строятся по архиву и живому листу вместе.
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from sheet_sync import PackedRows, trim_row
+from workout_history import dated_cells, normalize_exercise_name
+
+
+# Ячейки старше стольких дней переносятся в архив
+ARCHIVE_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", 365))
+# Сколько последних ячеек каждой строки всегда остаётся в живом листе
+ARCHIVE_KEEP_CELLS = int(os.getenv("ARCHIVE_KEEP_CELLS", 30))
+
+ARCHIVE_TITLE = "Архив {year}"
+_TITLE_RE = re.compile(r"^Архив (\d{4})$")
+
+
+def archive_title(year: int) -> str:
+    return ARCHIVE_TITLE.format(year=year)
+
+
+def archive_year(title: str):
+    """
+    'Архив 2024' -> 2024, для остальных листов — None.
+    """
+    m = _TITLE_RE.match(title.strip())
+    return int(m.group(1)) if m else None
+
+
+@dataclass
+class ArchiveTab:
+    year: int
+    sheet_id: int
+    title: str
+    rows: PackedRows = field(default_factory=PackedRows)
+    # Размер сетки листа: copyPaste за её пределы не вставляет
+    row_count: int = 0
+    col_count: int = 0
+    # Сколько колонок нужно под данные
+    width: int = 0
+    # Лист ещё не создан (появится в том же batchUpdate)
+    new: bool = False
+
+    def find_row(self, exercise_name: str):
+        key = normalize_exercise_name(exercise_name)
+        for idx, name in enumerate(self.rows.names(), start=1):
+            if name and normalize_exercise_name(name) == key:
+                return idx
+        return None
+
+
+@dataclass
+class Archive:
+    tabs: dict[int, ArchiveTab] = field(default_factory=dict)
+    # ID всех листов таблицы — для выбора ID нового листа
+    sheet_ids: set[int] = field(default_factory=set)
+
+    def grids(self) -> list[tuple]:
+        """
+        [(год, значения листа), ...] по возрастанию года — для parse_grids.
+        """
+        return [(year, self.tabs[year].rows) for year in sorted(self.tabs)]
+
+    def cells_for(self, exercise_name: str) -> list[str]:
+        """
+        Все ячейки упражнения из архива по порядку (для рекордов).
+        """
+        cells = []
+        for year in sorted(self.tabs):
+            tab = self.tabs[year]
+            row = tab.find_row(exercise_name)
+            if row is not None:
+                cells.extend(tab.rows[row - 1][1:])
+        return cells
+
+    def cell_count(self) -> int:
+        return sum(sum(tab.rows.widths()) for tab in self.tabs.values())
+
+
+def read_archive(sh) -> Archive:
+    """
+    Метаданные таблицы + все листы архива одним values.batchGet.
+    """
+    archive = Archive()
+    for ws in sh.worksheets():
+        archive.sheet_ids.add(ws.id)
+        year = archive_year(ws.title)
+        if year is not None:
+            archive.tabs[year] = ArchiveTab(
+                year=year,
+                sheet_id=ws.id,
+                title=ws.title,
+                row_count=ws.row_count,
+                col_count=ws.col_count,
+            )
+    if not archive.tabs:
+        return archive
+
+    tabs = list(archive.tabs.values())
+    ranges = ["'" + tab.title.replace("'", "''") + "'" for tab in tabs]
+    response = sh.values_batch_get(ranges)
+    for tab, vr in zip(tabs, response.get("valueRanges", [])):
+        tab.rows = PackedRows(trim_row(row) for row in vr.get("values", []))
+        tab.width = max(tab.rows.widths(), default=0)
+    logging.info(
+        f"Прочитал архив: {len(tabs)} листов, {archive.cell_count()} ячеек"
+    )
+    return archive
+
+
+# -----------------------------
+# План переноса
+# -----------------------------
+@dataclass
+class RowMove:
+    """
+    Ячейки B..last_col строки row уходят в архив; groups — по годам:
+    [(год, первая колонка, последняя колонка), ...].
+    """
+
+    row: int
+    name: str
+    last_col: int
+    groups: list[tuple]
+    cells: int
+
+
+def plan_archive(
+    values: list[list[str]],
+    today: date | None = None,
+    horizon_days: int = ARCHIVE_HORIZON_DAYS,
+    keep_cells: int = ARCHIVE_KEEP_CELLS,
+) -> list[RowMove]:
+    """
+    Для каждой строки — самый длинный префикс ячеек, которые старше горизонта
+    и не входят в последние keep_cells. Ячейки без даты внутри префикса
+    уезжают вместе с соседней ячейкой справа.
+    """
+    today = today or date.today()
+    cutoff = today - timedelta(days=horizon_days)
+    moves = []
+
+    for idx, row in enumerate(values, start=1):
+        name = row[0].strip() if row else ""
+        if not name:
+            continue
+
+        cells = dated_cells(row, today)
+        movable = cells[: max(0, len(cells) - keep_cells)]
+        taken = []
+        for col, d, _ in movable:
+            if d >= cutoff:
+                break
+            taken.append((col, d.year))
+        if not taken:
+            continue
+
+        groups = []
+        first_col = 2
+        for i, (col, year) in enumerate(taken):
+            if i + 1 < len(taken) and taken[i + 1][1] == year:
+                continue
+            groups.append((year, first_col, col))
+            first_col = col + 1
+
+        moves.append(
+            RowMove(
+                row=idx,
+                name=name,
+                last_col=taken[-1][0],
+                groups=groups,
+                cells=len(taken),
+            )
+        )
+    return moves
+
+
+def _grid_range(sheet_id: int, row: int, first_col: int, last_col: int) -> dict:
+    return {
+        "sheetId": sheet_id,
+        "startRowIndex": row - 1,
+        "endRowIndex": row,
+        "startColumnIndex": first_col - 1,
+        "endColumnIndex": last_col,
+    }
+
+
+def build_archive_requests(
+    live_sheet_id: int,
+    values: list[list[str]],
+    moves: list[RowMove],
+    archive: Archive,
+) -> list[dict]:
+    """
+    Запросы batchUpdate для переноса. Копия архива в archive обновляется
+    сразу (если batchUpdate не пройдёт — её нужно перечитать).
+    """
+    copies = []
+    for move in moves:
+        row = values[move.row - 1]
+        for year, first_col, last_col in move.groups:
+            tab = archive.tabs.get(year)
+            if tab is None:
+                sheet_id = year
+                while sheet_id in archive.sheet_ids:
+                    sheet_id += 10000
+                archive.sheet_ids.add(sheet_id)
+                tab = archive.tabs[year] = ArchiveTab(
+                    year=year, sheet_id=sheet_id, title=archive_title(year), new=True
+                )
+
+            dest_row = tab.find_row(move.name)
+            if dest_row is None:
+                tab.rows.append([move.name])
+                dest_row = len(tab.rows)
+                # Название — тоже копированием, с форматированием строки
+                copies.append(
+                    {
+                        "copyPaste": {
+                            "source": _grid_range(live_sheet_id, move.row, 1, 1),
+                            "destination": _grid_range(tab.sheet_id, dest_row, 1, 1),
+                            "pasteType": "PASTE_NORMAL",
+                        }
+                    }
+                )
+
+            dest_values = tab.rows[dest_row - 1]
+            dest_col = len(dest_values) + 1
+            width = last_col - first_col + 1
+            copies.append(
+                {
+                    "copyPaste": {
+                        "source": _grid_range(
+                            live_sheet_id, move.row, first_col, last_col
+                        ),
+                        "destination": _grid_range(
+                            tab.sheet_id, dest_row, dest_col, dest_col + width - 1
+                        ),
+                        "pasteType": "PASTE_NORMAL",
+                    }
+                }
+            )
+            moved = list(row[first_col - 1 : last_col])
+            dest_values.extend(moved + [""] * (width - len(moved)))
+            tab.rows[dest_row - 1] = trim_row(dest_values)
+            # Пустые ячейки на конце тоже занимают место в сетке
+            tab.width = max(tab.width, dest_col + width - 1)
+
+    # Листы и размеры сеток — до копирования
+    requests = []
+    for tab in sorted(archive.tabs.values(), key=lambda t: t.year):
+        need_rows = max(len(tab.rows), 1)
+        need_cols = max(tab.width, 1)
+        if tab.new:
+            requests.append(
+                {
+                    "addSheet": {
+                        "properties": {
+                            "sheetId": tab.sheet_id,
+                            "title": tab.title,
+                            "gridProperties": {
+                                "rowCount": need_rows,
+                                "columnCount": need_cols,
+                            },
+                        }
+                    }
+                }
+            )
+            tab.new = False
+            tab.row_count, tab.col_count = need_rows, need_cols
+            continue
+        for dimension, have, need in (
+            ("ROWS", tab.row_count, need_rows),
+            ("COLUMNS", tab.col_count, need_cols),
+        ):
+            if need > have:
+                requests.append(
+                    {
+                        "appendDimension": {
+                            "sheetId": tab.sheet_id,
+                            "dimension": dimension,
+                            "length": need - have,
+                        }
+                    }
+                )
+        tab.row_count = max(tab.row_count, need_rows)
+        tab.col_count = max(tab.col_count, need_cols)
+
+    requests.extend(copies)
+
+    # Удаление из живого листа: ячейки строки сдвигаются влево,
+    # соседние строки не затрагиваются
+    for move in moves:
+        requests.append(
+            {
+                "deleteRange": {
+                    "range": _grid_range(live_sheet_id, move.row, 2, move.last_col),
+                    "shiftDimension": "COLUMNS",
+                }
+            }
+        )
+    return requests
@@ -1,6 +1,115 @@
-ATHLETE_SHEETS = {
-    "Роман Г.": "1YKpW75xuGky8o7jj-uZ2gQVk2mKHyh_YD4b9z188fHs",
-    # добавишь сюда других людей:
-    # "Иван П.": "1AbCdEfGh123...",
-    # "Денис": "1QwErTyUiOp...",
-}
+# athletes_config.py — реестр атлетов: "Имя атлета" -> Spreadsheet ID
+#
+# Источник — JSON-файл (ATHLETES_FILE, по умолчанию athletes.json рядом с ботом):
+#     {"Роман Г.": "1YKpW75...", "Олег": "1Qsa1tk..."}
+# Файл перечитывается на лету, перезапуск бота не нужен.
+import asyncio
+import json
+import logging
+import os
+import threading
+from types import MappingProxyType
+
+
+ATHLETES_FILE = os.getenv(
+    "ATHLETES_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "athletes.json"),
+)
+RELOAD_INTERVAL = float(os.getenv("ATHLETES_RELOAD_INTERVAL", 10))
+
+
+# Текущий снимок. Читается без блокировок: при перезагрузке
+# собирается новый словарь и подменяется одним присваиванием.
+_SNAPSHOT: MappingProxyType | None = None
+_MTIME: float | None = None
+_RELOAD_LOCK = threading.Lock()
+_LISTENERS: list = []
+
+
+def _read_file(path: str) -> dict[str, str]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: ожидаю объект {{\"Имя\": \"spreadsheet_id\"}}")
+
+    athletes = {}
+    for name, spreadsheet_id in data.items():
+        if not isinstance(spreadsheet_id, str) or not spreadsheet_id.strip():
+            raise ValueError(f"{path}: пустой ID таблицы для '{name}'")
+        athletes[name.strip()] = spreadsheet_id.strip()
+    return athletes
+
+
+def reload(force: bool = False) -> bool:
+    """
+    Перечитать файл, если он изменился. Возвращает True, если снимок заменён.
+    При ошибке в файле остаётся прежний снимок.
+    """
+    global _SNAPSHOT, _MTIME
+
+    with _RELOAD_LOCK:
+        try:
+            mtime = os.stat(ATHLETES_FILE).st_mtime
+        except OSError as e:
+            if _SNAPSHOT is None:
+                raise RuntimeError(f"Не могу прочитать реестр атлетов: {e}") from e
+            logging.warning(f"Реестр атлетов недоступен, оставляю прежний: {e}")
+            return False
+
+        if not force and mtime == _MTIME:
+            return False
+
+        try:
+            athletes = _read_file(ATHLETES_FILE)
+        except (OSError, ValueError) as e:
+            if _SNAPSHOT is None:
+                raise RuntimeError(f"Ошибка в реестре атлетов: {e}") from e
+            logging.error(f"Ошибка в реестре атлетов, оставляю прежний: {e}")
+            _MTIME = mtime
+            return False
+
+        old = _SNAPSHOT or MappingProxyType({})
+        _SNAPSHOT = MappingProxyType(athletes)
+        _MTIME = mtime
+
+    logging.info(f"Реестр атлетов загружен: {len(athletes)} атлет(ов)")
+
+    changed = {
+        name
+        for name in set(old) | set(athletes)
+        if old.get(name) != athletes.get(name)
+    }
+    if changed and old:
+        for listener in _LISTENERS:
+            try:
+                listener(changed)
+            except Exception:
+                logging.exception("Ошибка в обработчике смены реестра атлетов")
+    return True
+
+
+def snapshot():
+    """
+    Неизменяемый словарь {имя: spreadsheet_id}.
+    """
+    if _SNAPSHOT is None:
+        reload()
+    return _SNAPSHOT
+
+
+def on_change(callback):
+    """
+    callback(changed_names) вызывается после перезагрузки для атлетов,
+    которые добавились, удалились или сменили таблицу.
+    """
+    _LISTENERS.append(callback)
+
+
+async def watch(interval: float = RELOAD_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            reload()
+        except Exception:
+            logging.exception("Ошибка при перезагрузке реестра атлетов")
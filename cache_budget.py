@@ -0,0 +1,111 @@
+# cache_budget.py — общий лимит памяти на кэши атлетов
+#
+# На инстансе Render 512 МБ кэши таблиц всех атлетов не должны расти без
+# границы. CacheBudget помнит, сколько памяти занимают кэши каждого атлета,
+# и в каком порядке к ним обращались. Если после загрузки очередного атлета
+# сумма больше CACHE_BUDGET_MB, кэши давно не нужных атлетов сбрасываются
+# целиком — при следующем обращении они загрузятся заново.
+#
+# Размер считается при загрузке кэшей (deep_size обходит объекты), записи
+# через бота его почти не меняют и не пересчитывают.
+import logging
+import os
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+
+
+CACHE_BUDGET_MB = float(os.getenv("CACHE_BUDGET_MB", 192))
+
+_LEAF_TYPES = (str, bytes, bytearray, array, int, float, bool, type(None))
+
+
+def deep_size(obj, seen: set | None = None) -> int:
+    """
+    Примерный размер объекта со всем, на что он ссылается (байт).
+    Объекты из seen не считаются — общий seen для нескольких кэшей
+    считает общие (interned) строки один раз.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, _LEAF_TYPES):
+        return size
+    if isinstance(obj, dict):
+        children = [*obj.keys(), *obj.values()]
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        children = obj
+    else:
+        children = [
+            getattr(obj, slot)
+            for cls in type(obj).__mro__
+            for slot in getattr(cls, "__slots__", ())
+            if hasattr(obj, slot)
+        ]
+        if hasattr(obj, "__dict__"):
+            children += list(vars(obj).values())
+    return size + sum(deep_size(child, seen) for child in children)
+
+
+class CacheBudget:
+    def __init__(self, measure, evict, limit_mb: float = CACHE_BUDGET_MB):
+        """
+        measure(name) -> байт в кэшах атлета; evict(name) — сбросить его кэши.
+        """
+        self.limit = int(limit_mb * 1024 * 1024)
+        self._measure = measure
+        self._evict = evict
+        # Атлет -> байт; от давно не нужных к недавним
+        self._sizes: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def touch(self, name: str):
+        with self._lock:
+            if name in self._sizes:
+                self._sizes.move_to_end(name)
+
+    def update(self, name: str):
+        """
+        Кэши атлета загружены или перестроены: пересчитать их размер и,
+        если бюджет превышен, сбросить кэши давно не нужных атлетов.
+        """
+        size = self._measure(name)
+        victims = []
+        with self._lock:
+            self._sizes[name] = size
+            self._sizes.move_to_end(name)
+            total = sum(self._sizes.values())
+            # Сам name — последний: его кэши не сбрасываются, даже если
+            # он один больше бюджета
+            while total > self.limit and len(self._sizes) > 1:
+                victim, victim_size = self._sizes.popitem(last=False)
+                total -= victim_size
+                victims.append((victim, victim_size))
+        for victim, victim_size in victims:
+            self._evict(victim)
+            self.evicted += 1
+            logging.info(
+                f"Кэш {victim} сброшен по бюджету памяти: "
+                f"{victim_size / 1024:.0f} КБ, всего {total / 1024 / 1024:.1f} МБ"
+            )
+
+    def forget(self, name: str):
+        with self._lock:
+            self._sizes.pop(name, None)
+
+    def total(self) -> int:
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def recent(self) -> list[str]:
+        """
+        Атлеты с кэшами, от недавних к давно не нужным.
+        """
+        with self._lock:
+            return list(reversed(self._sizes))
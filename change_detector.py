@@ -0,0 +1,105 @@
+# change_detector.py — дешёвое обнаружение ручных правок таблиц
+#
+# Тренеры правят таблицы руками, поэтому кэши нельзя держать вслепую.
+# Вместо перечитывания листа смотрим на version файла в Drive (один
+# маленький запрос метаданных, не расходует квоту Sheets). Кэш сбрасывается,
+# только если version отличается от той, что получилась после наших записей.
+import asyncio
+import logging
+import os
+import threading
+import time
+
+
+# Как часто фоновый опрос проверяет таблицы с загруженными кэшами
+POLL_INTERVAL = float(os.getenv("SHEETS_POLL_INTERVAL", 60))
+# Перед чтением из кэша: если проверка была давнее — проверить ещё раз
+MAX_CACHE_AGE = float(os.getenv("SHEETS_MAX_CACHE_AGE", 30))
+
+
+class ChangeDetector:
+    """
+    fetch_version(athlete) -> int        — version файла в Drive
+    on_external_change(athlete)          — сбросить/пересобрать кэши атлета
+    """
+
+    def __init__(
+        self, fetch_version, on_external_change, max_age: float = MAX_CACHE_AGE
+    ):
+        self.fetch_version = fetch_version
+        self.on_external_change = on_external_change
+        self.max_age = max_age
+        self._known: dict[str, int] = {}
+        self._checked_at: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def watched(self) -> list[str]:
+        return list(self._known)
+
+    def forget(self, athlete_name: str):
+        with self._lock:
+            self._known.pop(athlete_name, None)
+            self._checked_at.pop(athlete_name, None)
+
+    def check(self, athlete_name: str) -> bool:
+        """
+        Сверить version с известной. True — таблицу меняли не мы.
+        """
+        version = self.fetch_version(athlete_name)
+        with self._lock:
+            known = self._known.get(athlete_name)
+            self._known[athlete_name] = version
+            self._checked_at[athlete_name] = time.monotonic()
+        if known is None or known == version:
+            return False
+
+        logging.info(
+            f"Таблица {athlete_name} изменена вне бота "
+            f"(version {known} -> {version}), сбрасываю кэш"
+        )
+        self.on_external_change(athlete_name)
+        return True
+
+    def ensure_fresh(self, athlete_name: str, max_age: float | None = None) -> bool:
+        """
+        Перед чтением кэша: проверить, если последняя проверка старше max_age.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        checked_at = self._checked_at.get(athlete_name)
+        if checked_at is not None and time.monotonic() - checked_at < max_age:
+            return False
+        try:
+            return self.check(athlete_name)
+        except Exception as e:
+            # Drive недоступен — работаем с кэшем, проверим в следующий раз
+            logging.warning(f"Не удалось проверить версию таблицы {athlete_name}: {e}")
+            return False
+
+    def note_own_write(self, athlete_name: str):
+        """
+        После нашей записи: запомнить получившуюся version, чтобы она
+        не считалась внешним изменением.
+        """
+        try:
+            version = self.fetch_version(athlete_name)
+        except Exception as e:
+            logging.warning(f"Не удалось получить версию таблицы {athlete_name}: {e}")
+            self.forget(athlete_name)
+            return
+        with self._lock:
+            self._known[athlete_name] = version
+            self._checked_at[athlete_name] = time.monotonic()
+
+    async def poll(self, interval: float = POLL_INTERVAL):
+        """
+        Фоновая проверка всех таблиц, для которых есть кэш.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            for athlete_name in self.watched():
+                try:
+                    await asyncio.to_thread(self.check, athlete_name)
+                except Exception as e:
+                    logging.warning(
+                        f"Не удалось проверить версию таблицы {athlete_name}: {e}"
+                    )
@@ -0,0 +1,141 @@
+# charts.py — графики прогресса (PNG), рендер в пуле процессов
+import io
+import logging
+import os
+from collections import OrderedDict
+
+from cpu_pool import run_cpu
+from workout_history import WorkoutHistory, normalize_exercise_name
+
+
+CHART_CACHE_BYTES = int(os.getenv("CHART_CACHE_BYTES", 8 * 1024 * 1024))
+
+
+# -----------------------------
+# Данные для графика
+# -----------------------------
+def exercise_series(history: WorkoutHistory, exercise_name: str):
+    """
+    По тренировкам упражнения: (даты-ordinal, лучший вес, объём).
+    Объём — вес × повторы, для подходов без веса — повторы.
+    Простые списки: их дёшево передать в другой процесс.
+    """
+    ex_id = history.exercise_id(exercise_name)
+    if ex_id is None:
+        return [], [], []
+
+    sessions: dict[int, list[float]] = {}
+    for i in range(len(history)):
+        if history.exercise_ids[i] != ex_id:
+            continue
+        weight, reps = history.weights[i], history.reps[i]
+        top_volume = sessions.setdefault(history.dates[i], [0.0, 0.0])
+        top_volume[0] = max(top_volume[0], weight)
+        top_volume[1] += weight * reps if weight > 0 else reps
+
+    days = sorted(sessions)
+    return (
+        days,
+        [sessions[d][0] for d in days],
+        [sessions[d][1] for d in days],
+    )
+
+
+# -----------------------------
+# Рендер (выполняется в процессе пула)
+# -----------------------------
+def render_progress_png(title: str, days, top_weights, volumes) -> bytes:
+    from datetime import date
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.dates as mdates
+    import matplotlib.pyplot as plt
+
+    x = [date.fromordinal(d) for d in days]
+
+    fig, ax_weight = plt.subplots(figsize=(8, 4.5), dpi=100)
+    try:
+        ax_weight.plot(x, top_weights, "o-", color="tab:blue", label="Лучший вес")
+        ax_weight.set_ylabel("Вес, кг", color="tab:blue")
+
+        ax_volume = ax_weight.twinx()
+        ax_volume.bar(x, volumes, color="tab:orange", alpha=0.3, label="Объём")
+        ax_volume.set_ylabel("Объём", color="tab:orange")
+
+        ax_weight.set_zorder(ax_volume.get_zorder() + 1)
+        ax_weight.patch.set_visible(False)
+        ax_weight.xaxis.set_major_formatter(mdates.DateFormatter("%d.%m.%y"))
+        ax_weight.set_title(title)
+        fig.autofmt_xdate()
+        fig.tight_layout()
+
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png")
+        return buf.getvalue()
+    finally:
+        plt.close(fig)
+
+
+# -----------------------------
+# LRU-кэш картинок с лимитом по байтам
+# -----------------------------
+class ChartCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._items: OrderedDict[tuple, bytes] = OrderedDict()
+
+    def get(self, key: tuple):
+        png = self._items.get(key)
+        if png is not None:
+            self._items.move_to_end(key)
+        return png
+
+    def put(self, key: tuple, png: bytes):
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.total_bytes -= len(old)
+        if len(png) > self.max_bytes:
+            return
+
+        self._items[key] = png
+        self.total_bytes += len(png)
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+
+_CACHE = ChartCache(CHART_CACHE_BYTES)
+
+
+async def get_progress_chart(
+    athlete_name: str, history: WorkoutHistory, exercise_name: str
+):
+    """
+    PNG графика упражнения или None, если данных нет.
+    Кэш по (атлет, упражнение, версия истории).
+    """
+    key = (athlete_name, normalize_exercise_name(exercise_name), history.version)
+    png = _CACHE.get(key)
+    if png is not None:
+        return png
+
+    days, top_weights, volumes = exercise_series(history, exercise_name)
+    if not days:
+        return None
+
+    png = await run_cpu(
+        render_progress_png,
+        f"{athlete_name}: {exercise_name}",
+        days,
+        top_weights,
+        volumes,
+    )
+    _CACHE.put(key, png)
+    logging.info(
+        f"График {athlete_name}/{exercise_name}: {len(png)} байт, "
+        f"кэш {_CACHE.total_bytes} байт"
+    )
+    return png
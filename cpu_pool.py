@@ -0,0 +1,110 @@
+# cpu_pool.py — общий пул процессов для CPU-тяжёлой работы
+#
+# Пул запускается при первой задаче, которой он нужен. Процессы пула
+# создаются через forkserver, а не fork: копии кэшей бота (листы, история)
+# в них не попадают, на инстансе 512 МБ это важно.
+#
+# Маленькая работа (size < CPU_INLINE_SIZE, например разбор небольшого листа)
+# в пул не отправляется — пересылка данных дороже самого разбора; она идёт в
+# потоке этого процесса.
+#
+# CPU_WORKERS=1       — процессов в пуле (по умолчанию 1–2, по числу ядер)
+# CPU_QUEUE_LIMIT=8   — задач одновременно в пуле, остальные ждут
+# CPU_INLINE_SIZE=5000 — порог размера (ячеек) для работы без пула
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", min(2, os.cpu_count() or 1)))
+# Сколько задач может одновременно стоять в пуле; остальные ждут своей очереди
+CPU_QUEUE_LIMIT = int(os.getenv("CPU_QUEUE_LIMIT", CPU_WORKERS * 4))
+CPU_INLINE_SIZE = int(os.getenv("CPU_INLINE_SIZE", 5000))
+
+
+_POOL: ProcessPoolExecutor | None = None
+_SLOTS: asyncio.Semaphore | None = None
+
+# name -> [задач, сумма ожидания, сумма выполнения]
+STATS: dict[str, list] = {}
+_pending = 0  # в пуле + ждут слота
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        methods = multiprocessing.get_all_start_methods()
+        method = "forkserver" if "forkserver" in methods else "spawn"
+        _POOL = ProcessPoolExecutor(
+            max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context(method)
+        )
+        logging.info(f"CPU-пул запущен: {CPU_WORKERS} процесс(ов), {method}")
+    return _POOL
+
+
+def _slots() -> asyncio.Semaphore:
+    global _SLOTS
+    if _SLOTS is None:
+        _SLOTS = asyncio.Semaphore(CPU_QUEUE_LIMIT)
+    return _SLOTS
+
+
+def _timed_call(func, args):
+    # Выполняется в процессе пула
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+async def run_cpu(func, *args, name: str | None = None, size: int | None = None):
+    """
+    Выполнить func(*args) в пуле процессов, не блокируя event loop.
+    size — объём работы (например, ячеек листа): меньше CPU_INLINE_SIZE —
+    выполняется в потоке, без пула.
+
+    func должна быть функцией уровня модуля, аргументы и результат —
+    простыми данными (списки строк, array, небольшие объекты).
+    """
+    global _pending
+    name = name or func.__name__
+    queued = time.perf_counter()
+
+    if size is not None and size < CPU_INLINE_SIZE:
+        waited = 0.0
+        result, run_time = await asyncio.to_thread(_timed_call, func, args)
+    else:
+        _pending += 1
+        try:
+            async with _slots():
+                waited = time.perf_counter() - queued
+                loop = asyncio.get_running_loop()
+                result, run_time = await loop.run_in_executor(
+                    _pool(), _timed_call, func, args
+                )
+        finally:
+            _pending -= 1
+
+    total = time.perf_counter() - queued
+    stat = STATS.setdefault(name, [0, 0.0, 0.0])
+    stat[0] += 1
+    stat[1] += waited
+    stat[2] += run_time
+    logging.info(
+        f"CPU-задача {name}: очередь {waited * 1000:.1f} мс, "
+        f"выполнение {run_time * 1000:.1f} мс, всего {total * 1000:.1f} мс"
+    )
+    return result
+
+
+def queue_depth() -> int:
+    return _pending
+
+
+def shutdown():
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=True, cancel_futures=True)
+        _POOL = None
@@ -0,0 +1,260 @@
+# digest.py — еженедельная сводка по атлетам для тренеров
+#
+# Раз в неделю каждому подписанному тренеру (/digest) приходит сводка по всем
+# атлетам: сколько тренировок записано за неделю, побитые рекорды и упражнения,
+# которые давно не делали.
+#
+# Данные собираются заранее, ночью (DIGEST_PREFETCH_AT): один проход по всем
+# атлетам с ограниченной параллельностью, готовые тексты — в общем хранилище.
+# Утром (DIGEST_SEND_AT) рассылка берёт готовые тексты и идёт через очередь
+# отправки — в часы тренировок сводка не тратит квоту Sheets.
+#
+# Сводка всегда за неделю, закончившуюся в последний DIGEST_WEEKDAY: /digest
+# среди недели показывает ту же сводку из того же кэша, а не считает свою.
+# Пропущенный из-за простоя запуск выполняется при старте процесса.
+import asyncio
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import athletes_config
+import google_sheets
+from records import describe_record, records_since
+from scheduler import parse_time, run_weekly
+from send_queue import SEND_QUEUE
+from state_backend import get_backend
+from workout_history import WorkoutHistory
+
+
+DIGEST_TZ = ZoneInfo(os.getenv("DIGEST_TZ", "Europe/Moscow"))
+# 0 — понедельник
+DIGEST_WEEKDAY = int(os.getenv("DIGEST_WEEKDAY", 0))
+DIGEST_PREFETCH_AT = parse_time(os.getenv("DIGEST_PREFETCH_AT", "04:00"))
+DIGEST_SEND_AT = parse_time(os.getenv("DIGEST_SEND_AT", "09:00"))
+DIGEST_PERIOD_DAYS = int(os.getenv("DIGEST_PERIOD_DAYS", 7))
+# Упражнение "давно не делали", если последней тренировке больше стольких дней
+DIGEST_STALE_DAYS = int(os.getenv("DIGEST_STALE_DAYS", 14))
+DIGEST_STALE_LIMIT = 5
+# Сколько таблиц читается одновременно при ночной подготовке
+DIGEST_PREFETCH_CONCURRENCY = int(os.getenv("DIGEST_PREFETCH_CONCURRENCY", 3))
+
+TELEGRAM_TEXT_LIMIT = 4000
+
+
+# -----------------------------
+# Подписчики (chat_id тренеров — в общем хранилище)
+# -----------------------------
+def subscribe(chat_id: int, username: str | None):
+    get_backend().set(
+        "digest_chats", chat_id, {"username": username, "since": date.today().isoformat()}
+    )
+
+
+def unsubscribe(chat_id: int):
+    get_backend().delete("digest_chats", chat_id)
+
+
+def subscribers() -> list[int]:
+    return [int(chat_id) for chat_id, _ in get_backend().items("digest_chats")]
+
+
+def is_subscribed(chat_id: int) -> bool:
+    return get_backend().get("digest_chats", chat_id) is not None
+
+
+# -----------------------------
+# Текст сводки
+# -----------------------------
+def week_end(today: date) -> date:
+    """
+    Конец последней сводки (сам день в неё не входит): ближайший
+    DIGEST_WEEKDAY не позже today.
+    """
+    return today - timedelta(days=(today.weekday() - DIGEST_WEEKDAY) % 7)
+
+
+def period_key(until: date) -> str:
+    year, week, _ = until.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def build_digest(athlete_name: str, history: WorkoutHistory, until: date) -> str:
+    """
+    Сводка по атлету за DIGEST_PERIOD_DAYS дней до until (не включая until).
+    Тренировки начиная с until не учитываются — сводка, посчитанная позже,
+    та же.
+    """
+    since = (until - timedelta(days=DIGEST_PERIOD_DAYS)).toordinal()
+    until = until.toordinal()
+
+    days = set()
+    cells = set()
+    last_done: dict[int, int] = {}
+    for i in range(len(history)):
+        day = history.dates[i]
+        if day >= until:
+            continue
+        ex_id = history.exercise_ids[i]
+        if day > last_done.get(ex_id, 0):
+            last_done[ex_id] = day
+        if since <= day < until:
+            days.add(day)
+            cells.add((ex_id, day, history.columns[i]))
+
+    lines = [f"<b>{athlete_name}</b>"]
+    if days:
+        lines.append(f"Тренировок за неделю: {len(days)}, упражнений: {len(cells)}")
+    else:
+        lines.append("За неделю тренировок не записано")
+
+    records = records_since(history, since, until)
+    if records:
+        lines.append("🏆 Рекорды:")
+        for name, broken in records:
+            lines.append(f"• {name}: " + "; ".join(map(describe_record, broken)))
+
+    stale = []
+    for ex_id, name in enumerate(history.names):
+        if history.inactive[ex_id] or ex_id not in last_done:
+            continue
+        ago = until - last_done[ex_id]
+        if ago >= DIGEST_STALE_DAYS:
+            stale.append((ago, name))
+    if stale:
+        stale.sort(reverse=True)
+        lines.append(f"⏳ Давно не делали ({DIGEST_STALE_DAYS}+ дн.):")
+        lines.extend(f"• {name} — {ago} дн." for ago, name in stale[:DIGEST_STALE_LIMIT])
+
+    return "\n".join(lines)
+
+
+# -----------------------------
+# Подготовка и рассылка
+# -----------------------------
+def _today() -> date:
+    return datetime.now(DIGEST_TZ).date()
+
+
+# Подготовка по расписанию и /digest считают тексты вместе: не больше
+# DIGEST_PREFETCH_CONCURRENCY таблиц одновременно, один атлет — один раз
+_SEMAPHORE = asyncio.Semaphore(DIGEST_PREFETCH_CONCURRENCY)
+_INFLIGHT: dict[tuple, asyncio.Task] = {}
+
+
+async def _compute(athlete_name: str, until: date) -> str:
+    async with _SEMAPHORE:
+        history = await google_sheets.get_history_async(athlete_name)
+    text = build_digest(athlete_name, history, until)
+    get_backend().set(
+        "digest",
+        athlete_name,
+        {"period": period_key(until), "until": until.isoformat(), "text": text},
+    )
+    return text
+
+
+async def athlete_digest(athlete_name: str, until: date | None = None) -> str:
+    """
+    Сводка атлета за неделю до until (по умолчанию — последняя): готовый
+    текст, если он уже подготовлен, иначе — посчитать.
+    """
+    until = until or week_end(_today())
+    cached = get_backend().get("digest", athlete_name)
+    if cached and cached.get("period") == period_key(until):
+        return cached["text"]
+
+    key = (athlete_name, until)
+    task = _INFLIGHT.get(key)
+    if task is None:
+        task = _INFLIGHT[key] = asyncio.create_task(_compute(athlete_name, until))
+        task.add_done_callback(lambda _: _INFLIGHT.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def prefetch(today: date | None = None):
+    """
+    Ночной проход: готовые тексты последней сводки для всех атлетов.
+    """
+    until = week_end(today or _today())
+    started = time.perf_counter()
+
+    async def one(athlete_name: str):
+        try:
+            await athlete_digest(athlete_name, until)
+        except Exception:
+            logging.exception(f"Сводка: не удалось подготовить {athlete_name}")
+
+    athletes = list(athletes_config.snapshot())
+    await asyncio.gather(*(one(name) for name in athletes))
+    logging.info(
+        f"Сводка за {period_key(until)} подготовлена для {len(athletes)} атлетов "
+        f"за {time.perf_counter() - started:.1f} с"
+    )
+
+
+async def digest_messages(today: date | None = None) -> list[str]:
+    """
+    Последняя сводка по всем атлетам, разбитая на сообщения по лимиту
+    Telegram. Заголовок датирован неделей, за которую посчитаны тексты.
+    """
+    until = week_end(today or _today())
+
+    async def one(athlete_name: str) -> str:
+        try:
+            return await athlete_digest(athlete_name, until)
+        except Exception as e:
+            return f"<b>{athlete_name}</b>: не удалось собрать сводку — {e}"
+
+    parts = await asyncio.gather(*(one(name) for name in athletes_config.snapshot()))
+
+    header = f"📅 Сводка за неделю до {until:%d.%m}\n\n"
+    messages, current = [], header
+    for part in parts:
+        if len(current) + len(part) + 2 > TELEGRAM_TEXT_LIMIT and current != header:
+            messages.append(current.rstrip())
+            current = ""
+        current += part + "\n\n"
+    messages.append(current.rstrip())
+    return messages
+
+
+async def send_weekly(today: date | None = None):
+    today = today or _today()
+    key = period_key(week_end(today))
+    chats = subscribers()
+    if not chats:
+        return
+
+    messages = await digest_messages(today)
+    queued = 0
+    for chat_id in chats:
+        # Несколько процессов бота: сводку в чат отправляет только первый
+        if get_backend().incr("digest_sent", f"{key}:{chat_id}") != 1:
+            continue
+        for text in messages:
+            SEND_QUEUE.put(chat_id, text)
+        queued += 1
+    logging.info(f"Сводка за {key}: в очереди для {queued} чатов")
+
+
+async def run_schedule():
+    await asyncio.gather(
+        run_weekly(
+            "digest_prefetch",
+            DIGEST_WEEKDAY,
+            DIGEST_PREFETCH_AT,
+            prefetch,
+            DIGEST_TZ,
+            catch_up=True,
+        ),
+        run_weekly(
+            "digest_send",
+            DIGEST_WEEKDAY,
+            DIGEST_SEND_AT,
+            send_weekly,
+            DIGEST_TZ,
+            catch_up=True,
+        ),
+    )
@@ -0,0 +1,145 @@
+# exercise_search.py — нечёткий поиск упражнений атлета (inline-режим, /ex)
+#
+# Индекс в памяти: нормализованное имя -> набор триграмм, триграмма -> номера
+# упражнений. Запрос раскладывается на те же триграммы, кандидаты — только
+# упражнения с общими триграммами, так что поиск не перебирает весь список.
+# Добавление и отключение упражнения меняют индекс точечно.
+from collections import Counter
+
+from workout_history import normalize_exercise_name
+
+
+# Кириллические и латинские двойники, которые путают при наборе:
+# "3х10" и "3x10", "ё" и "е" ищутся одинаково
+_FOLD = str.maketrans({"х": "x", "ё": "е"})
+
+# Ниже этой доли совпавших триграмм запроса упражнение не показывается
+SEARCH_MIN_SCORE = 0.34
+
+
+def fold(text: str) -> str:
+    """
+    Ключ поиска: нормализованное имя, двойники букв сведены, пробелы схлопнуты.
+    """
+    return " ".join(normalize_exercise_name(text).translate(_FOLD).split())
+
+
+def trigrams(key: str) -> set[str]:
+    # Пробелы по краям: начало слова даёт свои триграммы, и запрос
+    # из одной-двух букв тоже находит упражнения
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ExerciseIndex:
+    """
+    Упражнения одного атлета. Номер упражнения в индексе не меняется:
+    удалённые оставляют пустое место, а не сдвигают остальные.
+    """
+
+    __slots__ = ("names", "keys", "active", "_by_key", "_grams")
+
+    def __init__(self):
+        self.names: list[str | None] = []
+        self.keys: list[str] = []
+        self.active: list[bool] = []
+        self._by_key: dict[str, int] = {}
+        self._grams: dict[str, set[int]] = {}
+
+    @classmethod
+    def from_names(cls, names: list[str]):
+        """
+        По столбцу A: порядок листа, '-' перед названием — неактуальное.
+        """
+        index = cls()
+        for name in names:
+            if name.strip():
+                index.add(name)
+        return index
+
+    def __len__(self):
+        return len(self._by_key)
+
+    def add(self, name: str, active: bool | None = None) -> int:
+        if active is None:
+            active = not name.strip().startswith("-")
+        display = name.strip().lstrip("-").strip()
+        key = fold(display)
+        ex_id = self._by_key.get(key)
+        if ex_id is not None:
+            self.names[ex_id] = display
+            self.active[ex_id] = active
+            return ex_id
+
+        ex_id = len(self.names)
+        self.names.append(display)
+        self.keys.append(key)
+        self.active.append(active)
+        self._by_key[key] = ex_id
+        for gram in trigrams(key):
+            self._grams.setdefault(gram, set()).add(ex_id)
+        return ex_id
+
+    def remove(self, name: str):
+        ex_id = self._by_key.pop(fold(name), None)
+        if ex_id is None:
+            return
+        for gram in trigrams(self.keys[ex_id]):
+            ids = self._grams.get(gram)
+            if ids is not None:
+                ids.discard(ex_id)
+                if not ids:
+                    del self._grams[gram]
+        self.names[ex_id] = None
+        self.active[ex_id] = False
+
+    def set_active(self, name: str, active: bool):
+        ex_id = self._by_key.get(fold(name))
+        if ex_id is not None:
+            self.active[ex_id] = active
+
+    def find(self, name: str, inactive: bool = False) -> str | None:
+        """
+        Точное совпадение с точностью до регистра и двойников букв.
+        """
+        ex_id = self._by_key.get(fold(name))
+        if ex_id is None or not (self.active[ex_id] or inactive):
+            return None
+        return self.names[ex_id]
+
+    def search(self, query: str, limit: int = 10, inactive: bool = False) -> list[str]:
+        """
+        Лучшие совпадения по убыванию: сначала начало названия, потом
+        начало слова, подстрока и доля общих триграмм (опечатки).
+        Пустой запрос — упражнения в порядке листа.
+        """
+        q = fold(query)
+        if not q:
+            return [
+                name
+                for name, active in zip(self.names, self.active)
+                if name is not None and (active or inactive)
+            ][:limit]
+
+        grams = trigrams(q)
+        hits = Counter()
+        for gram in grams:
+            hits.update(self._grams.get(gram, ()))
+
+        scored = []
+        for ex_id, common in hits.items():
+            if not (self.active[ex_id] or inactive):
+                continue
+            key = self.keys[ex_id]
+            score = common / len(grams)
+            if key.startswith(q):
+                score += 1.0
+            elif f" {q}" in f" {key}":
+                score += 0.5
+            elif q in key:
+                score += 0.25
+            if score >= SEARCH_MIN_SCORE:
+                scored.append((-score, len(key), ex_id))
+
+        scored.sort()
+        return [self.names[ex_id] for _, _, ex_id in scored[:limit]]
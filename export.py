@@ -0,0 +1,157 @@
+# export.py — выгрузка всей истории атлета файлом (/export)
+#
+# Один подход — одна запись: атлет, упражнение, дата, номер подхода, вес,
+# повторы, актуально ли упражнение. Формат — CSV или JSON Lines, сжатый gzip.
+#
+# Всё идёт цепочкой генераторов: лист читается блоками по EXPORT_CHUNK_ROWS
+# строк, ячейки разбираются по мере чтения (тот же формат, что пишут
+# add_workout_cell и parse_volume_string), записи сразу уходят в gzip-файл на
+# диске. В памяти — только текущий блок строк: ширину строки ограничивает
+# перенос старых ячеек в архив, длина истории на память не влияет.
+# Живой лист читается в обход локальной копии — выгрузка не раздувает кэш.
+import csv
+import gzip
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import date
+
+import google_sheets
+from archive import archive_year
+from workout_history import dated_cells, normalize_exercise_name, parse_set_line
+
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 100))
+
+EXPORT_FIELDS = ("athlete", "exercise", "date", "set", "weight", "reps", "active")
+
+
+# -----------------------------
+# Чтение листа блоками
+# -----------------------------
+def sheet_rows(sh, title: str, row_count: int, chunk: int = EXPORT_CHUNK_ROWS):
+    """
+    Строки листа по порядку, читая по chunk строк за запрос, до row_count.
+    Пустой блок посреди листа (много пустых строк подряд) — не конец:
+    Sheets не отдаёт пустые строки, а данные могут идти дальше.
+    """
+    quoted = "'" + title.replace("'", "''") + "'"
+    for start in range(1, row_count + 1, chunk):
+        end = min(start + chunk - 1, row_count)
+        yield from sh.values_get(f"{quoted}!{start}:{end}").get("values", [])
+
+
+# -----------------------------
+# Разбор строк в подходы
+# -----------------------------
+def _number(value: float):
+    return int(value) if value.is_integer() else value
+
+
+def row_records(athlete_name: str, row: list[str], today: date, active: bool):
+    """
+    Подходы одной строки листа: словари с полями EXPORT_FIELDS.
+    """
+    exercise_name = row[0].strip().lstrip("-").strip()
+    for _, day, set_lines in dated_cells(row, today):
+        sets = [s for s in map(parse_set_line, set_lines) if s]
+        for set_no, (weight, reps) in enumerate(sets, start=1):
+            yield {
+                "athlete": athlete_name,
+                "exercise": exercise_name,
+                "date": day.isoformat(),
+                "set": set_no,
+                "weight": _number(weight),
+                "reps": reps,
+                "active": active,
+            }
+
+
+def history_records(athlete_name: str, chunk: int = EXPORT_CHUNK_ROWS):
+    """
+    Все подходы атлета: сначала живой лист, потом архив по годам.
+    Упражнение из архива актуально, только если оно актуально в живом листе.
+    """
+    _, sh, ws = google_sheets.open_athlete_sheet(athlete_name)
+    today = date.today()
+    # Свежие метаданные: row_count у закэшированного ws мог устареть
+    worksheets = sh.worksheets()
+    live = next((tab for tab in worksheets if tab.id == ws.id), ws)
+
+    # Название -> актуально; по строке на упражнение, не по истории
+    active: dict[str, bool] = {}
+    for row in sheet_rows(sh, live.title, live.row_count, chunk):
+        name = row[0].strip() if row else ""
+        if not name:
+            continue
+        is_active = not name.startswith("-")
+        active[normalize_exercise_name(name)] = is_active
+        yield from row_records(athlete_name, row, today, is_active)
+
+    tabs = sorted(
+        (archive_year(tab.title), tab.title, tab.row_count)
+        for tab in worksheets
+        if archive_year(tab.title) is not None
+    )
+    for year, title, row_count in tabs:
+        # Годы ячеек архива восстанавливаются от конца его года
+        limit = min(date(year, 12, 31), today)
+        for row in sheet_rows(sh, title, row_count, chunk):
+            name = row[0].strip() if row else ""
+            if name:
+                is_active = active.get(normalize_exercise_name(name), False)
+                yield from row_records(athlete_name, row, limit, is_active)
+
+
+# -----------------------------
+# Запись в файл
+# -----------------------------
+def write_csv(records, out) -> int:
+    writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    count = 0
+    for record in records:
+        writer.writerow(record)
+        count += 1
+    return count
+
+
+def write_jsonl(records, out) -> int:
+    count = 0
+    for record in records:
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+EXPORT_FORMATS = {"csv": write_csv, "jsonl": write_jsonl}
+
+
+def export_filename(athlete_name: str, fmt: str) -> str:
+    name = "_".join(athlete_name.replace(".", "").split())
+    return f"{name}_{date.today().isoformat()}.{fmt}.gz"
+
+
+def export_history(athlete_name: str, fmt: str = "csv") -> tuple[str, int]:
+    """
+    Выгрузить историю во временный .gz-файл. Возвращает (путь, число подходов);
+    файл удаляет вызывающий. Блокирующая — вызывать в потоке.
+    """
+    writer = EXPORT_FORMATS[fmt]
+    started = time.perf_counter()
+    fd, path = tempfile.mkstemp(prefix="export_", suffix=f".{fmt}.gz")
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.open(
+            raw, "wt", encoding="utf-8", newline=""
+        ) as out:
+            count = writer(history_records(athlete_name), out)
+    except BaseException:
+        os.remove(path)
+        raise
+    logging.info(
+        f"Выгрузка {athlete_name} ({fmt}): {count} подходов, "
+        f"{os.path.getsize(path)} байт, {time.perf_counter() - started:.1f} с"
+    )
+    return path, count
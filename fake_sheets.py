@@ -0,0 +1,522 @@
+# fake_sheets.py — таблицы в памяти вместо Google Sheets API
+#
+# SHEETS_BACKEND=fake — google_sheets.get_client() отдаёт gspread.Client
+# с этим HTTP-клиентом: весь код (gspread, сырые batchUpdate, запрос
+# версии в Drive) работает без сети и без учётной записи. Нужен для
+# воспроизведения трасс (sheets_replay.py) и нагрузочных прогонов.
+#
+# Поддерживается то, чем пользуется бот: метаданные таблицы, values.get /
+# batchGet / update / append, batchUpdate (updateCells, copyPaste,
+# insert/delete/appendDimension, deleteRange, addSheet; форматирование
+# игнорируется) и version файла в Drive.
+#
+# FAKE_SHEETS_SEED=seed.json — {spreadsheet_id: {лист: [[...], ...]}}.
+# Неизвестные таблицы создаются при первом обращении со сгенерированной
+# историей (FAKE_SHEETS_EXERCISES упражнений × FAKE_SHEETS_CELLS ячеек).
+# FAKE_SHEETS_LATENCY_MS / FAKE_SHEETS_MS_PER_KCELL — искусственная задержка
+# на запрос и на каждую тысячу ячеек ответа.
+import json
+import os
+import random
+import re
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import unquote
+
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+from requests import Response
+
+
+FAKE_SHEETS_SEED = os.getenv("FAKE_SHEETS_SEED", "")
+FAKE_SHEETS_EXERCISES = int(os.getenv("FAKE_SHEETS_EXERCISES", 12))
+FAKE_SHEETS_CELLS = int(os.getenv("FAKE_SHEETS_CELLS", 120))
+FAKE_SHEETS_LATENCY_MS = float(os.getenv("FAKE_SHEETS_LATENCY_MS", 0))
+FAKE_SHEETS_MS_PER_KCELL = float(os.getenv("FAKE_SHEETS_MS_PER_KCELL", 0))
+
+SHEETS_PREFIX = "https://sheets.googleapis.com/v4/spreadsheets/"
+DRIVE_PREFIX = "https://www.googleapis.com/drive/v3/files/"
+
+_CELL_RE = re.compile(r"^([A-Za-z]*)(\d*)$")
+
+
+# -----------------------------
+# Синтетические данные
+# -----------------------------
+def synthetic_rows(
+    seed: str,
+    exercises: int = FAKE_SHEETS_EXERCISES,
+    cells: int = FAKE_SHEETS_CELLS,
+    today: date | None = None,
+) -> list[list[str]]:
+    """
+    Лист как у настоящего атлета: упражнение в A, ячейки "д.м\\nвесxповторы"
+    по времени слева направо, последняя — недавно.
+    """
+    rnd = random.Random(seed)
+    today = today or date.today()
+    rows = []
+    for i in range(exercises):
+        name = f"Упражнение {i + 1}"
+        weight = rnd.choice([0, 20, 40, 60, 80])
+        day = today - timedelta(days=rnd.randint(0, 10))
+        row_cells = []
+        for _ in range(rnd.randint(cells // 2, cells)):
+            sets = rnd.randint(2, 5)
+            reps = rnd.randint(5, 12)
+            lines = [f"{day.day}.{day.month}"]
+            lines += [f"{weight}x{reps}" if weight else f"x{reps}"] * sets
+            row_cells.append("\n".join(lines))
+            day -= timedelta(days=rnd.randint(3, 10))
+            weight = max(0, weight - rnd.choice([0, 0, 2.5, 5]))
+        rows.append([name] + row_cells[::-1])
+    return rows
+
+
+# -----------------------------
+# Хранилище
+# -----------------------------
+class FakeSheet:
+    def __init__(self, sheet_id: int, title: str, rows: list[list[str]]):
+        self.sheet_id = sheet_id
+        self.title = title
+        self.rows = [list(map(str, row)) for row in rows]
+        self.row_count = max(len(self.rows), 1000)
+        self.col_count = max([len(r) for r in self.rows] + [26])
+
+    def cell(self, r: int, c: int) -> str:
+        if r < len(self.rows) and c < len(self.rows[r]):
+            return self.rows[r][c]
+        return ""
+
+    def set(self, r: int, c: int, value: str):
+        while len(self.rows) <= r:
+            self.rows.append([])
+        row = self.rows[r]
+        if len(row) <= c:
+            row.extend([""] * (c + 1 - len(row)))
+        row[c] = value
+        self.row_count = max(self.row_count, r + 1)
+        self.col_count = max(self.col_count, c + 1)
+
+    def width(self) -> int:
+        return max([len(r) for r in self.rows] + [0])
+
+    def properties(self, index: int) -> dict:
+        return {
+            "sheetId": self.sheet_id,
+            "title": self.title,
+            "index": index,
+            "sheetType": "GRID",
+            "gridProperties": {
+                "rowCount": self.row_count,
+                "columnCount": self.col_count,
+            },
+        }
+
+
+class FakeSpreadsheet:
+    def __init__(self, spreadsheet_id: str, sheets: dict[str, list[list[str]]]):
+        self.id = spreadsheet_id
+        self.version = 1
+        self.sheets = [
+            FakeSheet(i, title, rows) for i, (title, rows) in enumerate(sheets.items())
+        ]
+
+    def by_title(self, title: str) -> FakeSheet:
+        for sheet in self.sheets:
+            if sheet.title == title:
+                return sheet
+        raise _NotFound(f"Unable to parse range: {title}")
+
+    def by_id(self, sheet_id: int) -> FakeSheet:
+        for sheet in self.sheets:
+            if sheet.sheet_id == sheet_id:
+                return sheet
+        raise _NotFound(f"No grid with id: {sheet_id}")
+
+    def metadata(self) -> dict:
+        return {
+            "spreadsheetId": self.id,
+            "properties": {
+                "title": f"Fake {self.id}",
+                "locale": "ru_RU",
+                "timeZone": "Europe/Moscow",
+            },
+            "sheets": [
+                {"properties": sheet.properties(i)}
+                for i, sheet in enumerate(self.sheets)
+            ],
+        }
+
+
+class _NotFound(Exception):
+    pass
+
+
+class _BadRequest(Exception):
+    pass
+
+
+class FakeStore:
+    def __init__(self):
+        self.spreadsheets: dict[str, FakeSpreadsheet] = {}
+        self.lock = threading.RLock()
+        if FAKE_SHEETS_SEED:
+            with open(FAKE_SHEETS_SEED, encoding="utf-8") as f:
+                for spreadsheet_id, sheets in json.load(f).items():
+                    self.spreadsheets[spreadsheet_id] = FakeSpreadsheet(
+                        spreadsheet_id, sheets
+                    )
+
+    def get(self, spreadsheet_id: str) -> FakeSpreadsheet:
+        sp = self.spreadsheets.get(spreadsheet_id)
+        if sp is None:
+            sp = self.spreadsheets[spreadsheet_id] = FakeSpreadsheet(
+                spreadsheet_id, {"Лист1": synthetic_rows(spreadsheet_id)}
+            )
+        return sp
+
+
+STORE = FakeStore()
+
+
+# -----------------------------
+# Диапазоны A1
+# -----------------------------
+def _col_index(letters: str) -> int:
+    n = 0
+    for ch in letters.upper():
+        n = n * 26 + ord(ch) - ord("A") + 1
+    return n - 1
+
+
+def parse_a1(range_name: str):
+    """
+    "'Лист1'!B3:D" -> ("Лист1", 2, 1, None, 3): строки/колонки с 0,
+    конец не включительно, None — без ограничения.
+    """
+    range_name = range_name.strip()
+    if range_name.startswith("'"):
+        end = 1
+        while True:
+            end = range_name.index("'", end)
+            if range_name[end + 1 : end + 2] == "'":
+                end += 2
+                continue
+            break
+        title = range_name[1:end].replace("''", "'")
+        rest = range_name[end + 1 :]
+    else:
+        title, _, rest = range_name.partition("!")
+        rest = "!" + rest if rest else ""
+    cells = rest[1:] if rest.startswith("!") else ""
+    if not cells:
+        return title, None, None, None, None
+
+    start, _, stop = cells.partition(":")
+    stop = stop or start
+    m1, m2 = _CELL_RE.match(start), _CELL_RE.match(stop)
+    if not m1 or not m2:
+        raise _BadRequest(f"Unable to parse range: {range_name}")
+    r1 = int(m1.group(2)) - 1 if m1.group(2) else None
+    c1 = _col_index(m1.group(1)) if m1.group(1) else None
+    r2 = int(m2.group(2)) if m2.group(2) else None
+    c2 = _col_index(m2.group(1)) + 1 if m2.group(1) else None
+    return title, r1, c1, r2, c2
+
+
+def _read(sheet: FakeSheet, r1, c1, r2, c2, major: str = "ROWS") -> list[list[str]]:
+    r1, c1 = r1 or 0, c1 or 0
+    r2 = len(sheet.rows) if r2 is None else min(r2, len(sheet.rows))
+    values = []
+    for r in range(r1, r2):
+        row = sheet.rows[r]
+        stop = len(row) if c2 is None else min(c2, len(row))
+        values.append(row[c1:stop])
+    if major == "COLUMNS":
+        width = max([len(v) for v in values] + [0])
+        values = [
+            [v[c] if c < len(v) else "" for v in values] for c in range(width)
+        ]
+    values = [_trim(v) for v in values]
+    while values and not values[-1]:
+        values.pop()
+    return values
+
+
+def _trim(row: list[str]) -> list[str]:
+    end = len(row)
+    while end and row[end - 1] == "":
+        end -= 1
+    return row[:end]
+
+
+def _grid(sheet: FakeSheet, grid: dict):
+    r1 = grid.get("startRowIndex", 0)
+    r2 = grid.get("endRowIndex", max(len(sheet.rows), sheet.row_count))
+    c1 = grid.get("startColumnIndex", 0)
+    c2 = grid.get("endColumnIndex", max(sheet.width(), sheet.col_count))
+    return r1, r2, c1, c2
+
+
+def _cell_value(cell: dict) -> str:
+    value = cell.get("userEnteredValue") or {}
+    for key in ("stringValue", "numberValue", "boolValue", "formulaValue"):
+        if key in value:
+            v = value[key]
+            if isinstance(v, float) and v.is_integer():
+                v = int(v)
+            return str(v)
+    return ""
+
+
+# -----------------------------
+# Обработка запросов
+# -----------------------------
+def _values_response(range_name: str, values, major: str = "ROWS") -> dict:
+    result = {"range": range_name, "majorDimension": major}
+    if values:
+        result["values"] = values
+    return result
+
+
+def _apply_request(sp: FakeSpreadsheet, req: dict) -> dict:
+    kind, body = next(iter(req.items()))
+
+    if kind == "updateCells":
+        if "range" in body:
+            sheet = sp.by_id(body["range"]["sheetId"])
+            r0 = body["range"].get("startRowIndex", 0)
+            c0 = body["range"].get("startColumnIndex", 0)
+        else:
+            sheet = sp.by_id(body["start"]["sheetId"])
+            r0 = body["start"].get("rowIndex", 0)
+            c0 = body["start"].get("columnIndex", 0)
+        if "userEnteredValue" in body.get("fields", "") or body.get("fields") == "*":
+            if "range" in body and not body.get("rows"):
+                # Без rows — поля в диапазоне очищаются
+                r1, r2, c1, c2 = _grid(sheet, body["range"])
+                for r in range(r1, r2):
+                    for c in range(c1, c2):
+                        if sheet.cell(r, c):
+                            sheet.set(r, c, "")
+            for dr, row in enumerate(body.get("rows", [])):
+                for dc, cell in enumerate(row.get("values", [])):
+                    sheet.set(r0 + dr, c0 + dc, _cell_value(cell))
+
+    elif kind == "copyPaste":
+        src = sp.by_id(body["source"]["sheetId"])
+        dst = sp.by_id(body["destination"]["sheetId"])
+        r1, r2, c1, c2 = _grid(src, body["source"])
+        values = [
+            [src.cell(r, c) for c in range(c1, c2)] for r in range(r1, r2)
+        ]
+        dr = body["destination"].get("startRowIndex", 0)
+        dc = body["destination"].get("startColumnIndex", 0)
+        if dr + len(values) > dst.row_count or dc + (c2 - c1) > dst.col_count:
+            raise _BadRequest("Destination range is outside of the grid")
+        for i, row in enumerate(values):
+            for j, value in enumerate(row):
+                if value or dst.cell(dr + i, dc + j):
+                    dst.set(dr + i, dc + j, value)
+
+    elif kind == "deleteDimension":
+        rng = body["range"]
+        sheet = sp.by_id(rng["sheetId"])
+        start, end = rng["startIndex"], rng["endIndex"]
+        if rng["dimension"] == "ROWS":
+            del sheet.rows[start:end]
+            sheet.row_count -= end - start
+        else:
+            for row in sheet.rows:
+                del row[start:end]
+            sheet.col_count -= end - start
+
+    elif kind == "insertDimension":
+        rng = body["range"]
+        sheet = sp.by_id(rng["sheetId"])
+        start, end = rng["startIndex"], rng["endIndex"]
+        if rng["dimension"] == "ROWS":
+            sheet.rows[start:start] = [[] for _ in range(end - start)]
+            sheet.row_count += end - start
+        else:
+            for row in sheet.rows:
+                if len(row) > start:
+                    row[start:start] = [""] * (end - start)
+            sheet.col_count += end - start
+
+    elif kind == "appendDimension":
+        sheet = sp.by_id(body["sheetId"])
+        if body["dimension"] == "ROWS":
+            sheet.row_count += body["length"]
+        else:
+            sheet.col_count += body["length"]
+
+    elif kind == "deleteRange":
+        sheet = sp.by_id(body["range"]["sheetId"])
+        r1, r2, c1, c2 = _grid(sheet, body["range"])
+        if body["shiftDimension"] == "COLUMNS":
+            for r in range(r1, min(r2, len(sheet.rows))):
+                del sheet.rows[r][c1:c2]
+        else:
+            width = c2 - c1
+            for r in range(r1, len(sheet.rows)):
+                below = r + (r2 - r1)
+                for c in range(c1, c1 + width):
+                    value = sheet.cell(below, c)
+                    if value or sheet.cell(r, c):
+                        sheet.set(r, c, value)
+
+    elif kind == "addSheet":
+        props = body.get("properties", {})
+        sheet_id = props.get("sheetId")
+        if sheet_id is None:
+            sheet_id = max(s.sheet_id for s in sp.sheets) + 1
+        title = props.get("title") or f"Лист{len(sp.sheets) + 1}"
+        if any(s.sheet_id == sheet_id or s.title == title for s in sp.sheets):
+            raise _BadRequest(f"Sheet {title} / {sheet_id} already exists")
+        sheet = FakeSheet(sheet_id, title, [])
+        grid = props.get("gridProperties", {})
+        sheet.row_count = grid.get("rowCount", 1000)
+        sheet.col_count = grid.get("columnCount", 26)
+        sp.sheets.append(sheet)
+        return {"addSheet": {"properties": sheet.properties(len(sp.sheets) - 1)}}
+
+    # repeatCell, updateSheetProperties и т.п. меняют только оформление
+    return {}
+
+
+def handle(method: str, url: str, params: dict | None, body) -> tuple[int, dict, int]:
+    """
+    (HTTP-статус, JSON ответа, ячеек в ответе).
+    """
+    params = params or {}
+    method = method.upper()
+
+    with STORE.lock:
+        if url.startswith(DRIVE_PREFIX):
+            sp = STORE.get(url[len(DRIVE_PREFIX) :].split("/")[0])
+            return 200, {"version": str(sp.version)}, 0
+
+        if not url.startswith(SHEETS_PREFIX):
+            raise _NotFound(f"Unknown URL: {url}")
+
+        path = url[len(SHEETS_PREFIX) :]
+        spreadsheet_id, _, rest = path.partition("/")
+        if spreadsheet_id.endswith(":batchUpdate"):
+            spreadsheet_id = spreadsheet_id[: -len(":batchUpdate")]
+            rest = ":batchUpdate"
+        sp = STORE.get(spreadsheet_id)
+
+        if rest == "" and method == "GET":
+            return 200, sp.metadata(), 0
+
+        if rest == ":batchUpdate" and method == "POST":
+            requests = (body or {}).get("requests", [])
+            replies = [_apply_request(sp, req) for req in requests]
+            sp.version += 1
+            return 200, {"spreadsheetId": sp.id, "replies": replies}, 0
+
+        if rest == "values:batchGet" and method == "GET":
+            ranges = params.get("ranges") or []
+            if isinstance(ranges, str):
+                ranges = [ranges]
+            major = params.get("majorDimension") or "ROWS"
+            value_ranges, cells = [], 0
+            for range_name in ranges:
+                title, r1, c1, r2, c2 = parse_a1(range_name)
+                values = _read(sp.by_title(title), r1, c1, r2, c2, major)
+                cells += sum(len(v) for v in values)
+                value_ranges.append(_values_response(range_name, values, major))
+            return 200, {"spreadsheetId": sp.id, "valueRanges": value_ranges}, cells
+
+        if rest.startswith("values/"):
+            range_part = unquote(rest[len("values/") :])
+            append = range_part.endswith(":append")
+            if append:
+                range_part = range_part[: -len(":append")]
+            title, r1, c1, _, _ = parse_a1(range_part)
+            sheet = sp.by_title(title)
+
+            if method == "GET":
+                major = params.get("majorDimension") or "ROWS"
+                values = _read(sheet, *parse_a1(range_part)[1:], major)
+                cells = sum(len(v) for v in values)
+                return 200, _values_response(range_part, values, major), cells
+
+            # values.update / values.append: значения с левого верхнего угла
+            # (append в боте — только после insertDimension, в пустую строку)
+            r0, c0 = r1 or 0, c1 or 0
+            values = (body or {}).get("values", [])
+            for dr, row in enumerate(values):
+                for dc, value in enumerate(row):
+                    sheet.set(r0 + dr, c0 + dc, "" if value is None else str(value))
+            sp.version += 1
+            updated = {
+                "spreadsheetId": sp.id,
+                "updatedRange": range_part,
+                "updatedRows": len(values),
+                "updatedCells": sum(len(r) for r in values),
+            }
+            return 200, ({"updates": updated} if append else updated), 0
+
+        raise _NotFound(f"Unsupported request: {method} {url}")
+
+
+def _error(code: int, message: str, status: str) -> dict:
+    return {"error": {"code": code, "message": message, "status": status}}
+
+
+def _response(status: int, payload: dict, url: str) -> Response:
+    response = Response()
+    response.status_code = status
+    response._content = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    response.encoding = "utf-8"
+    response.headers["Content-Type"] = "application/json; charset=UTF-8"
+    response.url = url
+    return response
+
+
+class FakeHTTPClient(HTTPClient):
+    """
+    HTTP-клиент gspread поверх FakeStore. Учётная запись не нужна.
+    """
+
+    def __init__(self, auth=None, session=None):
+        self.auth = auth
+        self.session = session
+        self.timeout = None
+
+    def login(self):
+        pass
+
+    def request(
+        self,
+        method,
+        endpoint,
+        params=None,
+        data=None,
+        json=None,
+        files=None,
+        headers=None,
+    ) -> Response:
+        started = time.perf_counter()
+        cells = 0
+        try:
+            status, payload, cells = handle(method, endpoint, params, json)
+        except _NotFound as e:
+            status, payload = 404, _error(404, str(e), "NOT_FOUND")
+        except (_BadRequest, KeyError, ValueError) as e:
+            status, payload = 400, _error(400, str(e), "INVALID_ARGUMENT")
+
+        delay_ms = FAKE_SHEETS_LATENCY_MS + FAKE_SHEETS_MS_PER_KCELL * cells / 1000
+        delay = delay_ms / 1000 - (time.perf_counter() - started)
+        if delay > 0:
+            time.sleep(delay)
+
+        response = _response(status, payload, endpoint)
+        if response.ok:
+            return response
+        raise APIError(response)
@@ -1,7 +1,11 @@
 # fitlogsbot.py — version v1.15
+import startup_profile
+
 import logging
 import asyncio
+import html
 import os
+from datetime import date
 
 from aiohttp import web
 from aiogram import Bot, Dispatcher, F, Router
@@ -12,19 +16,41 @@ from aiogram.types import (
     CallbackQuery,
     InlineKeyboardMarkup,
     InlineKeyboardButton,
+    BufferedInputFile,
+    FSInputFile,
+    InlineQuery,
+    InlineQueryResultArticle,
+    InlineQueryResultsButton,
+    InputTextMessageContent,
 )
-from aiogram.filters import Command
-
-from google_sheets import (
-    VERSION as GS_VERSION,
-    add_workout,
-    add_workout_cell,
-    add_exercise_with_workout,
-    make_exercise_inactive,
-    get_athletes,
-    get_exercises,
-    get_oldest_exercises,
-)
+from aiogram.filters import Command, CommandObject
+from aiogram.methods import GetUpdates, SetWebhook
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+
+import athletes_config
+import cpu_pool
+from charts import get_progress_chart
+from lifecycle import LIFECYCLE, LIFECYCLE_DRAIN_SEC
+from state_backend import UserStateStore, get_backend
+import sticky_routing
+from sticky_routing import sticky_middleware
+from throttling import ThrottlingMiddleware, read_once
+from update_ledger import LEDGER, ledger_store
+from records import format_records
+from workout_history import split_cell
+import send_queue
+import undo_log
+from send_queue import OUTBOUND, SEND_QUEUE
+from startup_profile import lazy_import
+
+# Тяжёлые модули (gspread, google-auth, requests, numpy) грузятся
+# при первом обращении, а не при старте бота
+google_sheets = lazy_import("google_sheets")
+analytics = lazy_import("analytics")
+digest = lazy_import("digest")
+export = lazy_import("export")
+
+startup_profile.mark("imports")
 
 
 VERSION = "v1.15"  # версия этого файла
@@ -37,6 +63,12 @@ UNAUTHORIZED_TEXT = "У вас нет прав на бота"
 logging.basicConfig(level=logging.INFO)
 TOKEN = os.getenv("TOKEN")
 
+# Если задан WEBHOOK_URL — бот принимает апдейты через webhook (можно запускать
+# несколько процессов за балансировщиком), иначе — long polling.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
 ALLOWED_USERNAMES = {"gblsh", "staytorqued"}
 
 
@@ -51,7 +83,9 @@ def is_allowed_user(message_or_callback) -> bool:
 # -----------------------------
 # Состояние пользователей
 # -----------------------------
-USER_STATE: dict[int, dict] = {}
+# Хранится в общем хранилище (state_backend), чтобы несколько процессов бота
+# видели одно и то же состояние. Интерфейс как у dict.
+USER_STATE = UserStateStore(get_backend())
 
 
 def reset_user_state(user_id: int):
@@ -61,9 +95,23 @@ def reset_user_state(user_id: int):
         "exercise": None,
         "awaiting_volume": False,
         "awaiting_new_exercise": False,
+        # Список упражнений, показанный на клавиатуре: индексы из callback
+        # разрешаются по нему, без повторного чтения столбца A
+        "exercise_list": None,
     }
 
 
+# Фоновые задачи (держим ссылки, иначе asyncio может их собрать)
+BACKGROUND_TASKS: set[asyncio.Task] = set()
+
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+    return task
+
+
 # -----------------------------
 # Инициализация бота
 # -----------------------------
@@ -71,11 +119,46 @@ bot = Bot(
     token=TOKEN,
     default=DefaultBotProperties(parse_mode=ParseMode.HTML),
 )
+# Все отправки и правки сообщений — через лимиты Telegram (send_queue)
+send_queue.install(bot.session)
 dp = Dispatcher()
 router = Router()
 dp.include_router(router)
 
 
+def event_athlete(event, user_id: int) -> str | None:
+    """
+    Атлет, с таблицей которого работает апдейт (для ограничения по атлету).
+    """
+    if isinstance(event, CallbackQuery) and (event.data or "").startswith("athlete|"):
+        return event.data.split("|", 1)[1]
+    if isinstance(event, Message) and (event.text or "").startswith("/archive"):
+        # /archive сам берёт семафор каждого атлета по очереди
+        return None
+    state = USER_STATE.get(user_id) or {}
+    if (
+        isinstance(event, Message)
+        and ";" in (event.text or "")
+        and not state.get("awaiting_new_exercise")
+    ):
+        # Старый формат: "Имя; дата; упражнение; ..."
+        return event.text.split(";", 1)[0].strip()
+    return state.get("athlete")
+
+
+# Начатые апдейты дорабатывают при остановке (lifecycle)
+dp.update.outer_middleware(LIFECYCLE.middleware)
+# Повторно доставленные апдейты не обрабатываются второй раз
+dp.update.outer_middleware(LEDGER.middleware)
+
+# Двойные нажатия и параллельные действия не расходуют квоту Sheets
+throttling = ThrottlingMiddleware(athlete_of=event_athlete)
+dp.message.outer_middleware(throttling)
+dp.callback_query.outer_middleware(throttling)
+
+startup_profile.mark("bot_init")
+
+
 # -----------------------------
 # Парсеры
 # -----------------------------
@@ -138,7 +221,7 @@ def main_menu_keyboard():
 
 
 def athletes_keyboard():
-    athletes = get_athletes()
+    athletes = athletes_config.snapshot()
     buttons = [
         [InlineKeyboardButton(text=name, callback_data=f"athlete|{name}")]
         for name in athletes
@@ -208,6 +291,22 @@ def analysis_keyboard():
                     text="🧓 Старые упражнения", callback_data="analysis|old"
                 )
             ],
+            [
+                InlineKeyboardButton(
+                    text="📦 Тоннаж по неделям", callback_data="analysis|tonnage"
+                )
+            ],
+            [
+                InlineKeyboardButton(
+                    text="💪 Лучший расчётный 1ПМ", callback_data="analysis|e1rm"
+                )
+            ],
+            [
+                InlineKeyboardButton(
+                    text="📉 Тренд объёма", callback_data="analysis|trend"
+                )
+            ],
+            [InlineKeyboardButton(text="📈 График", callback_data="analysis|chart")],
             [InlineKeyboardButton(text="⏮ Назад", callback_data="back|athlete")],
             [InlineKeyboardButton(text="⏪ Выход", callback_data="main|menu")],
         ]
@@ -231,11 +330,31 @@ def old_count_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
-def exercises_keyboard(athlete_name: str):
-    exercises = [
-        ex for ex in get_exercises(athlete_name) if not ex.strip().startswith("-")
+async def active_exercises(athlete_name: str) -> list[str]:
+    return [
+        ex
+        for ex in await read_once(google_sheets.get_exercises, athlete_name)
+        if not ex.strip().startswith("-")
+    ]
+
+
+async def shown_exercises(user_id: int, athlete_name: str) -> list[str]:
+    """
+    Упражнения в том порядке, в каком их видел пользователь на клавиатуре.
+    """
+    state = USER_STATE.get(user_id) or {}
+    return state.get("exercise_list") or await active_exercises(athlete_name)
+
+
+def exercises_keyboard(exercises: list[str]):
+    buttons = [
+        # Поиск по названию в inline-режиме: @бот подтяг
+        [
+            InlineKeyboardButton(
+                text="🔎 Найти упражнение", switch_inline_query_current_chat=""
+            )
+        ]
     ]
-    buttons = []
     for idx, ex in enumerate(exercises):
         buttons.append(
             [InlineKeyboardButton(text=ex, callback_data=f"exercise|{idx}")]
@@ -247,10 +366,19 @@ def exercises_keyboard(athlete_name: str):
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def deactivate_exercises_keyboard(athlete_name: str):
-    exercises = [
-        ex for ex in get_exercises(athlete_name) if not ex.strip().startswith("-")
+def chart_exercises_keyboard(exercises: list[str]):
+    buttons = [
+        [InlineKeyboardButton(text=ex, callback_data=f"chart|{idx}")]
+        for idx, ex in enumerate(exercises)
     ]
+    buttons.append([InlineKeyboardButton(text="⏮ Назад", callback_data="back|athlete")])
+    buttons.append(
+        [InlineKeyboardButton(text="⏪ Выход в главное меню", callback_data="main|menu")]
+    )
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def deactivate_exercises_keyboard(exercises: list[str]):
     buttons = []
     for idx, ex in enumerate(exercises):
         buttons.append(
@@ -275,8 +403,129 @@ async def cmd_version(message: Message):
     await message.answer(
         f"Текущие версии:\n"
         f"<b>fitlogsbot.py:</b> {VERSION}\n"
-        f"<b>google_sheets.py:</b> {GS_VERSION}"
+        f"<b>google_sheets.py:</b> {google_sheets.VERSION}"
+    )
+
+
+# -----------------------------
+# /dashboard — сводка по всем атлетам
+# -----------------------------
+@router.message(Command("dashboard"))
+async def cmd_dashboard(message: Message):
+    if not is_allowed_user(message):
+        await message.answer(UNAUTHORIZED_TEXT)
+        return
+
+    lines = ["Сводка по всем атлетам:\n"]
+    for athlete_name in athletes_config.snapshot():
+        try:
+            history = await read_once(google_sheets.get_history_async, athlete_name)
+            lines.append(analytics.dashboard_line(athlete_name, history))
+        except Exception as e:
+            lines.append(f"<b>{athlete_name}</b>: ошибка — {e}")
+
+    await message.answer("\n".join(lines))
+
+
+# -----------------------------
+# /archive — перенос старых тренировок в листы архива
+# -----------------------------
+@router.message(Command("archive"))
+async def cmd_archive(message: Message):
+    if not is_allowed_user(message):
+        await message.answer(UNAUTHORIZED_TEXT)
+        return
+
+    lines = ["Перенос старых тренировок в архив:\n"]
+    for athlete_name in athletes_config.snapshot():
+        try:
+            # deleteRange сдвигает ячейки строки: параллельная запись для этого
+            # атлета попала бы в устаревшую колонку — ждём её, как запись
+            async with throttling.athlete_lock(athlete_name):
+                rows, cells, years = await asyncio.to_thread(
+                    google_sheets.archive_old_cells, athlete_name
+                )
+        except Exception as e:
+            lines.append(f"<b>{athlete_name}</b>: ошибка — {e}")
+            continue
+        if cells:
+            years_text = ", ".join(str(y) for y in years)
+            lines.append(
+                f"<b>{athlete_name}</b>: {cells} ячеек из {rows} упражнений "
+                f"(архив {years_text})"
+            )
+        else:
+            lines.append(f"<b>{athlete_name}</b>: переносить нечего")
+
+    await message.answer("\n".join(lines))
+
+
+# -----------------------------
+# /digest — подписка на еженедельную сводку
+# -----------------------------
+@router.message(Command("digest"))
+async def cmd_digest(message: Message, command: CommandObject):
+    if not is_allowed_user(message):
+        await message.answer(UNAUTHORIZED_TEXT)
+        return
+
+    if (command.args or "").strip().lower() == "off":
+        digest.unsubscribe(message.chat.id)
+        await message.answer("Еженедельная сводка отключена")
+        return
+
+    digest.subscribe(message.chat.id, message.from_user.username)
+    await message.answer(
+        "Сводка будет приходить каждую неделю. Отключить: /digest off\n"
+        "Последняя сводка:"
     )
+    for text in await digest.digest_messages():
+        await message.answer(text)
+
+
+# -----------------------------
+# /queue — очередь исходящих сообщений
+# -----------------------------
+@router.message(Command("queue"))
+async def cmd_queue(message: Message):
+    if not is_allowed_user(message):
+        await message.answer(UNAUTHORIZED_TEXT)
+        return
+
+    await message.answer(f"Исходящие сообщения: {OUTBOUND.stats()}")
+
+
+@router.message(Command("cache"))
+async def cmd_cache(message: Message):
+    if not is_allowed_user(message):
+        await message.answer(UNAUTHORIZED_TEXT)
+        return
+
+    if not startup_profile.is_loaded(google_sheets):
+        await message.answer("Кэши таблиц пусты")
+        return
+
+    def report() -> str:
+        # Обход всех объектов кэшей — в потоке
+        cache = google_sheets.CACHE
+        lines = []
+        for name in cache.recent():
+            parts = google_sheets.cache_footprint(name)
+            details = ", ".join(
+                f"{part} {size // 1024}" for part, size in parts.items()
+            )
+            lines.append(
+                f"<b>{html.escape(name)}</b>: "
+                f"{sum(parts.values()) // 1024} КБ ({details})"
+            )
+        lines.append(
+            f"\nВсего {cache.total() / 1024 / 1024:.1f} из "
+            f"{cache.limit / 1024 / 1024:.0f} МБ, сброшено по бюджету: {cache.evicted}"
+        )
+        return "\n".join(lines)
+
+    text = await asyncio.to_thread(report)
+    await message.answer("Кэши атлетов, от недавних (КБ):\n" + text)
 
 
 # -----------------------------
@@ -345,8 +594,14 @@ async def cb_athlete(callback: CallbackQuery):
 
     user_id = callback.from_user.id
     _, athlete_name = callback.data.split("|", 1)
+    if athlete_name not in athletes_config.snapshot():
+        await callback.answer("Такого атлета больше нет в списке", show_alert=True)
+        return
+
     reset_user_state(user_id)
     USER_STATE[user_id]["athlete"] = athlete_name
+    # Таблица открывается и история грузится, пока пользователь выбирает действие
+    run_in_background(google_sheets.warm_up(athlete_name))
 
     await callback.message.edit_text(
         f"Выбран атлет: <b>{athlete_name}</b>\nВыбери действие:",
@@ -407,9 +662,11 @@ async def cb_train(callback: CallbackQuery):
     if kind == "add_workout":
         USER_STATE[user_id]["awaiting_volume"] = False
         USER_STATE[user_id]["awaiting_new_exercise"] = False
+        exercises = await active_exercises(state["athlete"])
+        USER_STATE[user_id]["exercise_list"] = exercises
         await callback.message.edit_text(
             f"Атлет: <b>{state['athlete']}</b>\nВыбери упражнение:",
-            reply_markup=exercises_keyboard(state["athlete"]),
+            reply_markup=exercises_keyboard(exercises),
         )
 
     elif kind == "add_exercise":
@@ -442,10 +699,12 @@ async def cb_train(callback: CallbackQuery):
     elif kind == "deactivate":
         USER_STATE[user_id]["awaiting_new_exercise"] = False
         USER_STATE[user_id]["awaiting_volume"] = False
+        exercises = await active_exercises(state["athlete"])
+        USER_STATE[user_id]["exercise_list"] = exercises
         await callback.message.edit_text(
             f"Атлет: <b>{state['athlete']}</b>\n\n"
             f"Выбери упражнение, которое нужно сделать неактуальным:",
-            reply_markup=deactivate_exercises_keyboard(state["athlete"]),
+            reply_markup=deactivate_exercises_keyboard(exercises),
         )
 
     await callback.answer()
@@ -500,46 +759,350 @@ async def cb_exercise(callback: CallbackQuery):
         await callback.answer("Неверный формат callback данных", show_alert=True)
         return
 
-    exercises = [
-        ex for ex in get_exercises(state["athlete"]) if not ex.strip().startswith("-")
-    ]
+    exercises = await shown_exercises(user_id, state["athlete"])
     try:
         exercise_name = exercises[idx]
     except IndexError:
         await callback.answer("Не удалось найти упражнение", show_alert=True)
         return
 
+    select_exercise(user_id, exercise_name)
+    text, markup = volume_prompt(state["athlete"], exercise_name)
+    await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer()
+
+
+def select_exercise(user_id: int, exercise_name: str):
     USER_STATE[user_id]["exercise"] = exercise_name
     USER_STATE[user_id]["awaiting_volume"] = True
     USER_STATE[user_id]["awaiting_new_exercise"] = False
 
-    await callback.message.edit_text(
-        f"Атлет: <b>{state['athlete']}</b>\n"
+
+def format_last_cells(cells: list[str]) -> str:
+    """
+    ["5.12\n8x10\n8x10"] -> "5.12: 8x10, 8x10" построчно, старые сверху.
+    """
+    lines = []
+    for cell in cells:
+        date_str, *sets = split_cell(cell) or [""]
+        lines.append(f"{html.escape(date_str)}: {html.escape(', '.join(sets))}")
+    return "\n".join(lines)
+
+
+def volume_prompt(athlete_name: str, exercise_name: str):
+    """
+    Текст и клавиатура запроса объёма. Прошлые тренировки — из памяти
+    (google_sheets.last_cells), выбор упражнения не читает таблицу.
+    """
+    cells = google_sheets.last_cells(athlete_name, exercise_name)
+    last = ""
+    if cells:
+        last = f"Последние тренировки:\n<code>{format_last_cells(cells)}</code>\n\n"
+
+    text = (
+        f"Атлет: <b>{athlete_name}</b>\n"
         f"Упражнение: <b>{exercise_name}</b>\n\n"
+        f"{last}"
         f"Теперь напиши объём в формате:\n"
         f"<code>дата кол-во_подходовxвесxповторы ...</code>\n"
         f"Пример:\n"
         f"<code>5.12 2x5x10 3x8x10</code>\n\n"
         f"Кнопки:\n"
         f"⏮ Назад — к выбору упражнений\n"
-        f"⏪ Выход — в главное меню",
-        reply_markup=InlineKeyboardMarkup(
-            inline_keyboard=[
-                [InlineKeyboardButton(text="⏮ Назад", callback_data="back|athlete")],
-                [
-                    InlineKeyboardButton(
-                        text="⏪ Выход в главное меню", callback_data="main|menu"
-                    )
-                ],
+        f"⏪ Выход — в главное меню"
+    )
+
+    buttons = []
+    if cells:
+        buttons.append(
+            [
+                InlineKeyboardButton(
+                    text="🔁 повторить с сегодняшней датой", callback_data="repeat|last"
+                )
             ]
+        )
+    buttons.append([InlineKeyboardButton(text="⏮ Назад", callback_data="back|athlete")])
+    buttons.append(
+        [InlineKeyboardButton(text="⏪ Выход в главное меню", callback_data="main|menu")]
+    )
+    return text, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def workout_written_text(
+    athlete_name: str, exercise_name: str, lines: list[str], broken: list
+) -> str:
+    reply = (
+        "Записал тренировку (через меню):\n"
+        f"Атлет: <b>{athlete_name}</b>\n"
+        f"Упражнение: <b>{exercise_name}</b>\n\n"
+        f"<code>{chr(10).join(lines)}</code>"
+    )
+    if broken:
+        reply += "\n\n" + format_records(broken)
+    return reply
+
+
+def undo_keyboard(entry_id: str, markup=None) -> InlineKeyboardMarkup:
+    """
+    Кнопка "↩️ Отменить" для записи (над кнопками markup, если он есть).
+    """
+    button = InlineKeyboardButton(text="↩️ Отменить", callback_data=f"undo|{entry_id}")
+    rows = [[button]]
+    if markup is not None:
+        rows += markup.inline_keyboard
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def remember_write(
+    user_id: int, athlete_name, exercise_name, lines, text: str, undo: dict, markup=None
+) -> InlineKeyboardMarkup:
+    """
+    Запись сделана: запомнить её для отмены и ответ на неё — для повторов.
+    """
+    entry_id = undo_log.record(user_id, undo)
+    LEDGER.record_write(athlete_name, exercise_name, "\n".join(lines), text, entry_id)
+    return undo_keyboard(entry_id, markup)
+
+
+def repeated_write(athlete_name, exercise_name, lines, markup=None):
+    """
+    Та же тренировка уже записана недавно — (текст, клавиатура) ответа
+    из журнала, без похода в таблицу. None — записи не было.
+    """
+    entry = LEDGER.recent_write(athlete_name, exercise_name, "\n".join(lines))
+    if entry is None:
+        return None
+    text = "☑️ Это уже записано, повторно не пишу.\n\n" + entry["text"]
+    return text, undo_keyboard(entry["undo_id"], markup)
+
+
+# -----------------------------
+# Callback: повторить последнюю тренировку с сегодняшней датой
+# -----------------------------
+@router.callback_query(F.data.startswith("repeat|"))
+async def cb_repeat(callback: CallbackQuery):
+    if not is_allowed_user(callback):
+        await callback.answer(UNAUTHORIZED_TEXT, show_alert=True)
+        return
+
+    user_id = callback.from_user.id
+    state = USER_STATE.get(user_id)
+    if not state or not state.get("athlete") or not state.get("exercise"):
+        await callback.answer("Сначала выбери упражнение", show_alert=True)
+        return
+
+    athlete_name, exercise_name = state["athlete"], state["exercise"]
+    cells = google_sheets.last_cells(athlete_name, exercise_name)
+    if not cells:
+        await callback.answer("Нет данных о прошлой тренировке", show_alert=True)
+        return
+
+    today = date.today()
+    lines = [f"{today.day}.{today.month}"] + split_cell(cells[-1])[1:]
+    repeated = repeated_write(
+        athlete_name, exercise_name, lines, training_menu_keyboard()
+    )
+    if repeated:
+        USER_STATE[user_id]["awaiting_volume"] = False
+        text, markup = repeated
+        await callback.message.edit_text(text, reply_markup=markup)
+        await callback.answer()
+        return
+
+    try:
+        # Тот же путь, что и при ручном вводе: строка — из индекса строк,
+        # одно чтение строки для проверки и свободной колонки, одна запись
+        broken, undo = await asyncio.to_thread(
+            google_sheets.add_workout_cell,
+            athlete_name=athlete_name,
+            exercise_name=exercise_name,
+            lines=lines,
+        )
+    except Exception as e:
+        await callback.message.answer(f"Ошибка при записи тренировки: {e}")
+        await callback.answer()
+        return
+
+    USER_STATE[user_id]["awaiting_volume"] = False
+    text = workout_written_text(athlete_name, exercise_name, lines, broken)
+    await callback.message.edit_text(
+        text,
+        reply_markup=remember_write(
+            user_id,
+            athlete_name,
+            exercise_name,
+            lines,
+            text,
+            undo,
+            training_menu_keyboard(),
         ),
     )
     await callback.answer()
 
 
+# -----------------------------
+# Callback: отменить последнюю запись
+# -----------------------------
+@router.callback_query(F.data.startswith("undo|"))
+async def cb_undo(callback: CallbackQuery):
+    if not is_allowed_user(callback):
+        await callback.answer(UNAUTHORIZED_TEXT, show_alert=True)
+        return
+
+    user_id = callback.from_user.id
+    entry = undo_log.take(user_id, callback.data.split("|", 1)[1])
+    if entry is None:
+        await callback.answer(
+            "Отменять нечего: запись уже отменена или устарела", show_alert=True
+        )
+        return
+
+    try:
+        # Координаты записаны при записи — один batch_update, без чтений
+        await asyncio.to_thread(google_sheets.undo_write, entry)
+    except ValueError as e:
+        await callback.answer(str(e), show_alert=True)
+        return
+    except Exception as e:
+        undo_log.put_back(user_id, entry)
+        await callback.answer(f"Не получилось отменить: {e}", show_alert=True)
+        return
+
+    # Ту же тренировку снова можно записать
+    LEDGER.forget_write(entry["athlete"], entry["exercise"], entry["text"])
+
+    await callback.message.edit_text(
+        callback.message.html_text + "\n\n↩️ Отменено", reply_markup=None
+    )
+    await callback.answer()
+
+
+# -----------------------------
+# Поиск упражнения: inline-режим (@бот подтяг) и /ex <название>
+# -----------------------------
+SEARCH_RESULTS_LIMIT = 20
+
+
+@router.inline_query()
+async def inline_exercise_search(query: InlineQuery):
+    if not is_allowed_user(query):
+        await query.answer([], cache_time=60, is_personal=True)
+        return
+
+    state = USER_STATE.get(query.from_user.id) or {}
+    athlete_name = state.get("athlete")
+    if not athlete_name:
+        await query.answer(
+            [],
+            cache_time=0,
+            is_personal=True,
+            button=InlineQueryResultsButton(
+                text="Сначала выбери атлета", start_parameter="people"
+            ),
+        )
+        return
+
+    # Первый запрос строит индекс по копии листа — в потоке;
+    # дальше поиск в памяти, доли миллисекунды
+    index = await read_once(google_sheets.get_search_index, athlete_name)
+    matches = index.search(query.query, limit=SEARCH_RESULTS_LIMIT)
+    results = [
+        InlineQueryResultArticle(
+            id=str(i),
+            title=name,
+            description=athlete_name,
+            input_message_content=InputTextMessageContent(
+                message_text=f"/ex {html.escape(name)}"
+            ),
+        )
+        for i, name in enumerate(matches)
+    ]
+    await query.answer(results, cache_time=0, is_personal=True)
+
+
+@router.message(Command("ex"))
+async def cmd_ex(message: Message, command: CommandObject):
+    if not is_allowed_user(message):
+        await message.answer(UNAUTHORIZED_TEXT)
+        return
+
+    user_id = message.from_user.id
+    state = USER_STATE.get(user_id)
+    if not state or not state.get("athlete"):
+        await message.answer("Сначала выбери атлета через /people")
+        return
+
+    athlete_name = state["athlete"]
+    query = (command.args or "").strip()
+    index = await read_once(google_sheets.get_search_index, athlete_name)
+    exercise_name = index.find(query) if query else None
+
+    if exercise_name:
+        select_exercise(user_id, exercise_name)
+        text, markup = volume_prompt(athlete_name, exercise_name)
+        await message.answer(text, reply_markup=markup)
+        return
+
+    matches = index.search(query, limit=SEARCH_RESULTS_LIMIT)
+    if not matches:
+        await message.answer(f"Ничего не нашёл по запросу «{html.escape(query)}»")
+        return
+    USER_STATE[user_id]["exercise_list"] = matches
+    await message.answer(
+        f"Атлет: <b>{athlete_name}</b>\nВыбери упражнение:",
+        reply_markup=exercises_keyboard(matches),
+    )
+
+
+# -----------------------------
+# Выгрузка всей истории: /export [csv|jsonl]
+# -----------------------------
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject):
+    if not is_allowed_user(message):
+        await message.answer(UNAUTHORIZED_TEXT)
+        return
+
+    state = USER_STATE.get(message.from_user.id)
+    if not state or not state.get("athlete"):
+        await message.answer("Сначала выбери атлета через /people")
+        return
+
+    fmt = (command.args or "csv").strip().lower()
+    if fmt not in ("csv", "jsonl"):
+        await message.answer("Формат выгрузки: /export csv или /export jsonl")
+        return
+
+    athlete_name = state["athlete"]
+    await message.answer(f"Готовлю выгрузку <b>{athlete_name}</b>…")
+    try:
+        # Чтение блоками, разбор и сжатие — в потоке, файл на диске
+        path, count = await asyncio.to_thread(
+            export.export_history, athlete_name, fmt
+        )
+    except Exception as e:
+        await message.answer(f"Ошибка при выгрузке: {e}")
+        return
+
+    try:
+        await message.answer_document(
+            FSInputFile(path, filename=export.export_filename(athlete_name, fmt)),
+            caption=f"{athlete_name}: {count} подходов",
+        )
+    finally:
+        os.remove(path)
+
+
 # -----------------------------
 # Callback: аналитика
 # -----------------------------
+ANALYSIS_REPORTS = {
+    "tonnage": "tonnage_report",
+    "e1rm": "e1rm_report",
+    "trend": "trend_report",
+}
+
+
 @router.callback_query(F.data.startswith("analysis|"))
 async def cb_analysis(callback: CallbackQuery):
     if not is_allowed_user(callback):
@@ -561,9 +1124,89 @@ async def cb_analysis(callback: CallbackQuery):
             reply_markup=old_count_keyboard(),
         )
 
+    elif kind == "chart":
+        try:
+            history = await read_once(
+                google_sheets.get_history_async, state["athlete"]
+            )
+            exercises = history.active_exercises()
+        except Exception as e:
+            await callback.message.answer(f"Ошибка при получении аналитики: {e}")
+            await callback.answer()
+            return
+
+        await callback.message.edit_text(
+            f"Атлет: <b>{state['athlete']}</b>\n\n"
+            f"Выбери упражнение для графика:",
+            reply_markup=chart_exercises_keyboard(exercises),
+        )
+
+    elif kind in ANALYSIS_REPORTS:
+        try:
+            history = await read_once(
+                google_sheets.get_history_async, state["athlete"]
+            )
+            report = getattr(analytics, ANALYSIS_REPORTS[kind])
+            reply = report(state["athlete"], history)
+        except Exception as e:
+            await callback.message.answer(f"Ошибка при получении аналитики: {e}")
+            await callback.answer()
+            return
+
+        await callback.message.answer(
+            f"Атлет: <b>{state['athlete']}</b>\n\n{reply}"
+        )
+
     await callback.answer()
 
 
+# -----------------------------
+# Callback: график по упражнению
+# -----------------------------
+@router.callback_query(F.data.startswith("chart|"))
+async def cb_chart(callback: CallbackQuery):
+    if not is_allowed_user(callback):
+        await callback.answer(UNAUTHORIZED_TEXT, show_alert=True)
+        return
+
+    user_id = callback.from_user.id
+    state = USER_STATE.get(user_id)
+    if not state or not state.get("athlete"):
+        await callback.answer("Сначала выбери атлета через /people", show_alert=True)
+        return
+
+    _, idx_str = callback.data.split("|", 1)
+    try:
+        idx = int(idx_str)
+    except ValueError:
+        await callback.answer("Неверный индекс", show_alert=True)
+        return
+
+    await callback.answer("Рисую график…")
+
+    try:
+        history = await read_once(
+            google_sheets.get_history_async, state["athlete"]
+        )
+        exercise_name = history.active_exercises()[idx]
+        png = await get_progress_chart(state["athlete"], history, exercise_name)
+    except IndexError:
+        await callback.message.answer("Не удалось найти упражнение")
+        return
+    except Exception as e:
+        await callback.message.answer(f"Ошибка при построении графика: {e}")
+        return
+
+    if png is None:
+        await callback.message.answer("Нет данных для графика по этому упражнению.")
+        return
+
+    await callback.message.answer_photo(
+        BufferedInputFile(png, filename="progress.png"),
+        caption=f"Атлет: <b>{state['athlete']}</b>\nУпражнение: <b>{exercise_name}</b>",
+    )
+
+
 # -----------------------------
 # Callback: выбор количества старых упражнений (1–9)
 # -----------------------------
@@ -591,7 +1234,9 @@ async def cb_oldn(callback: CallbackQuery):
         return
 
     try:
-        items = get_oldest_exercises(state["athlete"], n)
+        items = await read_once(
+            google_sheets.get_oldest_exercises_async, state["athlete"], n
+        )
     except Exception as e:
         await callback.message.answer(f"Ошибка при получении аналитики: {e}")
         await callback.answer()
@@ -636,9 +1281,7 @@ async def cb_deact(callback: CallbackQuery):
         await callback.answer("Неверный индекс", show_alert=True)
         return
 
-    exercises = [
-        ex for ex in get_exercises(state["athlete"]) if not ex.strip().startswith("-")
-    ]
+    exercises = await shown_exercises(user_id, state["athlete"])
     try:
         exercise_name = exercises[idx]
     except IndexError:
@@ -646,7 +1289,10 @@ async def cb_deact(callback: CallbackQuery):
         return
 
     try:
-        make_exercise_inactive(state["athlete"], exercise_name)
+        await asyncio.to_thread(
+            google_sheets.make_exercise_inactive, state["athlete"], exercise_name
+        )
+        USER_STATE[user_id]["exercise_list"] = None
         await callback.message.edit_text(
             f"Атлет: <b>{state['athlete']}</b>\n\n"
             f"Упражнение <b>{exercise_name}</b> перенесено вниз и "
@@ -687,16 +1333,32 @@ async def handle_semicolon_workout(message: Message):
                 )
             ex_name, volume_part = [p.strip() for p in text.split(";", 1)]
             lines = parse_volume_string(volume_part)
-            add_exercise_with_workout(state["athlete"], ex_name, lines)
+            athlete_name = state["athlete"]
+            repeated = repeated_write(athlete_name, ex_name, lines)
+            if repeated:
+                USER_STATE[user_id]["awaiting_new_exercise"] = False
+                text, markup = repeated
+                await message.answer(text, reply_markup=markup)
+                return
+
+            undo = await asyncio.to_thread(
+                google_sheets.add_exercise_with_workout, athlete_name, ex_name, lines
+            )
 
             USER_STATE[user_id]["awaiting_new_exercise"] = False
 
-            await message.answer(
+            reply = (
                 "Добавил новое упражнение и тренировку:\n"
-                f"Атлет: <b>{state['athlete']}</b>\n"
+                f"Атлет: <b>{athlete_name}</b>\n"
                 f"Упражнение: <b>{ex_name}</b>\n\n"
                 f"<code>{chr(10).join(lines)}</code>"
             )
+            await message.answer(
+                reply,
+                reply_markup=remember_write(
+                    user_id, athlete_name, ex_name, lines, reply, undo
+                ),
+            )
 
         except Exception as e:
             await message.answer(f"Ошибка при добавлении упражнения: {e}")
@@ -707,7 +1369,16 @@ async def handle_semicolon_workout(message: Message):
         athlete_name, date_str, exercise_name, weight_str, sets, reps = \
             parse_workout_message(message.text)
 
-        add_workout(
+        # Сообщение отправили ещё раз — отвечаем тем же, в таблицу не пишем
+        lines = google_sheets.workout_lines(date_str, weight_str, sets, reps)
+        repeated = repeated_write(athlete_name, exercise_name, lines)
+        if repeated:
+            text, markup = repeated
+            await message.answer(text, reply_markup=markup)
+            return
+
+        broken, undo = await asyncio.to_thread(
+            google_sheets.add_workout,
             athlete_name=athlete_name,
             date_str=date_str,
             exercise_name=exercise_name,
@@ -716,12 +1387,20 @@ async def handle_semicolon_workout(message: Message):
             reps=reps,
         )
 
-        await message.answer(
+        reply = (
             f"Записал тренировку (старый формат):\n"
             f"<b>{athlete_name}</b>\n"
             f"{date_str} — {exercise_name}\n"
             f"{weight_str} × {sets} × {reps}"
         )
+        if broken:
+            reply += "\n\n" + format_records(broken)
+        await message.answer(
+            reply,
+            reply_markup=remember_write(
+                user_id, athlete_name, exercise_name, lines, reply, undo
+            ),
+        )
 
     except Exception as e:
         await message.answer(f"Ошибка: {e}")
@@ -747,18 +1426,28 @@ async def handle_any_message(message: Message):
         and state.get("exercise")
     ):
         try:
+            athlete_name, exercise_name = state["athlete"], state["exercise"]
             lines = parse_volume_string(message.text)
-            add_workout_cell(
-                athlete_name=state["athlete"],
-                exercise_name=state["exercise"],
+            repeated = repeated_write(athlete_name, exercise_name, lines)
+            if repeated:
+                USER_STATE[user_id]["awaiting_volume"] = False
+                text, markup = repeated
+                await message.answer(text, reply_markup=markup)
+                return
+
+            broken, undo = await asyncio.to_thread(
+                google_sheets.add_workout_cell,
+                athlete_name=athlete_name,
+                exercise_name=exercise_name,
                 lines=lines,
             )
 
+            text = workout_written_text(athlete_name, exercise_name, lines, broken)
             await message.answer(
-                "Записал тренировку (через меню):\n"
-                f"Атлет: <b>{state['athlete']}</b>\n"
-                f"Упражнение: <b>{state['exercise']}</b>\n\n"
-                f"<code>{chr(10).join(lines)}</code>"
+                text,
+                reply_markup=remember_write(
+                    user_id, athlete_name, exercise_name, lines, text, undo
+                ),
             )
 
             USER_STATE[user_id]["awaiting_volume"] = False
@@ -784,8 +1473,12 @@ async def start_webserver():
     async def handle(request):
         return web.Response(text="Bot is running")
 
-    app = web.Application()
+    app = web.Application(middlewares=[sticky_middleware(WEBHOOK_PATH)])
     app.add_routes([web.get("/", handle)])
+    if WEBHOOK_URL:
+        SimpleRequestHandler(
+            dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET
+        ).register(app, path=WEBHOOK_PATH)
 
     runner = web.AppRunner(app)
     await runner.setup()
@@ -793,18 +1486,136 @@ async def start_webserver():
     port = int(os.getenv("PORT", 8080))
     site = web.TCPSite(runner, "0.0.0.0", port)
     await site.start()
-    logging.info(
-        f"Web server started on port {port}. "
-        f"Bot version {VERSION}, Sheets version {GS_VERSION}"
-    )
+    logging.info(f"Web server started on port {port}. Bot version {VERSION}")
+    return runner
+
+
+# -----------------------------
+# Замер старта: до первого getUpdates / setWebhook
+# -----------------------------
+async def startup_request_middleware(make_request, bot, method):
+    response = await make_request(bot, method)
+    if isinstance(method, (GetUpdates, SetWebhook)):
+        bot.session.middleware.unregister(startup_request_middleware)
+        startup_profile.mark(f"first_{type(method).__name__}")
+        run_in_background(warm_up_modules())
+    return response
+
+
+async def warm_up_modules():
+    """
+    Бот уже отвечает — теперь в потоке подгружаем тяжёлые модули,
+    чтобы первый пользователь не ждал импорта gspread/numpy.
+    """
+    await asyncio.to_thread(startup_profile.preload, google_sheets, analytics, digest)
+    startup_profile.mark("warm_up")
+    startup_profile.report()
+
+    # Фоновая проверка ручных правок таблиц с загруженным кэшем
+    run_in_background(google_sheets.poll_external_changes())
+    # Еженедельная сводка: подготовка ночью, рассылка утром
+    run_in_background(digest.run_schedule())
+
+    # Атлеты, чьи данные были в кэше до перезапуска
+    for athlete_name in get_backend().get("lifecycle", "warm_athletes") or []:
+        if athlete_name in athletes_config.snapshot():
+            run_in_background(google_sheets.warm_up(athlete_name))
+
+
+# -----------------------------
+# Остановка (SIGTERM при передеплое)
+# -----------------------------
+def register_shutdown(runner: web.AppRunner):
+    async def stop_updates():
+        if WEBHOOK_URL:
+            # Новые webhook-запросы получат отказ, Telegram повторит их позже
+            for site in list(runner.sites):
+                await site.stop()
+        else:
+            try:
+                await dp.stop_polling()
+            except RuntimeError:
+                # SIGTERM пришёл раньше, чем запустился polling
+                pass
+
+    async def drain_send_queue():
+        await SEND_QUEUE.join()
+
+    async def cancel_background_tasks():
+        for task in BACKGROUND_TASKS:
+            task.cancel()
+        await asyncio.gather(*BACKGROUND_TASKS, return_exceptions=True)
+
+    async def persist_state():
+        if startup_profile.is_loaded(google_sheets):
+            get_backend().set(
+                "lifecycle", "warm_athletes", google_sheets.cached_athletes()
+            )
+        get_backend().close()
+
+    async def close_connections():
+        await runner.cleanup()
+        await bot.session.close()
+        await sticky_routing.close()
+        if startup_profile.is_loaded(google_sheets):
+            google_sheets.close()
+        await asyncio.to_thread(cpu_pool.shutdown)
+
+    LIFECYCLE.on_shutdown("stop_updates", stop_updates, timeout=5)
+    LIFECYCLE.on_shutdown("drain_updates", LIFECYCLE.drain, timeout=LIFECYCLE_DRAIN_SEC)
+    LIFECYCLE.on_shutdown("drain_send_queue", drain_send_queue, timeout=5)
+    LIFECYCLE.on_shutdown("background_tasks", cancel_background_tasks, timeout=2)
+    LIFECYCLE.on_shutdown("persist_state", persist_state, timeout=2)
+    LIFECYCLE.on_shutdown("close_connections", close_connections, timeout=5)
 
 
 # -----------------------------
 # ENTRYPOINT
 # -----------------------------
 async def main():
-    asyncio.create_task(start_webserver())
-    await dp.start_polling(bot)
+    athletes_config.snapshot()
+    run_in_background(athletes_config.watch())
+    run_in_background(SEND_QUEUE.run(bot))
+    startup_profile.mark("registry")
+
+    bot.session.middleware(startup_request_middleware)
+    runner = await start_webserver()
+    startup_profile.mark("web_server")
+
+    register_shutdown(runner)
+    LIFECYCLE.install_signal_handlers()
+    # Где хранится журнал апдейтов — в лог до первого апдейта
+    ledger_store()
+
+    failure = None
+    if WEBHOOK_URL:
+        # Все процессы ставят один и тот же URL — это идемпотентно
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET
+        )
+    else:
+        # Сигналы и закрытие сессии — в lifecycle: ответы начатых
+        # апдейтов должны уйти уже после остановки polling
+        polling = run_in_background(
+            dp.start_polling(bot, handle_signals=False, close_bot_session=False)
+        )
+        stop_wait = asyncio.create_task(LIFECYCLE.stop_requested.wait())
+        await asyncio.wait(
+            {polling, stop_wait}, return_when=asyncio.FIRST_COMPLETED
+        )
+        stop_wait.cancel()
+        if not LIFECYCLE.stop_requested.is_set():
+            # Polling упал (неверный токен, ошибка диспетчера): процесс без
+            # polling не должен выглядеть живым — останавливаемся с ошибкой
+            failure = polling.exception() or RuntimeError("Polling завершился")
+            logging.error(f"Polling остановился: {failure!r}")
+            LIFECYCLE.request_stop()
+
+    await LIFECYCLE.stop_requested.wait()
+    await LIFECYCLE.shutdown()
+    if failure is not None:
+        # Ненулевой код выхода — супервизор перезапустит процесс
+        raise failure
 
 
 if __name__ == "__main__":
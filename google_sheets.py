@@ -1,21 +1,38 @@
 # google_sheets.py — version v1.15
+import asyncio
 import logging
-from datetime import datetime, date
+import os
 
 import gspread
 from google.oauth2.service_account import Credentials
 
-
-VERSION = "v1.15"  # версия этого файла
+import athletes_config
+from archive import (
+    ARCHIVE_HORIZON_DAYS,
+    ARCHIVE_KEEP_CELLS,
+    Archive,
+    build_archive_requests,
+    plan_archive,
+    read_archive,
+)
+from cache_budget import CacheBudget, deep_size
+from change_detector import ChangeDetector
+from cpu_pool import run_cpu
+from exercise_search import ExerciseIndex
+from records import RecordIndex
+from row_index import RowIndex
+from sheet_sync import PackedRows, SheetMirror, full_sync, refresh
+from state_backend import get_backend
+from workout_history import (
+    WorkoutHistory,
+    normalize_exercise_name,
+    oldest_exercises_from_grid,
+    parse_grids,
+    split_cell,
+)
 
 
-# -----------------------------
-# Карта "Имя атлета" -> Spreadsheet ID
-# -----------------------------
-ATHLETE_SHEETS = {
-    "Роман Г.": "1YKpW75xuGky8o7jj-uZ2gQVk2mKHyh_YD4b9z188fHs",
-    "Олег": "1Qsa1tkW7W3aRfqZsACwiRnQdB-lnAD643OK7ABXwG14",
-}
+VERSION = "v1.15"  # версия этого файла
 
 
 # -----------------------------
@@ -28,28 +45,493 @@ SCOPES = [
 
 CREDS_FILE = "/etc/secrets/google-credentials.json"
 
+# google — настоящий API, fake — таблицы в памяти (fake_sheets.py)
+SHEETS_BACKEND = os.getenv("SHEETS_BACKEND", "google")
+
+
+_CLIENT = None
+
+
+def _http_client_class():
+    if SHEETS_BACKEND == "fake":
+        from fake_sheets import FakeHTTPClient as http_client
+    elif SHEETS_BACKEND == "google":
+        http_client = gspread.HTTPClient
+    else:
+        raise RuntimeError(f"Неизвестный SHEETS_BACKEND: {SHEETS_BACKEND}")
+
+    from sheets_trace import SHEETS_TRACE_FILE, traced
+
+    return traced(http_client) if SHEETS_TRACE_FILE else http_client
+
 
 def get_client():
-    creds = Credentials.from_service_account_file(CREDS_FILE, scopes=SCOPES)
-    return gspread.authorize(creds)
+    global _CLIENT
+    if _CLIENT is None:
+        http_client = _http_client_class()
+        if SHEETS_BACKEND == "fake":
+            _CLIENT = gspread.Client(auth=None, http_client=http_client)
+        else:
+            creds = Credentials.from_service_account_file(CREDS_FILE, scopes=SCOPES)
+            _CLIENT = gspread.authorize(creds, http_client=http_client)
+    return _CLIENT
 
 
 # -----------------------------
 # Открытие таблицы / списков
 # -----------------------------
+# athlete -> (spreadsheet_id, sh, ws); таблица открывается при первом обращении
+_SHEETS: dict[str, tuple] = {}
+
+
 def open_athlete_sheet(athlete_name: str):
-    gc = get_client()
-    spreadsheet_id = ATHLETE_SHEETS.get(athlete_name)
+    spreadsheet_id = athletes_config.snapshot().get(athlete_name)
     if not spreadsheet_id:
         raise RuntimeError(f"Нет ID таблицы для '{athlete_name}'")
 
+    gc = get_client()
+    cached = _SHEETS.get(athlete_name)
+    if cached is not None and cached[0] == spreadsheet_id:
+        return gc, cached[1], cached[2]
+
     sh = gc.open_by_key(spreadsheet_id)
     ws = sh.sheet1
+    _SHEETS[athlete_name] = (spreadsheet_id, sh, ws)
+    logging.info(f"Открыл таблицу для {athlete_name}")
     return gc, sh, ws
 
 
 def get_athletes():
-    return list(ATHLETE_SHEETS.keys())
+    return list(athletes_config.snapshot())
+
+
+def _drop_derived_caches(athlete_name: str):
+    _HISTORY.pop(athlete_name, None)
+    _RECORDS.pop(athlete_name, None)
+    _SEARCH.pop(athlete_name, None)
+    _ROWS.pop(athlete_name, None)
+    _LAST_CELLS.pop(athlete_name, None)
+
+
+def _drop_data_caches(athlete_name: str):
+    _ARCHIVES.pop(athlete_name, None)
+    _MIRRORS.pop(athlete_name, None)
+    _STALE.discard(athlete_name)
+    _drop_derived_caches(athlete_name)
+    CHANGES.forget(athlete_name)
+    CACHE.forget(athlete_name)
+
+
+def forget_athletes(athlete_names):
+    """
+    Сбросить всё закэшированное для атлетов (таблица сменилась или атлет удалён).
+    """
+    for name in athlete_names:
+        _SHEETS.pop(name, None)
+        _drop_data_caches(name)
+        _LOCAL_VERSIONS.pop(name, None)
+        logging.info(f"Сбросил кэш атлета {name}")
+
+
+athletes_config.on_change(forget_athletes)
+
+
+def cached_athletes() -> list[str]:
+    """
+    Атлеты с загруженной копией листа — их стоит прогреть после перезапуска.
+    """
+    return list(_MIRRORS)
+
+
+def close():
+    """
+    Закрыть HTTP-сессию клиента Sheets (при остановке бота).
+    """
+    global _CLIENT
+    if _CLIENT is not None:
+        session = getattr(_CLIENT.http_client, "session", None)
+        if session is not None:
+            session.close()
+        _CLIENT = None
+
+
+# -----------------------------
+# Бюджет памяти кэшей (LRU по атлетам)
+# -----------------------------
+def cache_footprint(athlete_name: str) -> dict[str, int]:
+    """
+    Сколько байт занимает каждый кэш атлета. Общие строки (interned
+    названия упражнений) считаются один раз — в первом кэше.
+    """
+    seen = set()
+    parts = {}
+    for part, cache in (
+        ("лист", _MIRRORS),
+        ("архив", _ARCHIVES),
+        ("история", _HISTORY),
+        ("рекорды", _RECORDS),
+        ("поиск", _SEARCH),
+        ("строки", _ROWS),
+        ("последние", _LAST_CELLS),
+    ):
+        obj = cache.get(athlete_name)
+        if obj is not None:
+            parts[part] = deep_size(obj, seen)
+    return parts
+
+
+def _evict(athlete_name: str):
+    # Номер версии и открытая таблица остаются: они почти ничего не весят
+    _drop_data_caches(athlete_name)
+
+
+CACHE = CacheBudget(lambda name: sum(cache_footprint(name).values()), _evict)
+
+
+async def warm_up(athlete_name: str):
+    """
+    Открыть таблицу и загрузить историю заранее, пока пользователь
+    выбирает действие.
+    """
+    try:
+        await asyncio.to_thread(open_athlete_sheet, athlete_name)
+        await get_history_async(athlete_name)
+    except Exception:
+        logging.exception(f"Не удалось прогреть данные для {athlete_name}")
+
+
+# -----------------------------
+# Версии данных атлетов, общие для всех процессов бота
+# -----------------------------
+# Счётчик в общем хранилище растёт при каждой записи через бота (из любого
+# процесса). _LOCAL_VERSIONS — какую версию отражают кэши этого процесса.
+_LOCAL_VERSIONS: dict[str, int] = {}
+
+
+def sync_local_caches(athlete_name: str):
+    """
+    Если в таблицу атлета писал другой процесс или её правили руками —
+    дочитать изменения в локальную копию листа.
+    """
+    CACHE.touch(athlete_name)
+    shared = get_backend().get("sheet_version", athlete_name) or 0
+    local = _LOCAL_VERSIONS.setdefault(athlete_name, shared)
+    if local != shared:
+        _mark_stale(athlete_name)
+        _LOCAL_VERSIONS[athlete_name] = shared
+        logging.info(f"Данные {athlete_name} изменены другим процессом")
+    _ensure_fresh(athlete_name)
+    if athlete_name in _STALE:
+        _resync(athlete_name)
+
+
+def _note_write(athlete_name: str):
+    """
+    Вызывается после каждой своей записи (кэши уже обновлены локально).
+    """
+    shared = get_backend().incr("sheet_version", athlete_name)
+    if _LOCAL_VERSIONS.get(athlete_name) != shared - 1:
+        # Между нашими записями писал кто-то ещё
+        _mark_stale(athlete_name)
+    _LOCAL_VERSIONS[athlete_name] = shared
+    if _has_cache(athlete_name):
+        CHANGES.note_own_write(athlete_name)
+
+
+# -----------------------------
+# Ручные правки таблиц (version файла в Drive)
+# -----------------------------
+DRIVE_FILE_URL = "https://www.googleapis.com/drive/v3/files/{}"
+
+
+def get_drive_version(athlete_name: str) -> int:
+    """
+    version файла таблицы в Drive — растёт при любом изменении.
+    Один лёгкий запрос метаданных, квоту Sheets не тратит.
+    """
+    spreadsheet_id = athletes_config.snapshot().get(athlete_name)
+    if not spreadsheet_id:
+        raise RuntimeError(f"Нет ID таблицы для '{athlete_name}'")
+
+    gc = get_client()
+    http = getattr(gc, "http_client", gc)
+    response = http.request(
+        "get",
+        DRIVE_FILE_URL.format(spreadsheet_id),
+        params={"fields": "version,modifiedTime", "supportsAllDrives": True},
+    )
+    return int(response.json()["version"])
+
+
+def _on_external_change(athlete_name: str):
+    _mark_stale(athlete_name)
+    # Остальные процессы тоже должны дочитать изменения
+    _LOCAL_VERSIONS[athlete_name] = get_backend().incr("sheet_version", athlete_name)
+
+
+CHANGES = ChangeDetector(get_drive_version, _on_external_change)
+
+
+async def poll_external_changes():
+    await CHANGES.poll()
+
+
+def _has_cache(athlete_name: str) -> bool:
+    return (
+        athlete_name in _MIRRORS
+        or athlete_name in _HISTORY
+        or athlete_name in _RECORDS
+    )
+
+
+def _ensure_fresh(athlete_name: str):
+    """
+    Перед использованием кэша: не поменяли ли таблицу руками.
+    Без кэша проверять нечего — данные всё равно будут прочитаны.
+    """
+    if _has_cache(athlete_name):
+        CHANGES.ensure_fresh(athlete_name)
+
+
+# -----------------------------
+# Локальная копия листа (инкрементальная синхронизация)
+# -----------------------------
+_MIRRORS: dict[str, SheetMirror] = {}
+# Атлеты, чью таблицу меняли не мы: перед чтением дочитать хвосты
+_STALE: set[str] = set()
+
+
+def _mark_stale(athlete_name: str):
+    if athlete_name in _MIRRORS:
+        _STALE.add(athlete_name)
+    else:
+        _ARCHIVES.pop(athlete_name, None)
+        _drop_derived_caches(athlete_name)
+
+
+def _resync(athlete_name: str):
+    """
+    Дочитать изменения листа одним batchGet и обновить всё, что на нём
+    построено. Полное чтение — если поменялся столбец A, изменилась уже
+    известная ячейка (её могли сдвинуть удалением ячеек левее) или хвосты
+    строк не изменились (значит, правили ячейку в середине строки).
+    """
+    _STALE.discard(athlete_name)
+    mirror = _MIRRORS.get(athlete_name)
+    if mirror is None:
+        _drop_derived_caches(athlete_name)
+        return
+
+    _, sh, ws = open_athlete_sheet(athlete_name)
+    result = refresh(sh, ws, mirror)
+
+    if result.structural or result.modified or not result.changed:
+        # Правка известной ячейки может быть сдвигом всей строки влево
+        # (удалили ячейки, перенесли в архив), а без изменений в хвостах
+        # версия всё равно сменилась — правили старую ячейку. По хвостам
+        # середину строки не восстановить: читаем лист целиком. Архив —
+        # тоже: ячейки мог перенести /archive другого процесса
+        _MIRRORS[athlete_name] = full_sync(ws)
+        _ARCHIVES.pop(athlete_name, None)
+        _drop_derived_caches(athlete_name)
+        CACHE.update(athlete_name)
+    elif result.appended:
+        history = _HISTORY.get(athlete_name)
+        records = _RECORDS.get(athlete_name)
+        for row, col, text in result.appended:
+            exercise_name = mirror.rows[row - 1][0]
+            lines = split_cell(text)
+            if history is not None:
+                history.append_cell(exercise_name, col, lines)
+            if records is not None and exercise_name in records:
+                records.add_session(exercise_name, lines)
+            _remember_cells(athlete_name, exercise_name, [text], append=True)
+
+
+def get_all_values(athlete_name: str) -> PackedRows:
+    """
+    Значения листа (как ws.get_all_values(), но без пустых хвостов строк)
+    из локальной копии. Лист целиком читается только в первый раз.
+    Строки хранятся упакованными: rows[i] каждый раз отдаёт новый список.
+    """
+    sync_local_caches(athlete_name)
+    mirror = _MIRRORS.get(athlete_name)
+    if mirror is None:
+        # Версию — до чтения: правка во время чтения не потеряется
+        CHANGES.ensure_fresh(athlete_name, max_age=0)
+        _, _, ws = open_athlete_sheet(athlete_name)
+        mirror = _MIRRORS[athlete_name] = full_sync(ws)
+        CACHE.update(athlete_name)
+    return mirror.rows
+
+
+# -----------------------------
+# Разобранная история (кэш в памяти)
+# -----------------------------
+_HISTORY: dict[str, WorkoutHistory] = {}
+
+
+def get_history(athlete_name: str) -> WorkoutHistory:
+    """
+    Вся история атлета в колоночном виде. Лист читается один раз,
+    дальше история дописывается при каждой записи через бота.
+    """
+    sync_local_caches(athlete_name)
+    history = _HISTORY.get(athlete_name)
+    if history is None:
+        history = parse_grids(
+            get_archive(athlete_name).grids(), get_all_values(athlete_name)
+        )
+        _HISTORY[athlete_name] = history
+        CACHE.update(athlete_name)
+    return history
+
+
+# -----------------------------
+# Архив старых тренировок (листы "Архив <год>")
+# -----------------------------
+# Листы архива меняет только перенос через бота. Свой перенос обновляет
+# кэш сам; после чужих изменений архив перечитывается вместе с полным
+# чтением живого листа (перенос в другом процессе сдвигает его строки).
+_ARCHIVES: dict[str, Archive] = {}
+
+
+def get_archive(athlete_name: str) -> Archive:
+    archive = _ARCHIVES.get(athlete_name)
+    if archive is None:
+        _, sh, _ = open_athlete_sheet(athlete_name)
+        archive = _ARCHIVES[athlete_name] = read_archive(sh)
+        CACHE.update(athlete_name)
+    return archive
+
+
+def archive_old_cells(
+    athlete_name: str,
+    horizon_days: int = ARCHIVE_HORIZON_DAYS,
+    keep_cells: int = ARCHIVE_KEEP_CELLS,
+):
+    """
+    Перенести ячейки старше horizon_days в листы архива, оставив в каждой
+    строке не меньше keep_cells последних. Возвращает (строк, ячеек, годы).
+    """
+    sync_local_caches(athlete_name)
+    _, sh, ws = open_athlete_sheet(athlete_name)
+    values = get_all_values(athlete_name)
+    moves = plan_archive(values, horizon_days=horizon_days, keep_cells=keep_cells)
+    if not moves:
+        return 0, 0, []
+
+    # Точные длины строк архива — перечитываем перед переносом
+    archive = read_archive(sh)
+    requests = build_archive_requests(ws.id, values, moves, archive)
+    try:
+        sh.batch_update({"requests": requests})
+    except Exception:
+        _ARCHIVES.pop(athlete_name, None)
+        raise
+    _ARCHIVES[athlete_name] = archive
+
+    mirror = _MIRRORS.get(athlete_name)
+    if mirror is not None:
+        for move in moves:
+            mirror.delete_cells(move.row, 2, move.last_col)
+    # Колонки живых ячеек сдвинулись: история и рекорды пересоберутся
+    # из копии листа и архива без чтения таблицы
+    _drop_derived_caches(athlete_name)
+    _note_write(athlete_name)
+
+    cells = sum(move.cells for move in moves)
+    years = sorted({year for move in moves for year, _, _ in move.groups})
+    logging.info(
+        f"Архив {athlete_name}: перенесено {cells} ячеек из {len(moves)} строк, "
+        f"годы {years}"
+    )
+    return len(moves), cells, years
+
+
+# -----------------------------
+# Личные рекорды (кэш в памяти)
+# -----------------------------
+_RECORDS: dict[str, RecordIndex] = {}
+
+
+def get_records(athlete_name: str) -> RecordIndex:
+    """
+    Индекс рекордов атлета. Если история уже загружена — строится по ней,
+    иначе упражнения подгружаются по одному из строк, прочитанных при записи.
+    """
+    sync_local_caches(athlete_name)
+    records = _RECORDS.get(athlete_name)
+    if records is None:
+        history = _HISTORY.get(athlete_name)
+        records = RecordIndex.from_history(history) if history else RecordIndex()
+        _RECORDS[athlete_name] = records
+        CACHE.update(athlete_name)
+    return records
+
+
+# -----------------------------
+# Поиск упражнений (индекс в памяти)
+# -----------------------------
+_SEARCH: dict[str, ExerciseIndex] = {}
+
+
+def get_search_index(athlete_name: str) -> ExerciseIndex:
+    """
+    Индекс по столбцу A локальной копии листа. Добавление и отключение
+    упражнения через бота обновляют его на месте.
+    """
+    sync_local_caches(athlete_name)
+    index = _SEARCH.get(athlete_name)
+    if index is None:
+        rows = get_all_values(athlete_name)
+        index = ExerciseIndex.from_names(rows.names())
+        _SEARCH[athlete_name] = index
+        CACHE.update(athlete_name)
+    return index
+
+
+# -----------------------------
+# Последние ячейки упражнений (для подсказки при выборе)
+# -----------------------------
+LAST_CELLS_KEEP = 3
+# атлет -> нормализованное упражнение -> тексты последних ячеек (старые первыми)
+_LAST_CELLS: dict[str, dict[str, list[str]]] = {}
+
+
+def _remember_cells(
+    athlete_name: str, exercise_name: str, cells: list[str], append: bool = False
+):
+    key = normalize_exercise_name(exercise_name)
+    known = _LAST_CELLS.setdefault(athlete_name, {})
+    if append:
+        if key not in known:
+            # Раньше упражнение не показывали — хвост строки неизвестен
+            return
+        cells = known[key] + cells
+    known[key] = cells[-LAST_CELLS_KEEP:]
+
+
+def last_cells(athlete_name: str, exercise_name: str) -> list[str] | None:
+    """
+    Последние ячейки упражнения — только из памяти, без запросов к таблицам:
+    из кэша, который обновляет каждая запись, или из локальной копии листа.
+    None — данных в памяти нет.
+    """
+    key = normalize_exercise_name(exercise_name)
+    cells = _LAST_CELLS.get(athlete_name, {}).get(key)
+    if cells is not None:
+        return cells
+
+    mirror = _MIRRORS.get(athlete_name)
+    if mirror is None or athlete_name in _STALE:
+        return None
+    for idx, name in enumerate(mirror.names()):
+        if name and normalize_exercise_name(name) == key:
+            cells = [c for c in mirror.rows[idx][1:] if c.strip()]
+            _remember_cells(athlete_name, exercise_name, cells)
+            return cells[-LAST_CELLS_KEEP:]
+    return None
 
 
 def get_exercises(athlete_name: str):
@@ -63,14 +545,49 @@ def get_exercises(athlete_name: str):
 
 
 # -----------------------------
-# Вспомогательные функции
+# Номера строк упражнений (индекс в памяти)
 # -----------------------------
-def find_exercise_row(ws, exercise_name: str) -> int:
-    col_a = ws.col_values(1)
-    for idx, value in enumerate(col_a, start=1):
-        if value.strip().lower() == exercise_name.strip().lower():
-            return idx
-    raise ValueError(f"Упражнение '{exercise_name}' не найдено")
+_ROWS: dict[str, RowIndex] = {}
+
+
+def get_row_index(athlete_name: str, ws) -> RowIndex:
+    """
+    Строится по копии листа, если она есть, иначе по столбцу A — один раз.
+    Дальше наши вставки и переносы строк сдвигают номера в самом индексе.
+    """
+    index = _ROWS.get(athlete_name)
+    if index is None:
+        mirror = _MIRRORS.get(athlete_name)
+        if mirror is not None and athlete_name not in _STALE:
+            names = mirror.names()
+        else:
+            names = ws.col_values(1)
+        index = _ROWS[athlete_name] = RowIndex(names)
+    return index
+
+
+def _row_matches(row_values: list[str], exercise_name: str) -> bool:
+    return bool(row_values) and (
+        row_values[0].strip().lower() == exercise_name.strip().lower()
+    )
+
+
+def find_exercise_row(athlete_name: str, ws, exercise_name: str) -> int:
+    row = get_row_index(athlete_name, ws).find(exercise_name)
+    if row is None:
+        raise ValueError(f"Упражнение '{exercise_name}' не найдено")
+    return row
+
+
+def _resync_rows(athlete_name: str):
+    """
+    Индекс строк разошёлся с листом: перестроить его по столбцу A,
+    а копию листа дочитать перед следующим чтением.
+    """
+    logging.warning(f"Индекс строк {athlete_name} разошёлся с листом, перестраиваю")
+    _ROWS.pop(athlete_name, None)
+    if athlete_name in _MIRRORS:
+        _STALE.add(athlete_name)
 
 
 def get_next_free_column(ws, row: int) -> int:
@@ -135,12 +652,25 @@ def add_workout_cell(athlete_name: str, exercise_name: str, lines: list[str]):
     """
     Пример lines:
     ["5.12", "8x10", "8x10", "8x10"]
+
+    Возвращает (побитые рекорды, запись для отмены) —
+    см. records.format_records и undo_write.
     """
+    sync_local_caches(athlete_name)
     _, sh, ws = open_athlete_sheet(athlete_name)
     sheet_id = ws.id
 
-    exercise_row = find_exercise_row(ws, exercise_name)
-    col = get_next_free_column(ws, exercise_row)
+    exercise_row = find_exercise_row(athlete_name, ws, exercise_name)
+    # Строку читаем один раз: и для свободной колонки, и для рекордов,
+    # и заодно проверяем по ней индекс строк
+    row_values = ws.row_values(exercise_row)
+    if not _row_matches(row_values, exercise_name):
+        _resync_rows(athlete_name)
+        exercise_row = find_exercise_row(athlete_name, ws, exercise_name)
+        row_values = ws.row_values(exercise_row)
+        if not _row_matches(row_values, exercise_name):
+            raise ValueError(f"Упражнение '{exercise_name}' не найдено")
+    col = len(row_values) + 1
 
     cell_text = "\n".join(lines)
 
@@ -152,23 +682,55 @@ def add_workout_cell(athlete_name: str, exercise_name: str, lines: list[str]):
         text=cell_text,
     )
 
+    mirror = _MIRRORS.get(athlete_name)
+    if mirror is not None:
+        if mirror.rows[exercise_row - 1:exercise_row] == [row_values]:
+            mirror.set_cell(exercise_row, col, cell_text)
+        else:
+            # Копия разошлась с листом — дочитаем при следующем чтении
+            _STALE.add(athlete_name)
+
+    # Рекорды — до дописывания истории: индекс, построенный по истории
+    # с новой ячейкой, засчитал бы эту тренировку дважды
+    records = get_records(athlete_name)
+    if exercise_name not in records:
+        # Рекорды — по всей истории упражнения, включая архив
+        archived = get_archive(athlete_name).cells_for(exercise_name)
+        records.load_row(exercise_name, row_values[:1] + archived + row_values[1:])
+    broken = records.add_session(exercise_name, lines)
+
+    history = _HISTORY.get(athlete_name)
+    if history is not None:
+        history.append_cell(exercise_name, col, lines)
+    # Строка только что прочитана — хвост точный
+    _remember_cells(athlete_name, exercise_name, row_values[1:] + [cell_text])
+    _note_write(athlete_name)
+
     logging.info(
         f"Записал тренировку для {athlete_name}: {exercise_name} в колонку {col}"
     )
+    undo = _undo_entry("cell", athlete_name, sh, ws, exercise_name, exercise_row, col)
+    return broken, dict(undo, text=cell_text)
 
 
-def add_workout(athlete_name, date_str, exercise_name, weight_str, sets, reps):
+def workout_lines(date_str, weight_str, sets, reps) -> list[str]:
     """
-    Старый формат с ';'
+    Строки ячейки для старого формата с ';'.
     """
     weight_str = weight_str.strip()
     if weight_str in ("", "0", "-"):
         one = f"x{reps}"
     else:
         one = f"{weight_str}x{reps}"
+    return [date_str] + [one] * sets
 
-    lines = [date_str] + [one] * sets
-    add_workout_cell(athlete_name, exercise_name, lines)
+
+def add_workout(athlete_name, date_str, exercise_name, weight_str, sets, reps):
+    """
+    Старый формат с ';'
+    """
+    lines = workout_lines(date_str, weight_str, sets, reps)
+    return add_workout_cell(athlete_name, exercise_name, lines)
 
 
 # -----------------------------
@@ -185,16 +747,14 @@ def add_exercise_with_workout(
     - в A1 пишем название,
     - в B1 пишем тренировку (с жирной датой).
     """
+    sync_local_caches(athlete_name)
     gc, sh, ws = open_athlete_sheet(athlete_name)
     sheet_id = ws.id
 
     # Проверка на дубликат (без учёта префикса '-')
-    col_a = ws.col_values(1)
-    ex_lower = exercise_name.strip().lower()
-    for val in col_a:
-        name = val.strip().lstrip("-").strip().lower()
-        if name == ex_lower:
-            raise ValueError(f"Упражнение '{exercise_name}' уже есть в списке")
+    rows = get_row_index(athlete_name, ws)
+    if rows.find(exercise_name) is not None:
+        raise ValueError(f"Упражнение '{exercise_name}' уже есть в списке")
 
     # Вставляем новую первую строку
     ws.insert_row([exercise_name], index=1)
@@ -210,10 +770,152 @@ def add_exercise_with_workout(
         text=cell_text,
     )
 
+    rows.insert_top(exercise_name)
+    mirror = _MIRRORS.get(athlete_name)
+    if mirror is not None:
+        mirror.insert_row(1, [exercise_name, cell_text])
+
+    history = _HISTORY.get(athlete_name)
+    if history is not None:
+        history.append_cell(exercise_name, 2, lines)
+
+    index = _SEARCH.get(athlete_name)
+    if index is not None:
+        index.add(exercise_name)
+
+    _remember_cells(athlete_name, exercise_name, [cell_text])
+
+    records = get_records(athlete_name)
+    records.load_row(exercise_name, [exercise_name])
+    records.add_session(exercise_name, lines)
+    _note_write(athlete_name)
+
     logging.info(
         f"Добавил новое упражнение '{exercise_name}' для {athlete_name} "
         f"в верхнюю строку и записал тренировку"
     )
+    undo = _undo_entry("exercise", athlete_name, sh, ws, exercise_name, new_row, 2)
+    return dict(undo, text=cell_text)
+
+
+# -----------------------------
+# Отмена записи (кнопка "↩️ Отменить")
+# -----------------------------
+def _undo_entry(kind, athlete_name, sh, ws, exercise_name, row, col) -> dict:
+    return {
+        "kind": kind,
+        "athlete": athlete_name,
+        "spreadsheet_id": sh.id,
+        "sheet_id": ws.id,
+        "exercise": exercise_name,
+        "row": row,
+        "col": col,
+    }
+
+
+def _current_row(athlete_name: str, exercise_name: str, recorded_row: int) -> int:
+    """
+    Строка упражнения сейчас — по памяти: после записи строку могли
+    сдвинуть вставки. Ничего не загружено — записанная строка.
+    """
+    rows = _ROWS.get(athlete_name)
+    row = rows.find(exercise_name) if rows is not None else None
+    if row is not None:
+        return row
+    mirror = _MIRRORS.get(athlete_name)
+    if mirror is not None:
+        key = normalize_exercise_name(exercise_name)
+        for idx, name in enumerate(mirror.names(), start=1):
+            if name and normalize_exercise_name(name) == key:
+                return idx
+    return recorded_row
+
+
+def undo_write(entry: dict):
+    """
+    Отменить запись бота одним batch_update:
+    "cell" — очистить ячейку, "exercise" — удалить строку упражнения.
+    Сначала дочитываем правки листа и сверяем строку: упражнение, текст
+    записанной ячейки и то, что она последняя в строке. Сверка — по копии
+    листа, без копии — по самой строке (один запрос). Не сходится —
+    ValueError, ничего не трогаем.
+    """
+    athlete_name = entry["athlete"]
+    exercise_name = entry["exercise"]
+    col = entry["col"]
+
+    # Строку могли сдвинуть руками только что — версию проверяем сейчас
+    if _has_cache(athlete_name):
+        CHANGES.ensure_fresh(athlete_name, max_age=0)
+    sync_local_caches(athlete_name)
+    row = _current_row(athlete_name, exercise_name, entry["row"])
+
+    mirror = _MIRRORS.get(athlete_name)
+    if mirror is not None and athlete_name not in _STALE:
+        values = mirror.rows[row - 1] if row <= len(mirror.rows) else []
+    else:
+        _, sh, ws = open_athlete_sheet(athlete_name)
+        if sh.id != entry["spreadsheet_id"]:
+            raise ValueError("Таблицу атлета сменили — отмени запись в ней вручную")
+        values = ws.row_values(row)
+    if not _row_matches(values, exercise_name) or values[col - 1:col] != [
+        entry["text"]
+    ]:
+        raise ValueError("Ячейку уже изменили — поправь её в таблице вручную")
+    if len(values) != col:
+        raise ValueError("После этой записи в строке появились другие тренировки")
+
+    sheet_id = entry["sheet_id"]
+    if entry["kind"] == "cell":
+        request = {
+            "updateCells": {
+                "range": {
+                    "sheetId": sheet_id,
+                    "startRowIndex": row - 1,
+                    "endRowIndex": row,
+                    "startColumnIndex": col - 1,
+                    "endColumnIndex": col,
+                },
+                "fields": "userEnteredValue,textFormatRuns",
+            }
+        }
+    else:
+        request = {
+            "deleteDimension": {
+                "range": {
+                    "sheetId": sheet_id,
+                    "dimension": "ROWS",
+                    "startIndex": row - 1,
+                    "endIndex": row,
+                }
+            }
+        }
+    get_client().http_client.batch_update(
+        entry["spreadsheet_id"], {"requests": [request]}
+    )
+
+    # Индексы — обратно на месте; история и рекорды пересоберутся из копии
+    if mirror is not None:
+        if entry["kind"] == "cell":
+            mirror.set_cell(row, col, "")
+        else:
+            mirror.delete_row(row)
+    if entry["kind"] == "exercise":
+        rows = _ROWS.get(athlete_name)
+        if rows is not None:
+            rows.delete_row(row)
+        index = _SEARCH.get(athlete_name)
+        if index is not None:
+            index.remove(exercise_name)
+    _HISTORY.pop(athlete_name, None)
+    _RECORDS.pop(athlete_name, None)
+    _LAST_CELLS.get(athlete_name, {}).pop(normalize_exercise_name(exercise_name), None)
+    _note_write(athlete_name)
+
+    logging.info(
+        f"Отменил запись {entry['kind']} для {athlete_name}: {exercise_name} "
+        f"(строка {row}, колонка {col})"
+    )
 
 
 # -----------------------------
@@ -227,10 +929,12 @@ def make_exercise_inactive(athlete_name: str, exercise_name: str):
     - добавляет '-' перед названием,
     - красит строку в серый.
     """
+    sync_local_caches(athlete_name)
     gc, sh, ws = open_athlete_sheet(athlete_name)
     sheet_id = ws.id
 
-    all_values = ws.get_all_values()
+    # Из локальной копии: перед чтением она дочитывает изменения листа
+    all_values = get_all_values(athlete_name)
     if not all_values:
         raise ValueError("Таблица пустая")
 
@@ -245,9 +949,10 @@ def make_exercise_inactive(athlete_name: str, exercise_name: str):
         raise ValueError(f"Упражнение '{exercise_name}' не найдено в столбце A")
 
     row_count = len(all_values)
-    col_count = ws.col_count
 
-    # 1) Копируем строку в самый низ (включая форматирование)
+    # 1) Копируем строку в самый низ (включая форматирование).
+    # Колонки не ограничиваем — диапазон на всю ширину листа, так не нужен
+    # актуальный ws.col_count (объект листа кэшируется).
     body = {
         "requests": [
             {
@@ -256,15 +961,11 @@ def make_exercise_inactive(athlete_name: str, exercise_name: str):
                         "sheetId": sheet_id,
                         "startRowIndex": row_idx - 1,
                         "endRowIndex": row_idx,
-                        "startColumnIndex": 0,
-                        "endColumnIndex": col_count,
                     },
                     "destination": {
                         "sheetId": sheet_id,
                         "startRowIndex": row_count,
                         "endRowIndex": row_count + 1,
-                        "startColumnIndex": 0,
-                        "endColumnIndex": col_count,
                     },
                     "pasteType": "PASTE_NORMAL",
                 }
@@ -301,8 +1002,6 @@ def make_exercise_inactive(athlete_name: str, exercise_name: str):
                         "sheetId": sheet_id,
                         "startRowIndex": new_row - 1,
                         "endRowIndex": new_row,
-                        "startColumnIndex": 0,
-                        "endColumnIndex": col_count,
                     },
                     "cell": {
                         "userEnteredFormat": {
@@ -320,35 +1019,27 @@ def make_exercise_inactive(athlete_name: str, exercise_name: str):
     }
     sh.batch_update(gray_body)
 
-    logging.info(
-        f"Упражнение '{exercise_name}' для {athlete_name} "
-        f"помечено как неактуальное (строка {new_row})"
-    )
-
+    mirror = _MIRRORS.get(athlete_name)
+    if mirror is not None:
+        mirror.move_row_to_bottom(row_idx, new_name)
 
-# -----------------------------
-# Парсинг даты без года
-# -----------------------------
-def parse_date_without_year(date_str: str):
-    """
-    Принимает строку вида '5.12' или '05.12', возвращает date с годом.
-    """
-    s = date_str.strip().replace(" ", "").replace("/", ".")
-    if not s:
-        return None
+    rows = _ROWS.get(athlete_name)
+    if rows is not None:
+        rows.move_row_to_bottom(row_idx, new_name)
 
-    try:
-        dt = datetime.strptime(s, "%d.%m")
-    except ValueError:
-        return None
+    history = _HISTORY.get(athlete_name)
+    if history is not None:
+        history.set_active(exercise_name, False)
 
-    today = date.today()
-    dt = dt.replace(year=today.year)
-    d = dt.date()
-    if d > today:
-        d = d.replace(year=today.year - 1)
+    index = _SEARCH.get(athlete_name)
+    if index is not None:
+        index.set_active(exercise_name, False)
+    _note_write(athlete_name)
 
-    return d
+    logging.info(
+        f"Упражнение '{exercise_name}' для {athlete_name} "
+        f"помечено как неактуальное (строка {new_row})"
+    )
 
 
 # -----------------------------
@@ -361,55 +1052,34 @@ def get_oldest_exercises(athlete_name: str, limit: int):
 
     Упражнения, у которых название в столбце A начинается с '-', игнорируются.
     """
-    _, sh, ws = open_athlete_sheet(athlete_name)
+    return oldest_exercises_from_grid(get_all_values(athlete_name), limit)
 
-    all_values = ws.get_all_values()
-    row_count = len(all_values)
-    if row_count == 0:
-        return []
-
-    items = []
-
-    for idx in range(row_count):
-        row = all_values[idx]
-        exercise_name = (row[0].strip() if row else "")
-        if not exercise_name:
-            continue
-
-        # Игнорируем неактуальные упражнения
-        if exercise_name.startswith("-"):
-            continue
-
-        # последняя непустая ячейка в строке (кроме A)
-        last_text = ""
-        for val in reversed(row[1:]):
-            if val.strip():
-                last_text = val
-                break
-
-        if not last_text:
-            continue
-
-        lines = [ln.strip() for ln in last_text.split("\n") if ln.strip()]
-        if not lines:
-            continue
 
-        d = parse_date_without_year(lines[0])
-        if not d:
-            continue
-
-        items.append(
-            {
-                "exercise": exercise_name,
-                "date": d,
-                "lines": lines,
-            }
+# -----------------------------
+# Асинхронные версии: чтение в потоке, разбор в пуле процессов
+# -----------------------------
+async def get_history_async(athlete_name: str) -> WorkoutHistory:
+    # Может сходить в Drive за версией — не в event loop
+    await asyncio.to_thread(sync_local_caches, athlete_name)
+    history = _HISTORY.get(athlete_name)
+    if history is None:
+        values = await asyncio.to_thread(get_all_values, athlete_name)
+        archive = await asyncio.to_thread(get_archive, athlete_name)
+        history = await run_cpu(
+            parse_grids,
+            archive.grids(),
+            values,
+            size=sum(values.widths()) + archive.cell_count(),
         )
+        history.touch()
+        # Пока разбирали, история могла появиться из другого обработчика
+        history = _HISTORY.setdefault(athlete_name, history)
+        await asyncio.to_thread(CACHE.update, athlete_name)
+    return history
 
-    items.sort(key=lambda x: x["date"])
-
-    result = []
-    for it in items[:limit]:
-        result.append((it["exercise"], it["lines"]))
 
-    return result
+async def get_oldest_exercises_async(athlete_name: str, limit: int):
+    values = await asyncio.to_thread(get_all_values, athlete_name)
+    return await run_cpu(
+        oldest_exercises_from_grid, values, limit, size=sum(values.widths())
+    )
@@ -0,0 +1,92 @@
+# lifecycle.py — корректная остановка бота по SIGTERM
+#
+# Render при передеплое шлёт SIGTERM и ждёт ~30 с до SIGKILL. Вместо
+# мгновенной остановки бот проходит фазы по очереди, у каждой свой дедлайн:
+# перестать принимать апдейты, дождаться начатых (запись в таблицу из
+# нескольких запросов не обрывается посередине), дослать очередь, сохранить
+# состояние, закрыть соединения. Время каждой фазы пишется в лог.
+import asyncio
+import logging
+import os
+import signal
+import time
+
+
+# Сколько ждать начатые апдейты (записи в таблицы)
+LIFECYCLE_DRAIN_SEC = float(os.getenv("LIFECYCLE_DRAIN_SEC", 15))
+
+
+class Lifecycle:
+    def __init__(self):
+        self.stop_requested = asyncio.Event()
+        self.stopping = False
+        self.inflight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._phases: list[tuple] = []
+
+    # --- сигналы
+    def install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.request_stop, sig)
+
+    def request_stop(self, sig=None):
+        if self.stop_requested.is_set():
+            return
+        name = signal.Signals(sig).name if sig else "запрос"
+        logging.info(f"Остановка бота ({name})")
+        self.stop_requested.set()
+
+    # --- начатые апдейты
+    async def middleware(self, handler, event, data):
+        """
+        Outer-middleware на апдейты: считает начатые, после начала
+        остановки новые не обрабатывает.
+        """
+        if self.stopping:
+            logging.info(f"Апдейт {event.update_id} пропущен: бот останавливается")
+            return None
+        self.inflight += 1
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self.inflight -= 1
+            if not self.inflight:
+                self._idle.set()
+
+    async def drain(self):
+        if self.inflight:
+            logging.info(f"Жду завершения {self.inflight} апдейтов")
+        await self._idle.wait()
+
+    # --- фазы остановки
+    def on_shutdown(self, name: str, func, timeout: float):
+        """
+        Фаза остановки: async func() не дольше timeout секунд.
+        Фазы выполняются в порядке регистрации.
+        """
+        self._phases.append((name, func, timeout))
+
+    async def shutdown(self):
+        self.stopping = True
+        started = time.perf_counter()
+        for name, func, timeout in self._phases:
+            phase_started = time.perf_counter()
+            status = "ok"
+            try:
+                await asyncio.wait_for(func(), timeout)
+            except asyncio.TimeoutError:
+                status = f"прервана по таймауту {timeout:.0f} с"
+            except Exception as e:
+                status = f"ошибка: {e}"
+                logging.exception(f"Фаза остановки {name} завершилась с ошибкой")
+            logging.info(
+                f"Остановка, фаза {name}: "
+                f"{(time.perf_counter() - phase_started) * 1000:.0f} мс, {status}"
+            )
+        logging.info(f"Бот остановлен за {time.perf_counter() - started:.1f} с")
+
+
+LIFECYCLE = Lifecycle()
@@ -0,0 +1,441 @@
+# loadtest.py — нагрузочный прогон обработчиков бота
+#
+#     python loadtest.py --users 20 --duration 30
+#     python loadtest.py --rate 5 --duration 60 --mix train=5,analytics=3
+#
+# Синтетические апдейты идут в настоящий Dispatcher (dp.feed_update) из
+# fitlogsbot.py. Сессия Bot подменена (ответы Telegram не уходят в сеть,
+# задержка --tg-latency-ms), таблицы — fake_sheets (задержка
+# --sheets-latency-ms на запрос). Сценарии повторяют реальные действия тренера:
+#     train        /people → атлет → Тренировка → Добавить → упражнение → объём
+#     add_exercise /people → атлет → Тренировка → Новое упражнение → сообщение
+#     deactivate   /people → атлет → Тренировка → Неактуальное → упражнение
+#     analytics    /people → атлет → Аналитика → отчёты, старые, график
+# Кнопки на каждом шаге берутся из последней клавиатуры, которую бот прислал
+# этому пользователю.
+#
+# Режимы: --users N — N пользователей по кругу (с паузой --think-ms между
+# шагами); --rate R — открытая модель, в среднем R сценариев в секунду
+# (пуассоновский поток, не больше --users одновременно).
+#
+# В конце — пропускная способность, перцентили длительности сценариев и
+# шагов, задержка event loop. --max-p95-ms — код выхода 1, если p95 любого
+# сценария больше (для проверки перед деплоем).
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import random
+import sys
+import time
+from datetime import date
+
+
+FLOWS = ("train", "add_exercise", "deactivate", "analytics")
+DEFAULT_MIX = "train=5,add_exercise=1,deactivate=1,analytics=3"
+# Все синтетические пользователи — с разрешённым именем
+LOADTEST_USERNAME = "gblsh"
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+# -----------------------------
+# Подменная сессия Telegram
+# -----------------------------
+def make_session(latency: float):
+    from aiogram.client.session.base import BaseSession
+    from aiogram.types import Message
+
+    class LoadTestSession(BaseSession):
+        """
+        Отвечает на методы Bot API без сети. Запоминает последнюю клавиатуру
+        и тексты ответов для каждого чата.
+        """
+
+        def __init__(self):
+            super().__init__()
+            self.message_ids = itertools.count(1000)
+            self.keyboards: dict[int, list[str]] = {}
+            self.requests = 0
+            self.errors = 0
+
+        async def make_request(self, bot, method, timeout=None):
+            self.requests += 1
+            if latency:
+                await asyncio.sleep(latency)
+
+            text = getattr(method, "text", None) or ""
+            if text.startswith("Ошибка") or getattr(method, "show_alert", False):
+                self.errors += 1
+
+            chat_id = getattr(method, "chat_id", None)
+            markup = getattr(method, "reply_markup", None)
+            if chat_id is not None and markup is not None:
+                self.keyboards[chat_id] = [
+                    button.callback_data
+                    for row in getattr(markup, "inline_keyboard", [])
+                    for button in row
+                    if button.callback_data
+                ]
+
+            if method.__returning__ is bool:
+                return True
+            return Message.model_validate(
+                {
+                    "message_id": next(self.message_ids),
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id or 0, "type": "private"},
+                    "text": text,
+                },
+                context={"bot": bot},
+            )
+
+        async def stream_content(self, *args, **kwargs):
+            yield b""
+
+        async def close(self):
+            pass
+
+        def buttons(self, chat_id: int, prefix: str) -> list[str]:
+            return [
+                data
+                for data in self.keyboards.get(chat_id, [])
+                if data.startswith(prefix)
+            ]
+
+    return LoadTestSession()
+
+
+# -----------------------------
+# Виртуальный пользователь
+# -----------------------------
+class VirtualUser:
+    _update_ids = itertools.count(1)
+
+    def __init__(self, user_id: int, harness: "Harness"):
+        self.user_id = user_id
+        self.harness = harness
+        self.message_id = 1
+
+    def _user(self) -> dict:
+        return {
+            "id": self.user_id,
+            "is_bot": False,
+            "first_name": f"Coach {self.user_id}",
+            "username": LOADTEST_USERNAME,
+        }
+
+    def _message(self, text: str) -> dict:
+        self.message_id += 1
+        return {
+            "message_id": self.message_id,
+            "date": int(time.time()),
+            "chat": {"id": self.user_id, "type": "private"},
+            "from": self._user(),
+            "text": text,
+        }
+
+    async def send(self, step: str, text: str):
+        await self.harness.feed(
+            step, {"update_id": next(self._update_ids), "message": self._message(text)}
+        )
+
+    async def press(self, step: str, data: str):
+        message = self._message("")
+        message["from"] = {"id": 0, "is_bot": True, "first_name": "bot"}
+        await self.harness.feed(
+            step,
+            {
+                "update_id": next(self._update_ids),
+                "callback_query": {
+                    "id": str(next(self._update_ids)),
+                    "from": self._user(),
+                    "chat_instance": str(self.user_id),
+                    "message": message,
+                    "data": data,
+                },
+            },
+        )
+
+    async def press_any(self, step: str, prefix: str) -> bool:
+        """
+        Нажать случайную кнопку с префиксом из последней клавиатуры.
+        """
+        buttons = self.harness.session.buttons(self.user_id, prefix)
+        if not buttons:
+            self.harness.missing_buttons += 1
+            return False
+        await self.press(step, self.harness.rnd.choice(buttons))
+        return True
+
+    async def think(self):
+        if self.harness.think:
+            await asyncio.sleep(self.harness.rnd.expovariate(1 / self.harness.think))
+
+    async def open_athlete(self, section: str) -> bool:
+        await self.send("people", "/people")
+        await self.think()
+        if not await self.press_any("athlete", "athlete|"):
+            return False
+        await self.think()
+        await self.press(section, f"action|{section}")
+        await self.think()
+        return True
+
+    # --- сценарии
+    async def flow_train(self):
+        if not await self.open_athlete("train"):
+            return
+        await self.press("train_menu", "train|add_workout")
+        await self.think()
+        if not await self.press_any("exercise", "exercise|"):
+            return
+        await self.think()
+        today = date.today()
+        weight = self.harness.rnd.choice([20, 40, 60, 80, 100])
+        await self.send("volume", f"{today.day}.{today.month} 3x{weight}x5")
+
+    async def flow_add_exercise(self):
+        if not await self.open_athlete("train"):
+            return
+        await self.press("train_menu", "train|add_exercise")
+        await self.think()
+        today = date.today()
+        name = f"Нагрузка {self.user_id}-{next(self.harness.names)}"
+        await self.send("new_exercise", f"{name}; {today.day}.{today.month} 3x5x10")
+
+    async def flow_deactivate(self):
+        if not await self.open_athlete("train"):
+            return
+        await self.press("train_menu", "train|deactivate")
+        await self.think()
+        await self.press_any("deact", "deact|")
+
+    async def flow_analytics(self):
+        if not await self.open_athlete("analysis"):
+            return
+        for kind in ("tonnage", "e1rm", "trend"):
+            await self.press(f"analysis_{kind}", f"analysis|{kind}")
+            await self.think()
+        await self.press("analysis_old", "analysis|old")
+        await self.think()
+        await self.press_any("oldn", "oldn|")
+        await self.think()
+        await self.press("analysis_chart", "analysis|chart")
+        await self.think()
+        await self.press_any("chart", "chart|")
+
+
+# -----------------------------
+# Прогон
+# -----------------------------
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        self.rnd = random.Random(args.seed)
+        self.think = args.think_ms / 1000
+        self.names = itertools.count(1)
+        self.flow_times: dict[str, list[float]] = {f: [] for f in FLOWS}
+        self.step_times: dict[str, list[float]] = {}
+        self.exceptions = 0
+        self.missing_buttons = 0
+        self.updates = 0
+        self.loop_lag: list[float] = []
+        self.mix = self._parse_mix(args.mix)
+
+        import fitlogsbot
+
+        self.fitlogsbot = fitlogsbot
+        if not args.verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+        self.session = make_session(args.tg_latency_ms / 1000)
+        fitlogsbot.bot.session = self.session
+        # Лимиты отправки — как у настоящей сессии
+        fitlogsbot.send_queue.install(self.session)
+
+    @staticmethod
+    def _parse_mix(mix: str) -> list[tuple[str, float]]:
+        weights = []
+        for item in mix.split(","):
+            name, _, weight = item.partition("=")
+            name = name.strip()
+            if name not in FLOWS:
+                raise SystemExit(f"Неизвестный сценарий: {name} (есть {FLOWS})")
+            weights.append((name, float(weight or 1)))
+        return weights
+
+    def pick_flow(self) -> str:
+        names, weights = zip(*self.mix)
+        return self.rnd.choices(names, weights)[0]
+
+    async def feed(self, step: str, raw: dict):
+        from aiogram.types import Update
+
+        fitlogsbot = self.fitlogsbot
+        update = Update.model_validate(raw, context={"bot": fitlogsbot.bot})
+        started = time.perf_counter()
+        try:
+            await fitlogsbot.dp.feed_update(fitlogsbot.bot, update)
+        except Exception as e:
+            self.exceptions += 1
+            print(f"Исключение на шаге {step}: {e!r}", file=sys.stderr)
+        self.updates += 1
+        self.step_times.setdefault(step, []).append(time.perf_counter() - started)
+
+    async def run_flow(self, user: VirtualUser, flow: str):
+        started = time.perf_counter()
+        await getattr(user, f"flow_{flow}")()
+        self.flow_times[flow].append(time.perf_counter() - started)
+
+    async def monitor_loop(self, stop: asyncio.Event, interval: float = 0.01):
+        loop = asyncio.get_running_loop()
+        while not stop.is_set():
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.loop_lag.append(max(0.0, loop.time() - expected))
+
+    async def closed_loop(self, deadline: float):
+        async def worker(user: VirtualUser):
+            while time.perf_counter() < deadline:
+                await self.run_flow(user, self.pick_flow())
+
+        users = [VirtualUser(10_000 + i, self) for i in range(self.args.users)]
+        await asyncio.gather(*(worker(u) for u in users))
+
+    async def open_loop(self, deadline: float):
+        free = [VirtualUser(10_000 + i, self) for i in range(self.args.users)]
+        tasks: set[asyncio.Task] = set()
+        dropped = 0
+
+        async def run(user: VirtualUser):
+            try:
+                await self.run_flow(user, self.pick_flow())
+            finally:
+                free.append(user)
+
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.rnd.expovariate(self.args.rate))
+            if not free:
+                dropped += 1
+                continue
+            task = asyncio.create_task(run(free.pop()))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        if dropped:
+            print(f"Не хватило пользователей для {dropped} прибытий (--users)")
+
+    async def run(self) -> float:
+        # Атлеты и таблицы — заранее, чтобы не мерить первый импорт gspread
+        google_sheets = self.fitlogsbot.google_sheets
+        await asyncio.to_thread(
+            self.fitlogsbot.startup_profile.preload,
+            google_sheets,
+            self.fitlogsbot.analytics,
+        )
+
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(self.monitor_loop(stop))
+        started = time.perf_counter()
+        deadline = started + self.args.duration
+        if self.args.rate:
+            await self.open_loop(deadline)
+        else:
+            await self.closed_loop(deadline)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+        if self.fitlogsbot.BACKGROUND_TASKS:
+            await asyncio.gather(
+                *self.fitlogsbot.BACKGROUND_TASKS, return_exceptions=True
+            )
+        return elapsed
+
+    def report(self, elapsed: float) -> int:
+        flows = sum(len(v) for v in self.flow_times.values())
+        print(
+            f"\nПрогон {elapsed:.1f} с: сценариев {flows} ({flows / elapsed:.2f}/с), "
+            f"апдейтов {self.updates} ({self.updates / elapsed:.1f}/с), "
+            f"запросов к Telegram {self.session.requests}"
+        )
+        print(
+            f"Ошибок в ответах {self.session.errors}, исключений {self.exceptions}, "
+            f"нет нужной кнопки {self.missing_buttons}"
+        )
+
+        def table(title: str, data: dict[str, list[float]]):
+            print(
+                f"\n{title:<20}{'n':>7}{'p50 мс':>10}{'p95 мс':>10}"
+                f"{'p99 мс':>10}{'max мс':>10}"
+            )
+            for name, values in data.items():
+                if not values:
+                    continue
+                ms = [v * 1000 for v in values]
+                print(
+                    f"{name:<20}{len(ms):>7}{percentile(ms, 50):>10.1f}"
+                    f"{percentile(ms, 95):>10.1f}{percentile(ms, 99):>10.1f}"
+                    f"{max(ms):>10.1f}"
+                )
+
+        table("сценарий", self.flow_times)
+        table("шаг", dict(sorted(self.step_times.items())))
+
+        lag = [v * 1000 for v in self.loop_lag]
+        print(
+            f"\nЗадержка event loop: p50 {percentile(lag, 50):.1f} мс, "
+            f"p95 {percentile(lag, 95):.1f} мс, p99 {percentile(lag, 99):.1f} мс, "
+            f"max {max(lag, default=0):.1f} мс"
+        )
+
+        failed = False
+        if self.args.max_p95_ms:
+            for name, values in self.flow_times.items():
+                p95 = percentile([v * 1000 for v in values], 95)
+                if p95 > self.args.max_p95_ms:
+                    print(f"ПРЕВЫШЕН p95 сценария {name}: {p95:.0f} мс")
+                    failed = True
+        if self.exceptions:
+            failed = True
+        return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=0, help="сценариев в секунду")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--think-ms", type=float, default=100)
+    parser.add_argument("--tg-latency-ms", type=float, default=30)
+    parser.add_argument("--sheets-latency-ms", type=float, default=150)
+    parser.add_argument("--sheets-ms-per-kcell", type=float, default=20)
+    parser.add_argument("--max-p95-ms", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="логи бота")
+    args = parser.parse_args()
+
+    # До импорта бота: настройки читаются при импорте модулей
+    os.environ.setdefault("TOKEN", "123456:" + "A" * 35)
+    os.environ["SHEETS_BACKEND"] = "fake"
+    os.environ["STATE_BACKEND"] = "memory"
+    # update_id в каждом прогоне с 1 — журнал апдейтов не должен их помнить
+    os.environ["LEDGER_DB"] = ""
+    os.environ["FAKE_SHEETS_LATENCY_MS"] = str(args.sheets_latency_ms)
+    os.environ["FAKE_SHEETS_MS_PER_KCELL"] = str(args.sheets_ms_per_kcell)
+
+    harness = Harness(args)
+    elapsed = asyncio.run(harness.run())
+    sys.exit(harness.report(elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# records.py — личные рекорды по упражнениям (бегущие максимумы)
+from workout_history import (
+    WorkoutHistory,
+    normalize_exercise_name,
+    parse_day_month,
+    parse_set_line,
+    split_cell,
+)
+
+
+class ExerciseRecords:
+    """
+    Лучшие результаты одного упражнения:
+        best_by_reps — {повторы: лучший вес} для подходов с весом
+        best_bw_reps — максимум повторов в подходе без веса
+        best_volume  — лучший тоннаж за одну тренировку (ячейку)
+        sessions     — сколько тренировок уже учтено
+    """
+
+    __slots__ = ("best_by_reps", "best_bw_reps", "best_volume", "sessions")
+
+    def __init__(self):
+        self.best_by_reps: dict[int, float] = {}
+        self.best_bw_reps = 0
+        self.best_volume = 0.0
+        self.sessions = 0
+
+    def add_session(self, sets) -> list[tuple]:
+        """
+        Учесть одну тренировку (список (вес, повторы)).
+        Возвращает побитые рекорды; первая тренировка рекордом не считается.
+        Работает за O(подходов) — без пересчёта истории.
+        """
+        had_history = self.sessions > 0
+        volume = 0.0
+        session_best: dict[int, float] = {}
+        session_bw_reps = 0
+
+        for weight, reps in sets:
+            if weight > 0:
+                volume += weight * reps
+                if weight > session_best.get(reps, 0.0):
+                    session_best[reps] = weight
+            else:
+                session_bw_reps = max(session_bw_reps, reps)
+
+        broken = []
+        for reps, weight in sorted(session_best.items()):
+            prev = self.best_by_reps.get(reps)
+            if prev is None or weight > prev:
+                if prev is not None and had_history:
+                    broken.append(("weight", reps, weight, prev))
+                self.best_by_reps[reps] = weight
+
+        if session_bw_reps > self.best_bw_reps:
+            if self.best_bw_reps and had_history:
+                broken.append(("bw_reps", session_bw_reps, self.best_bw_reps))
+            self.best_bw_reps = session_bw_reps
+
+        if volume > self.best_volume:
+            if self.best_volume and had_history:
+                broken.append(("volume", volume, self.best_volume))
+            self.best_volume = volume
+
+        self.sessions += 1
+        return broken
+
+
+class RecordIndex:
+    """
+    Рекорды всех упражнений одного атлета. Упражнение загружается один раз —
+    из истории или из строки, которую всё равно прочитали при записи.
+    """
+
+    __slots__ = ("_exercises",)
+
+    def __init__(self):
+        self._exercises: dict[str, ExerciseRecords] = {}
+
+    def __contains__(self, exercise_name: str):
+        return normalize_exercise_name(exercise_name) in self._exercises
+
+    def get(self, exercise_name: str):
+        return self._exercises.get(normalize_exercise_name(exercise_name))
+
+    def load_row(self, exercise_name: str, row_values: list[str]):
+        """
+        Заполнить рекорды упражнения по значениям его строки (A — название).
+        """
+        records = ExerciseRecords()
+        for text in row_values[1:]:
+            lines = split_cell(text)
+            if lines and parse_day_month(lines[0]):
+                records.add_session([s for s in map(parse_set_line, lines[1:]) if s])
+        self._exercises[normalize_exercise_name(exercise_name)] = records
+        return records
+
+    @classmethod
+    def from_history(cls, history: WorkoutHistory):
+        index = cls()
+        for ex_id, _, sets in history_sessions(history):
+            key = normalize_exercise_name(history.names[ex_id])
+            index._exercises.setdefault(key, ExerciseRecords()).add_session(sets)
+        return index
+
+    def add_session(self, exercise_name: str, lines: list[str]) -> list[tuple]:
+        key = normalize_exercise_name(exercise_name)
+        records = self._exercises.get(key)
+        if records is None:
+            records = self._exercises[key] = ExerciseRecords()
+        sets = [s for s in map(parse_set_line, lines[1:]) if s]
+        return records.add_session(sets)
+
+
+def history_sessions(history: WorkoutHistory) -> list[tuple]:
+    """
+    Тренировки (ячейки) по порядку: [(ex_id, дата-ordinal, [(вес, повторы)]), ...].
+    Дата в ключе разводит ячейки архива и живого листа с одинаковыми
+    номерами колонок и задаёт порядок по времени.
+    """
+    sessions: dict[tuple, list] = {}
+    for i in range(len(history)):
+        key = (history.exercise_ids[i], history.dates[i], history.columns[i])
+        sessions.setdefault(key, []).append((history.weights[i], history.reps[i]))
+    return [
+        (ex_id, day, sets) for (ex_id, day, _), sets in sorted(sessions.items())
+    ]
+
+
+def records_since(
+    history: WorkoutHistory, since: int, until: int | None = None
+) -> list[tuple]:
+    """
+    Рекорды, побитые в тренировках с даты since до until (ordinal, until
+    не включается): [(упражнение, [рекорды]), ...] в порядке тренировок.
+    """
+    running: dict[int, ExerciseRecords] = {}
+    result = []
+    for ex_id, day, sets in history_sessions(history):
+        if until is not None and day >= until:
+            # Тренировки упражнения идут по времени — дальше только позже
+            continue
+        broken = running.setdefault(ex_id, ExerciseRecords()).add_session(sets)
+        if broken and day >= since:
+            result.append((history.names[ex_id], broken))
+    return result
+
+
+def _fmt(x: float) -> str:
+    return f"{x:.0f}" if float(x).is_integer() else f"{x:g}"
+
+
+def describe_record(rec: tuple) -> str:
+    """
+    ("weight", 5, 85.0, 80.0) -> "85 кг × 5 (было 80)".
+    """
+    if rec[0] == "weight":
+        _, reps, weight, prev = rec
+        return f"{_fmt(weight)} кг × {reps} (было {_fmt(prev)})"
+    if rec[0] == "bw_reps":
+        _, reps, prev = rec
+        return f"{reps} повт. без веса (было {prev})"
+    if rec[0] == "volume":
+        _, volume, prev = rec
+        return f"{_fmt(volume)} кг за тренировку (было {_fmt(prev)})"
+    return ""
+
+
+def format_records(broken: list[tuple]) -> str:
+    """
+    Текст для сообщения о записи. Пустая строка, если рекордов нет.
+    """
+    lines = []
+    for rec in broken:
+        title = "новый рекорд объёма" if rec[0] == "volume" else "новый рекорд"
+        lines.append(f"🏆 {title}: {describe_record(rec)}")
+    return "\n".join(lines)
@@ -0,0 +1,135 @@
+# row_index.py — номер строки упражнения без чтения столбца A
+#
+# Наши структурные правки листа — вставка строки наверх (новое упражнение) и
+# перенос строки вниз (неактуальное) — сдвигают номера всех строк под ними.
+# Вместо пересчёта словаря каждая строка занимает "слот" в дереве Фенвика:
+# 1 — слот занят, 0 — строка удалена. Номер строки = число занятых слотов
+# до неё включительно, вставка и удаление — изменение одного слота.
+# Всё за O(log n), столбец A после наших правок не перечитывается.
+from workout_history import normalize_exercise_name
+
+
+# Запас пустых слотов сверху и снизу; кончился — дерево перестраивается
+ROW_INDEX_HEADROOM = 64
+
+
+class Fenwick:
+    """
+    Префиксные суммы с точечными изменениями. Индексы с 1.
+    """
+
+    __slots__ = ("size", "tree")
+
+    def __init__(self, values: list[int]):
+        self.size = len(values)
+        tree = [0] + list(values)
+        # Построение за O(n): каждый узел отдаёт сумму родителю
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def add(self, i: int, delta: int):
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, k: int) -> int:
+        """
+        Наименьший i с prefix(i) >= k (k-й занятый слот).
+        """
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] < k:
+                pos = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return pos + 1
+
+
+class RowIndex:
+    """
+    Нормализованное название упражнения -> номер строки листа (с 1).
+    Пустые строки тоже занимают слот: номера считаются как в таблице.
+    При повторяющихся названиях — первая строка, как при поиске по столбцу A.
+    """
+
+    __slots__ = ("_tree", "_keys", "_slots", "_head", "_tail")
+
+    def __init__(self, names: list[str], headroom: int = ROW_INDEX_HEADROOM):
+        self._build([normalize_exercise_name(n) for n in names], headroom)
+
+    def _build(self, keys: list[str], headroom: int):
+        size = len(keys) + 2 * headroom
+        self._keys: list[str | None] = [None] * (size + 1)
+        self._slots: dict[str, int] = {}
+        flags = [0] * size
+        for offset, key in enumerate(keys):
+            slot = headroom + 1 + offset
+            flags[slot - 1] = 1
+            self._keys[slot] = key
+            if key and key not in self._slots:
+                self._slots[key] = slot
+        self._tree = Fenwick(flags)
+        # Ближайшие занятые слоты сверху и снизу
+        self._head = headroom + 1
+        self._tail = headroom + len(keys)
+
+    def _rebuild(self):
+        # Занятый слот — ключ не None (пустая строка листа — ключ "")
+        keys = [
+            self._keys[slot]
+            for slot in range(self._head, self._tail + 1)
+            if self._keys[slot] is not None
+        ]
+        self._build(keys, max(ROW_INDEX_HEADROOM, len(keys) // 4))
+
+    def __len__(self):
+        return self._tree.prefix(self._tree.size)
+
+    def find(self, name: str) -> int | None:
+        slot = self._slots.get(normalize_exercise_name(name))
+        return None if slot is None else self._tree.prefix(slot)
+
+    def _occupy(self, slot: int, key: str):
+        self._tree.add(slot, 1)
+        self._keys[slot] = key
+        # Вставленная строка выше первой с тем же названием — теперь она первая
+        current = self._slots.get(key)
+        if key and (current is None or current > slot):
+            self._slots[key] = slot
+
+    # --- наши структурные правки (зеркально SheetMirror)
+    def insert_top(self, name: str):
+        if self._head <= 1:
+            self._rebuild()
+        self._head -= 1
+        self._occupy(self._head, normalize_exercise_name(name))
+
+    def append(self, name: str):
+        if self._tail >= self._tree.size:
+            self._rebuild()
+        self._tail += 1
+        self._occupy(self._tail, normalize_exercise_name(name))
+
+    def delete_row(self, row: int):
+        slot = self._tree.find(row)
+        self._tree.add(slot, -1)
+        key = self._keys[slot]
+        self._keys[slot] = None
+        if key and self._slots.get(key) == slot:
+            del self._slots[key]
+
+    def move_row_to_bottom(self, row: int, new_name: str):
+        self.delete_row(row)
+        self.append(new_name)
@@ -0,0 +1,68 @@
+# scheduler.py — периодические задачи внутри процесса бота
+#
+# Без отдельного cron: корутина спит до следующего запуска по настенным часам
+# (в часовом поясе тренеров) и вызывает задачу. Время пересчитывается перед
+# каждым сном, так что перевод часов и простои процесса не копят ошибку.
+# Время последнего запуска — в общем хранилище: запуск, пропущенный, пока
+# процесс лежал, можно выполнить при старте.
+import asyncio
+import logging
+from datetime import datetime, time, timedelta, tzinfo
+
+from state_backend import get_backend
+
+
+def next_weekly(now: datetime, weekday: int, at: time) -> datetime:
+    """
+    Ближайший момент строго после now: день недели weekday (0 — понедельник)
+    в время at (в поясе now).
+    """
+    run_at = datetime.combine(now.date(), at, tzinfo=now.tzinfo)
+    run_at += timedelta(days=(weekday - now.weekday()) % 7)
+    if run_at <= now:
+        run_at += timedelta(days=7)
+    return run_at
+
+
+def parse_time(value: str) -> time:
+    """
+    '03:30' -> time(3, 30).
+    """
+    hours, _, minutes = value.strip().partition(":")
+    return time(int(hours), int(minutes or 0))
+
+
+async def _run(name: str, job, slot: datetime):
+    try:
+        await job()
+    except Exception:
+        logging.exception(f"Задача {name} завершилась с ошибкой")
+    get_backend().set("schedule", name, slot.isoformat())
+
+
+async def run_weekly(
+    name: str, weekday: int, at: time, job, tz: tzinfo, catch_up: bool = False
+):
+    """
+    Вызывать async job() раз в неделю. Ошибка задачи не останавливает расписание.
+    catch_up — если последний запуск по расписанию пропущен (процесс лежал),
+    выполнить задачу сразу. Задача, которая ни разу не запускалась, не
+    догоняется: первый запуск — по расписанию.
+    """
+    if catch_up:
+        now = datetime.now(tz)
+        missed = next_weekly(now, weekday, at) - timedelta(days=7)
+        last = get_backend().get("schedule", name)
+        if last is not None and datetime.fromisoformat(last) < missed:
+            logging.info(
+                f"Задача {name}: пропущен запуск {missed:%Y-%m-%d %H:%M %Z}, "
+                f"выполняю сейчас"
+            )
+            await _run(name, job, missed)
+
+    while True:
+        now = datetime.now(tz)
+        run_at = next_weekly(now, weekday, at)
+        logging.info(f"Задача {name}: следующий запуск {run_at:%Y-%m-%d %H:%M %Z}")
+        await asyncio.sleep((run_at - now).total_seconds())
+        await _run(name, job, run_at)
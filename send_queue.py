@@ -0,0 +1,256 @@
+# send_queue.py — исходящие сообщения Telegram с учётом лимитов
+#
+# Все отправки и правки сообщений бота проходят через OUTBOUND — middleware
+# сессии aiogram (install(bot.session)):
+#   - не больше SEND_RATE сообщений в секунду на весь бот и SEND_CHAT_RATE
+#     в секунду на чат (с небольшим запасом SEND_CHAT_BURST подряд);
+#   - на 429 Telegram отвечает retry_after — вся отправка ждёт столько,
+#     сколько просят, и повторяет запрос, а не отдаёт ошибку обработчику;
+#   - несколько edit_text одного сообщения, ждущих своей очереди, сливаются:
+#     уходит только последний, остальные получают его результат.
+#
+# Массовые рассылки (еженедельная сводка) встают в SEND_QUEUE: её обработчик
+# шлёт сообщения, только когда не ждут ответы пользователям, так что тяжёлый
+# вывод не задерживает интерактивные ответы.
+import asyncio
+import contextvars
+import logging
+import os
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    EditMessageReplyMarkup,
+    EditMessageText,
+    SendDocument,
+    SendMessage,
+    SendPhoto,
+)
+
+
+# Лимит Telegram — около 30 сообщений в секунду на бота; держим запас
+SEND_RATE = float(os.getenv("SEND_RATE", 25))
+# В один чат — не чаще раза в секунду, короткие серии допустимы
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", 1))
+SEND_CHAT_BURST = int(os.getenv("SEND_CHAT_BURST", 4))
+SEND_MAX_ATTEMPTS = 3
+# При такой длине очереди рассылки — предупреждение в лог
+SEND_QUEUE_WARN_DEPTH = int(os.getenv("SEND_QUEUE_WARN_DEPTH", 200))
+
+RATE_LIMITED_METHODS = (
+    SendMessage,
+    SendPhoto,
+    SendDocument,
+    EditMessageText,
+    EditMessageReplyMarkup,
+)
+
+# Запрос из обработчика рассылки (низкий приоритет)
+_BULK = contextvars.ContextVar("send_queue_bulk", default=False)
+
+
+# -----------------------------
+# Лимиты
+# -----------------------------
+class TokenBucket:
+    """
+    rate токенов в секунду, не больше capacity в запасе. reserve() забирает
+    токен сразу и возвращает, сколько ждать до его появления.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def idle(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class Outbound:
+    def __init__(
+        self,
+        rate: float = SEND_RATE,
+        chat_rate: float = SEND_CHAT_RATE,
+        chat_burst: int = SEND_CHAT_BURST,
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._global = TokenBucket(rate, rate)
+        self._chats: dict[int, TokenBucket] = {}
+        self._paused_until = 0.0
+        # (chat_id, message_id) -> future последней ждущей правки
+        self._edits: dict[tuple, asyncio.Future] = {}
+        # Ответы пользователям, ждущие лимита
+        self.waiting = 0
+        self.sent = 0
+        self.merged = 0
+        self.retries = 0
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        if len(self._chats) > 1000:
+            self._chats = {
+                cid: b for cid, b in self._chats.items() if not b.idle(now)
+            }
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _wait_turn(self, chat_id: int):
+        if _BULK.get():
+            # Рассылка уступает ответам пользователям
+            while self.waiting:
+                await asyncio.sleep(0.05)
+        now = time.monotonic()
+        delay = max(
+            self._global.reserve(now),
+            self._chat_bucket(chat_id, now).reserve(now),
+            self._paused_until - now,
+        )
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _send(self, make_request, bot, method):
+        for attempt in range(1, SEND_MAX_ATTEMPTS + 1):
+            try:
+                result = await make_request(bot, method)
+                self.sent += 1
+                return result
+            except TelegramRetryAfter as e:
+                if attempt == SEND_MAX_ATTEMPTS:
+                    raise
+                self.retries += 1
+                # Flood control общий для бота: ждут все отправки
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + e.retry_after
+                )
+                logging.warning(
+                    f"Telegram просит подождать {e.retry_after} с "
+                    f"({type(method).__name__}, попытка {attempt})"
+                )
+                await asyncio.sleep(e.retry_after)
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if not isinstance(method, RATE_LIMITED_METHODS) or chat_id is None:
+            return await make_request(bot, method)
+        if isinstance(method, EditMessageText) and method.message_id is not None:
+            key = (chat_id, method.message_id)
+            return await self._edit(make_request, bot, method, key)
+        await self._queued(chat_id)
+        return await self._send(make_request, bot, method)
+
+    async def _queued(self, chat_id: int):
+        bulk = _BULK.get()
+        if not bulk:
+            self.waiting += 1
+        try:
+            await self._wait_turn(chat_id)
+        finally:
+            if not bulk:
+                self.waiting -= 1
+
+    async def _edit(self, make_request, bot, method, key: tuple):
+        future = asyncio.get_running_loop().create_future()
+        # Результат нужен только тем, чью правку заменили
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._edits[key] = future
+        try:
+            await self._queued(key[0])
+            latest = self._edits.get(key)
+            if latest is not None and latest is not future:
+                # Пока ждали, пришла более новая правка того же сообщения
+                self.merged += 1
+                result = await asyncio.shield(latest)
+            else:
+                result = await self._send(make_request, bot, method)
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+            raise
+        finally:
+            if self._edits.get(key) is future:
+                del self._edits[key]
+        # Более старые правки, заменённые этой, ждут её результат
+        if not future.done():
+            future.set_result(result)
+        return result
+
+    def depth(self) -> int:
+        """
+        Ответы пользователям, ждущие лимита, и сообщения рассылки в очереди.
+        """
+        return self.waiting + SEND_QUEUE.depth()
+
+    def stats(self) -> str:
+        return (
+            f"в очереди {self.depth()} (рассылка {SEND_QUEUE.depth()}), "
+            f"отправлено {self.sent}, слито правок {self.merged}, "
+            f"повторов после 429 {self.retries}"
+        )
+
+
+OUTBOUND = Outbound()
+
+
+def install(session):
+    """
+    Подключить лимиты к сессии бота (и к подменной сессии в нагрузочном тесте).
+    """
+    session.middleware(OUTBOUND)
+
+
+# -----------------------------
+# Очередь рассылок
+# -----------------------------
+class SendQueue:
+    def __init__(self):
+        self._queue: asyncio.Queue | None = None
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        # Очередь создаётся внутри работающего event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    def put(self, chat_id: int, text: str, **kwargs):
+        self.queue.put_nowait((chat_id, text, kwargs))
+        depth = self.depth()
+        if depth and depth % SEND_QUEUE_WARN_DEPTH == 0:
+            logging.warning(f"Очередь рассылки: {depth} сообщений")
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def join(self):
+        await self.queue.join()
+
+    async def run(self, bot):
+        # Лимиты и повторы — в OUTBOUND; здесь только низкий приоритет
+        _BULK.set(True)
+        while True:
+            chat_id, text, kwargs = await self.queue.get()
+            try:
+                await bot.send_message(chat_id, text, **kwargs)
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                logging.warning(f"Не удалось отправить сообщение в чат {chat_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+
+SEND_QUEUE = SendQueue()
@@ -0,0 +1,284 @@
+# sheet_sync.py — локальная копия листа и инкрементальная синхронизация
+#
+# Лист растёт вправо на одну колонку за тренировку, поэтому get_all_values()
+# с каждым месяцем тяжелее. Здесь держим копию листа с известной длиной каждой
+# строки и дочитываем только хвосты: один values.batchGet со столбцом A
+# (структурные изменения) и диапазоном каждой строки от последней известной
+# ячейки до конца. Объём запроса зависит от того, что изменилось, а не от
+# длины истории.
+#
+# Диапазоны идут в строке запроса GET, поэтому для больших листов batchGet
+# делится на несколько, не длиннее SYNC_QUERY_BYTES каждый. Столбец A — в
+# каждом: вставку строки между запросами видно как структурное изменение.
+import logging
+import os
+import sys
+from dataclasses import dataclass, field
+from urllib.parse import urlencode
+
+
+SYNC_QUERY_BYTES = int(os.getenv("SYNC_QUERY_BYTES", 6000))
+
+
+def column_letter(col: int) -> str:
+    """
+    1 -> 'A', 27 -> 'AA'.
+    """
+    letters = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def trim_row(row: list[str]) -> list[str]:
+    end = len(row)
+    while end and not str(row[end - 1]).strip():
+        end -= 1
+    return list(row[:end])
+
+
+# -----------------------------
+# Компактное хранение строк
+# -----------------------------
+# Разделитель ячеек в упакованной строке (в тексте тренировок не встречается)
+CELL_SEP = "\x1f"
+
+
+class SheetRow:
+    """
+    Одна строка листа: название упражнения (interned — одно на все кэши)
+    и остальные ячейки одной строкой через CELL_SEP. Вместо списка из сотни
+    объектов str — два.
+    """
+
+    __slots__ = ("name", "packed", "width")
+
+    def __init__(self, values: list[str]):
+        self.width = len(values)
+        self.name = sys.intern(values[0]) if values else ""
+        self.packed = CELL_SEP.join(values[1:])
+
+    def values(self) -> list[str]:
+        if self.width <= 1:
+            return [self.name] if self.width else []
+        return [self.name] + self.packed.split(CELL_SEP)
+
+
+class PackedRows:
+    """
+    Список строк листа, хранящий их как SheetRow. Снаружи — как список
+    списков: rows[i] отдаёт новый list[str], rows[i] = values упаковывает.
+    Изменить строку — только присваиванием (правка отданного списка
+    копию не меняет).
+    """
+
+    __slots__ = ("_rows",)
+
+    def __init__(self, rows=()):
+        self._rows = [SheetRow(values) for values in rows]
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        for row in self._rows:
+            yield row.values()
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [row.values() for row in self._rows[i]]
+        return self._rows[i].values()
+
+    def __setitem__(self, i: int, values: list[str]):
+        self._rows[i] = SheetRow(values)
+
+    def __delitem__(self, i: int):
+        del self._rows[i]
+
+    def insert(self, i: int, values: list[str]):
+        self._rows.insert(i, SheetRow(values))
+
+    def append(self, values: list[str]):
+        self._rows.append(SheetRow(values))
+
+    def pop(self, i: int = -1) -> list[str]:
+        return self._rows.pop(i).values()
+
+    def names(self) -> list[str]:
+        return [row.name for row in self._rows]
+
+    def widths(self) -> list[int]:
+        return [row.width for row in self._rows]
+
+
+class SheetMirror:
+    """
+    Значения листа построчно, без пустых ячеек в конце строк.
+    len(rows[i]) — номер последней заполненной колонки строки i + 1.
+    """
+
+    __slots__ = ("rows",)
+
+    def __init__(self, rows: list[list[str]]):
+        rows = [trim_row(row) for row in rows]
+        while rows and not rows[-1]:
+            rows.pop()
+        self.rows = PackedRows(rows)
+
+    def names(self) -> list[str]:
+        return self.rows.names()
+
+    def cell_count(self) -> int:
+        return sum(self.rows.widths())
+
+    # --- наши собственные записи (без чтения листа)
+    def set_cell(self, row: int, col: int, text: str):
+        values = self.rows[row - 1]
+        if len(values) < col:
+            values.extend([""] * (col - len(values)))
+        values[col - 1] = text
+        self.rows[row - 1] = trim_row(values)
+
+    def insert_row(self, row: int, values: list[str]):
+        self.rows.insert(row - 1, trim_row(values))
+
+    def move_row_to_bottom(self, row: int, new_name: str):
+        values = self.rows.pop(row - 1)
+        self.rows.append([new_name] + values[1:])
+
+    def delete_cells(self, row: int, first_col: int, last_col: int):
+        """
+        deleteRange со сдвигом влево: ячейки правее last_col сдвигаются.
+        """
+        values = self.rows[row - 1]
+        del values[first_col - 1 : last_col]
+        self.rows[row - 1] = trim_row(values)
+
+    def delete_row(self, row: int):
+        del self.rows[row - 1]
+
+
+@dataclass
+class SyncResult:
+    ranges: int = 0
+    cells_fetched: int = 0
+    # (row, col, text) — новые ячейки справа
+    appended: list[tuple] = field(default_factory=list)
+    # изменилась уже известная последняя ячейка строки — строку могли
+    # сдвинуть, копия ненадёжна, нужна полная пересинхронизация
+    modified: bool = False
+    # изменился столбец A — нужна полная пересинхронизация
+    structural: bool = False
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.appended) or self.modified or self.structural
+
+
+def full_sync(ws) -> SheetMirror:
+    mirror = SheetMirror(ws.get_all_values())
+    logging.info(
+        f"Полная синхронизация листа: {len(mirror.rows)} строк, "
+        f"{mirror.cell_count()} ячеек"
+    )
+    return mirror
+
+
+def tail_ranges(title: str, mirror: SheetMirror) -> list[str]:
+    """
+    Хвост каждой строки, начиная с последней известной ячейки
+    (её перечитываем, чтобы заметить правку последней тренировки).
+    """
+    sheet = "'" + title.replace("'", "''") + "'"
+    ranges = []
+    for idx, width in enumerate(mirror.rows.widths(), start=1):
+        start = max(width, 2)
+        ranges.append(f"{sheet}!{column_letter(start)}{idx}:{idx}")
+    return ranges
+
+
+def tail_batches(
+    title: str, mirror: SheetMirror, max_bytes: int = SYNC_QUERY_BYTES
+) -> list[list[str]]:
+    """
+    Диапазоны для batchGet, разбитые на запросы: в каждом столбец A и
+    подряд идущие хвосты строк, строка запроса — не длиннее max_bytes.
+    """
+    column_a = "'" + title.replace("'", "''") + "'!A:A"
+    base = len(urlencode({"ranges": column_a}))
+    batches = [[column_a]]
+    size = base
+    for range_name in tail_ranges(title, mirror):
+        cost = len(urlencode({"ranges": range_name})) + 1
+        if size + cost > max_bytes and len(batches[-1]) > 1:
+            batches.append([column_a])
+            size = base
+        batches[-1].append(range_name)
+        size += cost
+    return batches
+
+
+def merge(mirror: SheetMirror, responses: list[list[dict]]) -> SyncResult:
+    """
+    Слить ответы batchGet (по одному на запрос tail_batches) в копию листа.
+    При изменении столбца A хоть в одном ответе копию не трогаем —
+    structural=True.
+    """
+    result = SyncResult(ranges=sum(len(ranges) for ranges in responses))
+
+    names = trim_row([v.strip() for v in mirror.names()])
+    tails = []
+    for value_ranges in responses:
+        column_a = [
+            (row[0] if row else "") for row in value_ranges[0].get("values", [])
+        ]
+        result.cells_fetched += len(column_a)
+        if trim_row([v.strip() for v in column_a]) != names:
+            result.structural = True
+            return result
+        tails.extend(value_ranges[1:])
+
+    for idx, (row, vr) in enumerate(zip(mirror.rows, tails), start=1):
+        tail = (vr.get("values") or [[]])[0]
+        result.cells_fetched += len(tail)
+        start = max(len(row), 2)
+
+        known_last = row[start - 1] if len(row) >= start else ""
+        fetched_last = tail[0] if tail else ""
+        if len(row) >= 2 and fetched_last != known_last:
+            result.modified = True
+
+        base = row[: start - 1]
+        base += [""] * (start - 1 - len(base))
+        new_values = base + list(tail)
+
+        # Для строки без тренировок всё пришедшее — новое, иначе первая
+        # ячейка хвоста — уже известная последняя
+        offset = 0 if len(row) < 2 else 1
+        for col, text in enumerate(tail[offset:], start=start + offset):
+            if str(text).strip():
+                result.appended.append((idx, col, text))
+
+        mirror.rows[idx - 1] = trim_row(new_values)
+
+    return result
+
+
+def refresh(sh, ws, mirror: SheetMirror) -> SyncResult:
+    """
+    Дочитать изменения через values.batchGet (один запрос, для больших
+    листов — несколько). Если изменился столбец A — копия остаётся прежней,
+    а вызывающий делает full_sync.
+    """
+    batches = tail_batches(ws.title, mirror)
+    responses = [
+        sh.values_batch_get(ranges).get("valueRanges", []) for ranges in batches
+    ]
+    result = merge(mirror, responses)
+    logging.info(
+        f"Синхронизация хвостов: {len(batches)} запр., {result.ranges} диапазонов, "
+        f"{result.cells_fetched} ячеек, новых {len(result.appended)}, "
+        f"правки {result.modified}, структура {result.structural}"
+    )
+    return result
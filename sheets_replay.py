@@ -0,0 +1,173 @@
+# sheets_replay.py — воспроизведение трассы запросов Sheets (sheets_trace.py)
+#
+#     python sheets_replay.py trace.jsonl [trace.jsonl.1 ...]
+#         --target fake      таблицы в памяти (по умолчанию)
+#         --target google    настоящий API (учётная запись из google_sheets)
+#         --speed 10         сжатие времени: паузы между запросами / 10
+#                            (0 — без пауз, подряд)
+#         --map SRC=DST      подменить ID таблицы (например, на копию)
+#         --allow-writes     повторять запись в настоящий API (только в
+#                            таблицы из --map, остальные пропускаются)
+#         --workers 8        сколько запросов может идти одновременно
+#
+# Запросы отправляются с теми же интервалами (с учётом --speed), что и в
+# трассе, так что сохраняется форма нагрузки: всплески, параллельные чтения.
+# Запись без тела (трасса без SHEETS_TRACE_BODIES) пропускается. В конце —
+# сравнение задержек по операциям: в трассе и при воспроизведении.
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def load_trace(paths: list[str]) -> list[dict]:
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    # ts пишется по окончании запроса — сортируем по началу
+    for record in records:
+        record["started"] = record["ts"] - (record.get("latency_ms") or 0) / 1000
+    records.sort(key=lambda r: r["started"])
+    return records
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+def _client(target: str):
+    os.environ["SHEETS_BACKEND"] = target
+    # Воспроизведение не должно писать собственную трассу поверх исходной
+    os.environ.pop("SHEETS_TRACE_FILE", None)
+    import google_sheets
+
+    return google_sheets.get_client().http_client
+
+
+def replay(
+    records: list[dict],
+    target: str = "fake",
+    speed: float = 1.0,
+    mapping: dict | None = None,
+    allow_writes: bool = False,
+    workers: int = 8,
+) -> dict:
+    http = _client(target)
+    mapping = mapping or {}
+    results: dict[str, dict] = {}
+    lock = threading.Lock()
+
+    def stats(op: str) -> dict:
+        return results.setdefault(
+            op, {"recorded": [], "replayed": [], "errors": 0, "skipped": 0}
+        )
+
+    def send(record: dict):
+        url = record["url"]
+        spreadsheet = record.get("spreadsheet")
+        if spreadsheet in mapping:
+            url = url.replace(spreadsheet, mapping[spreadsheet])
+        started = time.perf_counter()
+        try:
+            http.request(
+                record["method"].lower(),
+                url,
+                params=record.get("params"),
+                json=record.get("body"),
+            )
+            error = False
+        except Exception as e:
+            print(f"Ошибка {record['op']}: {e}", file=sys.stderr)
+            error = True
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            s = stats(record["op"])
+            s["replayed"].append(elapsed)
+            s["errors"] += error
+
+    t0 = records[0]["started"] if records else 0
+    wall0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for record in records:
+            with lock:
+                s = stats(record["op"])
+                if record.get("latency_ms") is not None:
+                    s["recorded"].append(record["latency_ms"])
+
+            is_write = record["method"] != "GET"
+            if is_write and ("body" not in record and record["op"] != "values.clear"):
+                s["skipped"] += 1
+                continue
+            if is_write and target == "google" and (
+                not allow_writes or record.get("spreadsheet") not in mapping
+            ):
+                # В настоящий API пишем только в копии из --map, никогда
+                # в исходную таблицу
+                s["skipped"] += 1
+                continue
+
+            if speed > 0:
+                delay = (record["started"] - t0) / speed - (time.perf_counter() - wall0)
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(send, record)
+
+    results["_wall_seconds"] = time.perf_counter() - wall0
+    return results
+
+
+def print_report(results: dict):
+    wall = results.pop("_wall_seconds")
+    print(f"Воспроизведение заняло {wall:.2f} с")
+    print(
+        f"{'операция':<28}{'n':>6}{'пропущ':>8}{'ошибки':>8}"
+        f"{'p50 трасса':>12}{'p95 трасса':>12}{'p50 повтор':>12}{'p95 повтор':>12}"
+    )
+    for op in sorted(results):
+        s = results[op]
+        print(
+            f"{op[:27]:<28}{len(s['recorded']):>6}{s['skipped']:>8}{s['errors']:>8}"
+            f"{percentile(s['recorded'], 50):>12.1f}"
+            f"{percentile(s['recorded'], 95):>12.1f}"
+            f"{percentile(s['replayed'], 50):>12.1f}"
+            f"{percentile(s['replayed'], 95):>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Воспроизведение трассы Sheets")
+    parser.add_argument("trace", nargs="+")
+    parser.add_argument("--target", choices=("fake", "google"), default="fake")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--map", action="append", default=[], metavar="SRC=DST")
+    parser.add_argument("--allow-writes", action="store_true")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    mapping = dict(item.split("=", 1) for item in args.map)
+    if args.target == "google" and args.allow_writes and not mapping:
+        parser.error("--allow-writes в настоящий API — только с --map на копии таблиц")
+
+    records = load_trace(args.trace)
+    print(f"Запросов в трассе: {len(records)}")
+    print_report(
+        replay(
+            records,
+            target=args.target,
+            speed=args.speed,
+            mapping=mapping,
+            allow_writes=args.allow_writes,
+            workers=args.workers,
+        )
+    )
@@ -0,0 +1,176 @@
+# sheets_trace.py — трасса запросов к Google Sheets / Drive в JSONL
+#
+# SHEETS_TRACE_FILE=sheets_trace.jsonl включает запись: каждый запрос
+# google_sheets.py (через HTTP-клиент gspread) — одна строка JSON:
+#     ts, op, method, url, spreadsheet, ranges, requests (сколько запросов
+#     каждого вида в batchUpdate), req_bytes, resp_bytes, latency_ms, status, thread
+# SHEETS_TRACE_SAMPLE — доля записываемых запросов (ошибки пишутся всегда).
+# SHEETS_TRACE_MAX_BYTES / SHEETS_TRACE_BACKUPS — ротация файла.
+# SHEETS_TRACE_BODIES=1 — писать и тела запросов (нужны, чтобы
+# sheets_replay.py повторял запись, а не только чтение).
+import json
+import logging
+import os
+import random
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from urllib.parse import unquote
+
+
+SHEETS_TRACE_FILE = os.getenv("SHEETS_TRACE_FILE", "")
+SHEETS_TRACE_SAMPLE = float(os.getenv("SHEETS_TRACE_SAMPLE", 1.0))
+SHEETS_TRACE_MAX_BYTES = int(os.getenv("SHEETS_TRACE_MAX_BYTES", 20 * 1024 * 1024))
+SHEETS_TRACE_BACKUPS = int(os.getenv("SHEETS_TRACE_BACKUPS", 5))
+SHEETS_TRACE_BODIES = os.getenv("SHEETS_TRACE_BODIES", "") not in ("", "0")
+
+SHEETS_PREFIX = "https://sheets.googleapis.com/v4/spreadsheets/"
+DRIVE_PREFIX = "https://www.googleapis.com/drive/v3/files/"
+
+
+_LOGGER: logging.Logger | None = None
+_LOGGER_LOCK = threading.Lock()
+
+
+def _trace_logger() -> logging.Logger:
+    global _LOGGER
+    with _LOGGER_LOCK:
+        if _LOGGER is None:
+            logger = logging.getLogger("sheets_trace")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            handler = RotatingFileHandler(
+                SHEETS_TRACE_FILE,
+                maxBytes=SHEETS_TRACE_MAX_BYTES,
+                backupCount=SHEETS_TRACE_BACKUPS,
+                encoding="utf-8",
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            _LOGGER = logger
+            logging.info(
+                f"Трасса Sheets: {SHEETS_TRACE_FILE} "
+                f"(доля {SHEETS_TRACE_SAMPLE:g}, тела {SHEETS_TRACE_BODIES})"
+            )
+    return _LOGGER
+
+
+def describe(method: str, url: str, params: dict | None, body) -> dict:
+    """
+    Операция, таблица и диапазоны запроса — для трассы и отчётов.
+    """
+    params = params or {}
+    info = {"op": f"{method.upper()} {url}", "spreadsheet": None, "ranges": []}
+
+    if url.startswith(DRIVE_PREFIX):
+        info["op"] = "drive.files.get"
+        info["spreadsheet"] = url[len(DRIVE_PREFIX) :].split("/")[0]
+        return info
+    if not url.startswith(SHEETS_PREFIX):
+        return info
+
+    spreadsheet_id, _, rest = url[len(SHEETS_PREFIX) :].partition("/")
+    if spreadsheet_id.endswith(":batchUpdate"):
+        spreadsheet_id = spreadsheet_id[: -len(":batchUpdate")]
+        rest = ":batchUpdate"
+    info["spreadsheet"] = spreadsheet_id
+
+    if rest == "":
+        info["op"] = "spreadsheets.get"
+    elif rest == ":batchUpdate":
+        info["op"] = "spreadsheets.batchUpdate"
+        kinds = [next(iter(r)) for r in (body or {}).get("requests", [])]
+        info["requests"] = {kind: kinds.count(kind) for kind in dict.fromkeys(kinds)}
+    elif rest == "values:batchGet":
+        info["op"] = "values.batchGet"
+        ranges = params.get("ranges") or []
+        info["ranges"] = [ranges] if isinstance(ranges, str) else list(ranges)
+    elif rest.startswith("values/"):
+        range_part = unquote(rest[len("values/") :])
+        for suffix, op in ((":append", "values.append"), (":clear", "values.clear")):
+            if range_part.endswith(suffix):
+                info["op"] = op
+                range_part = range_part[: -len(suffix)]
+                break
+        else:
+            info["op"] = "values.get" if method.upper() == "GET" else "values.update"
+        info["ranges"] = [range_part]
+    return info
+
+
+def traced(http_client_cls):
+    """
+    Подкласс HTTP-клиента gspread, который пишет каждый запрос в трассу.
+    Работает и с настоящим клиентом, и с fake_sheets.FakeHTTPClient.
+    """
+
+    class TracedHTTPClient(http_client_cls):
+        def request(
+            self,
+            method,
+            endpoint,
+            params=None,
+            data=None,
+            json=None,
+            files=None,
+            headers=None,
+        ):
+            sampled = random.random() < SHEETS_TRACE_SAMPLE
+            started = time.perf_counter()
+            status = None
+            response = None
+            try:
+                response = super().request(
+                    method,
+                    endpoint,
+                    params=params,
+                    data=data,
+                    json=json,
+                    files=files,
+                    headers=headers,
+                )
+                status = response.status_code
+                return response
+            except Exception as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                status = status or type(e).__name__
+                response = getattr(e, "response", None)
+                sampled = True
+                raise
+            finally:
+                if sampled:
+                    _write(
+                        method, endpoint, params, json, data, response, status, started
+                    )
+
+    TracedHTTPClient.__name__ = "Traced" + http_client_cls.__name__
+    return TracedHTTPClient
+
+
+def _write(method, endpoint, params, body, data, response, status, started):
+    latency = time.perf_counter() - started
+    try:
+        record = {
+            "ts": round(time.time(), 3),
+            "method": method.upper(),
+            "url": endpoint,
+        }
+        record.update(describe(method, endpoint, params, body))
+        if params:
+            record["params"] = params
+        if body is not None:
+            payload = json.dumps(body, ensure_ascii=False)
+            record["req_bytes"] = len(payload.encode("utf-8"))
+            if SHEETS_TRACE_BODIES:
+                record["body"] = body
+        else:
+            record["req_bytes"] = len(data or b"")
+        content = getattr(response, "content", None)
+        record["resp_bytes"] = len(content) if content is not None else None
+        record["latency_ms"] = round(latency * 1000, 2)
+        record["status"] = status
+        record["thread"] = threading.current_thread().name
+        _trace_logger().info(json.dumps(record, ensure_ascii=False, default=str))
+    except Exception:
+        # Трасса не должна ломать запрос
+        logging.exception("Не удалось записать трассу запроса Sheets")
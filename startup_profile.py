@@ -0,0 +1,147 @@
+# startup_profile.py — замер холодного старта и ленивые импорты
+#
+# Импортируется первым в fitlogsbot.py. Фазы старта отмечаются через mark(),
+# после первого getUpdates (или установки webhook) в лог пишется отчёт.
+#
+# Проверка бюджета (например, в CI перед деплоем):
+#     python startup_profile.py --budget 5
+# импортирует бота в отдельном процессе и завершается с кодом 1, если импорт
+# дольше бюджета или если тяжёлые библиотеки подтянулись при старте.
+import importlib
+import logging
+import os
+import sys
+import time
+
+
+_STARTED = time.perf_counter()
+_LAST = _STARTED
+PHASES: list[tuple[str, float]] = []
+_REPORTED = False
+
+STARTUP_BUDGET = float(os.getenv("STARTUP_BUDGET", 5.0))
+
+# Не должны загружаться до первого обращения к таблицам/аналитике
+HEAVY_MODULES = ("gspread", "google.oauth2", "requests", "numpy", "matplotlib")
+
+
+def mark(phase: str):
+    """
+    Закрыть фазу: время с предыдущей отметки.
+    """
+    global _LAST
+    now = time.perf_counter()
+    PHASES.append((phase, now - _LAST))
+    _LAST = now
+
+
+def total() -> float:
+    return _LAST - _STARTED
+
+
+def report():
+    global _REPORTED
+    if _REPORTED:
+        return
+    _REPORTED = True
+
+    parts = ", ".join(f"{name} {sec * 1000:.0f} мс" for name, sec in PHASES)
+    logging.info(f"Старт за {total() * 1000:.0f} мс: {parts}")
+    if total() > STARTUP_BUDGET:
+        logging.warning(
+            f"Старт дольше бюджета: {total():.2f} с > {STARTUP_BUDGET:.2f} с"
+        )
+
+
+# -----------------------------
+# Ленивые импорты
+# -----------------------------
+class LazyModule:
+    """
+    Модуль импортируется при первом обращении к атрибуту.
+    import_module потокобезопасен, так что прогрев из потока допустим.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            started = time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            logging.info(
+                f"Ленивый импорт {self._name}: "
+                f"{(time.perf_counter() - started) * 1000:.0f} мс"
+            )
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+def is_loaded(module: LazyModule) -> bool:
+    return module._module is not None
+
+
+def preload(*modules: LazyModule):
+    """
+    Загрузить ленивые модули заранее (вызывать в потоке, когда бот уже отвечает).
+    """
+    for module in modules:
+        module._load()
+
+
+# -----------------------------
+# Проверка бюджета старта
+# -----------------------------
+def _check_budget(budget: float) -> int:
+    import subprocess
+
+    code = (
+        "import time, sys; t = time.perf_counter(); import fitlogsbot; "
+        "print('elapsed=%f' % (time.perf_counter() - t)); "
+        f"print('heavy=' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    env = dict(os.environ)
+    env.setdefault("TOKEN", "123456:" + "A" * 35)
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=here,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        return 1
+
+    values = dict(
+        line.split("=", 1) for line in result.stdout.splitlines() if "=" in line
+    )
+    elapsed = float(values["elapsed"])
+    heavy = values.get("heavy", "")
+    print(f"Импорт бота: {elapsed:.3f} с (бюджет {budget:.3f} с)")
+
+    failed = False
+    if elapsed > budget:
+        print("ПРЕВЫШЕН бюджет старта")
+        failed = True
+    if heavy:
+        print(f"При старте загружены тяжёлые модули: {heavy}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Проверка времени старта бота")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET)
+    args = parser.parse_args()
+    sys.exit(_check_budget(args.budget))
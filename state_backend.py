@@ -0,0 +1,226 @@
+# state_backend.py — общее хранилище состояния для нескольких процессов бота
+#
+# STATE_BACKEND=memory (по умолчанию) — всё в памяти процесса, как раньше.
+# STATE_BACKEND=sqlite — файл SQLite в режиме WAL (STATE_DB), общий для всех
+# процессов на машине: состояние пользователей, версии таблиц и т.п.
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_DB = os.getenv("STATE_DB", "fitlogs_state.db")
+
+
+class StateBackend:
+    """
+    Хранилище "пространство имён + ключ -> JSON-значение".
+    Все методы синхронные и быстрые (память / локальный файл).
+    """
+
+    def get(self, namespace: str, key):
+        raise NotImplementedError
+
+    def set(self, namespace: str, key, value):
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key):
+        raise NotImplementedError
+
+    def update(self, namespace: str, key, changes: dict) -> dict:
+        """
+        Атомарно слить changes в словарь по ключу и вернуть результат.
+        """
+        raise NotImplementedError
+
+    def incr(self, namespace: str, key) -> int:
+        raise NotImplementedError
+
+    def items(self, namespace: str) -> list[tuple]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryBackend(StateBackend):
+    def __init__(self):
+        self._data: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key):
+        value = self._data.get((namespace, str(key)))
+        # Копия через JSON — поведение такое же, как у общего хранилища
+        return None if value is None else json.loads(value)
+
+    def set(self, namespace, key, value):
+        self._data[(namespace, str(key))] = json.dumps(value, ensure_ascii=False)
+
+    def delete(self, namespace, key):
+        self._data.pop((namespace, str(key)), None)
+
+    def update(self, namespace, key, changes):
+        with self._lock:
+            value = self.get(namespace, key) or {}
+            value.update(changes)
+            self.set(namespace, key, value)
+            return value
+
+    def incr(self, namespace, key):
+        with self._lock:
+            value = (self.get(namespace, key) or 0) + 1
+            self.set(namespace, key, value)
+            return value
+
+    def items(self, namespace):
+        return [
+            (key, json.loads(value))
+            for (ns, key), value in list(self._data.items())
+            if ns == namespace
+        ]
+
+
+class SQLiteBackend(StateBackend):
+    """
+    Одна таблица kv в файле SQLite. WAL позволяет читать параллельно с записью
+    из других процессов; запись коротких транзакций сериализуется SQLite.
+    Соединение своё у каждого потока (обработчики ходят в Sheets из потоков).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " updated REAL NOT NULL, PRIMARY KEY (ns, key))"
+        )
+        logging.info(f"Общее состояние: SQLite {path}")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE ns = ? AND key = ?", (namespace, str(key))
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def _write(self, conn, namespace, key, value):
+        conn.execute(
+            "INSERT OR REPLACE INTO kv (ns, key, value, updated) VALUES (?, ?, ?, ?)",
+            (namespace, str(key), json.dumps(value, ensure_ascii=False), time.time()),
+        )
+
+    def set(self, namespace, key, value):
+        self._write(self._conn(), namespace, key, value)
+
+    def delete(self, namespace, key):
+        self._conn().execute(
+            "DELETE FROM kv WHERE ns = ? AND key = ?", (namespace, str(key))
+        )
+
+    def _read_modify_write(self, namespace, key, modify):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM kv WHERE ns = ? AND key = ?",
+                (namespace, str(key)),
+            ).fetchone()
+            value = modify(None if row is None else json.loads(row[0]))
+            self._write(conn, namespace, key, value)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def update(self, namespace, key, changes):
+        return self._read_modify_write(
+            namespace, key, lambda value: {**(value or {}), **changes}
+        )
+
+    def incr(self, namespace, key):
+        return self._read_modify_write(namespace, key, lambda value: (value or 0) + 1)
+
+    def items(self, namespace):
+        rows = self._conn().execute(
+            "SELECT key, value FROM kv WHERE ns = ?", (namespace,)
+        ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_BACKEND: StateBackend | None = None
+
+
+def get_backend() -> StateBackend:
+    global _BACKEND
+    if _BACKEND is None:
+        if STATE_BACKEND == "sqlite":
+            _BACKEND = SQLiteBackend(STATE_DB)
+        elif STATE_BACKEND == "memory":
+            _BACKEND = MemoryBackend()
+        else:
+            raise RuntimeError(f"Неизвестный STATE_BACKEND: {STATE_BACKEND}")
+    return _BACKEND
+
+
+# -----------------------------
+# Состояние пользователей поверх хранилища
+# -----------------------------
+class UserState(dict):
+    """
+    Состояние одного пользователя. Присваивание поля сразу пишется
+    в хранилище (атомарно, только изменённое поле), поэтому
+    USER_STATE[user_id]["mode"] = "train" работает как раньше.
+    """
+
+    def __init__(self, store: "UserStateStore", user_id: int, data: dict):
+        super().__init__(data)
+        self._store = store
+        self._user_id = user_id
+
+    def __setitem__(self, field, value):
+        super().__setitem__(field, value)
+        self._store.backend.update(self._store.namespace, self._user_id, {field: value})
+
+
+class UserStateStore:
+    def __init__(self, backend: StateBackend, namespace: str = "user_state"):
+        self.backend = backend
+        self.namespace = namespace
+
+    def get(self, user_id: int, default=None):
+        data = self.backend.get(self.namespace, user_id)
+        if data is None:
+            return default
+        return UserState(self, user_id, data)
+
+    def __getitem__(self, user_id: int) -> UserState:
+        state = self.get(user_id)
+        if state is None:
+            raise KeyError(user_id)
+        return state
+
+    def __setitem__(self, user_id: int, data: dict):
+        self.backend.set(self.namespace, user_id, data)
+
+    def __contains__(self, user_id: int):
+        return self.backend.get(self.namespace, user_id) is not None
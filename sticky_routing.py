@@ -0,0 +1,100 @@
+# sticky_routing.py — необязательная привязка чата к одному процессу бота
+#
+# Несколько процессов принимают webhook за балансировщиком. Состояние общее
+# (state_backend), но если включить STICKY_PEERS, все апдейты одного чата
+# обрабатывает один и тот же процесс — без гонок между соседними нажатиями.
+#
+# STICKY_PEERS=http://10.0.0.1:8080,http://10.0.0.2:8080  — адреса всех процессов
+# WORKER_INDEX=0                                           — номер этого процесса
+import json
+import logging
+import os
+
+from aiohttp import ClientSession, web
+
+
+STICKY_PEERS = [
+    p.strip().rstrip("/") for p in os.getenv("STICKY_PEERS", "").split(",") if p.strip()
+]
+WORKER_INDEX = int(os.getenv("WORKER_INDEX", 0))
+FORWARDED_HEADER = "X-Fitlogs-Forwarded"
+
+# Сессия для пересылки апдейтов; создаётся при первой пересылке
+_SESSION: ClientSession | None = None
+
+
+def update_chat_id(update: dict):
+    """
+    ID чата (или пользователя) из сырого JSON апдейта, None если не нашли.
+    """
+    for kind in ("message", "edited_message", "callback_query", "inline_query"):
+        obj = update.get(kind)
+        if not obj:
+            continue
+        chat = obj.get("chat") or (obj.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        if obj.get("from"):
+            return obj["from"]["id"]
+    return None
+
+
+def owner_index(chat_id: int) -> int:
+    return chat_id % len(STICKY_PEERS)
+
+
+def sticky_middleware(webhook_path: str):
+    """
+    aiohttp-middleware: апдейт чужого чата пересылается процессу-владельцу.
+    """
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        global _SESSION
+        if (
+            len(STICKY_PEERS) < 2
+            or request.path != webhook_path
+            or request.headers.get(FORWARDED_HEADER)
+        ):
+            return await handler(request)
+
+        body = await request.read()
+        try:
+            chat_id = update_chat_id(json.loads(body))
+        except ValueError:
+            chat_id = None
+
+        if chat_id is None or owner_index(chat_id) == WORKER_INDEX:
+            return await handler(request)
+
+        if _SESSION is None:
+            _SESSION = ClientSession()
+        peer = STICKY_PEERS[owner_index(chat_id)]
+        headers = {
+            k: v
+            for k, v in request.headers.items()
+            if k.lower().startswith("x-telegram")
+        }
+        headers[FORWARDED_HEADER] = "1"
+        headers["Content-Type"] = "application/json"
+        try:
+            async with _SESSION.post(
+                peer + webhook_path, data=body, headers=headers
+            ) as resp:
+                return web.Response(status=resp.status)
+        except Exception as e:
+            # Владелец недоступен — обрабатываем сами, состояние всё равно общее
+            logging.warning(f"Не удалось переслать апдейт на {peer}: {e}")
+            return await handler(request)
+
+    return middleware
+
+
+async def close():
+    """
+    Закрыть сессию пересылки (при остановке бота).
+    """
+    global _SESSION
+    if _SESSION is not None:
+        await _SESSION.close()
+        _SESSION = None
@@ -0,0 +1,94 @@
+# Тесты гоняют бота на таблицах в памяти (fake_sheets.py) и общем
+# хранилище в памяти — без сети, учётных записей и файлов.
+import contextlib
+import os
+import sys
+import uuid
+from datetime import date
+from types import MappingProxyType
+
+os.environ.setdefault("TOKEN", "1:TEST")
+os.environ["SHEETS_BACKEND"] = "fake"
+os.environ["STATE_BACKEND"] = "memory"
+os.environ["LEDGER_DB"] = ""
+os.environ["FAKE_SHEETS_LATENCY_MS"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+import athletes_config  # noqa: E402
+import fake_sheets  # noqa: E402
+
+
+@pytest.fixture
+def athlete(monkeypatch):
+    """
+    Новый атлет со своей сгенерированной таблицей: кэши и версии
+    других тестов его не касаются.
+    """
+    name = f"Атлет {uuid.uuid4().hex[:8]}"
+    athletes = dict(athletes_config.snapshot())
+    athletes[name] = uuid.uuid4().hex
+    monkeypatch.setattr(
+        athletes_config, "snapshot", lambda: MappingProxyType(athletes)
+    )
+    return name
+
+
+def spreadsheet(athlete_name: str) -> fake_sheets.FakeSpreadsheet:
+    return fake_sheets.STORE.get(athletes_config.snapshot()[athlete_name])
+
+
+def hand_edit(athlete_name: str, edit):
+    """
+    Правка "руками" в таблице: меняет лист в обход бота и version в Drive.
+    """
+    sp = spreadsheet(athlete_name)
+    with fake_sheets.STORE.lock:
+        edit(sp.sheets[0])
+        sp.version += 1
+
+
+def today_lines(*sets: str) -> list[str]:
+    today = date.today()
+    return [f"{today.day}.{today.month}", *sets]
+
+
+@pytest.fixture
+def other_process():
+    """
+    Контекст "другого процесса бота": свои кэши и детектор правок,
+    общие только таблицы и хранилище (как у процессов за балансировщиком).
+    """
+    import google_sheets
+    from change_detector import ChangeDetector
+
+    caches = (
+        "_MIRRORS",
+        "_ARCHIVES",
+        "_HISTORY",
+        "_RECORDS",
+        "_SEARCH",
+        "_ROWS",
+        "_LAST_CELLS",
+        "_LOCAL_VERSIONS",
+    )
+
+    @contextlib.contextmanager
+    def run():
+        saved = {name: getattr(google_sheets, name) for name in caches}
+        saved["_STALE"] = google_sheets._STALE
+        saved["CHANGES"] = google_sheets.CHANGES
+        for name in caches:
+            setattr(google_sheets, name, {})
+        google_sheets._STALE = set()
+        google_sheets.CHANGES = ChangeDetector(
+            google_sheets.get_drive_version, google_sheets._on_external_change
+        )
+        try:
+            yield
+        finally:
+            for name, value in saved.items():
+                setattr(google_sheets, name, value)
+
+    return run
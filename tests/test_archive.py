@@ -0,0 +1,13 @@
+import google_sheets
+
+
+def test_archive_by_other_process_is_picked_up(athlete, other_process):
+    sets = len(google_sheets.get_history(athlete).dates)
+
+    with other_process():
+        rows, cells, years = google_sheets.archive_old_cells(athlete, horizon_days=365)
+    assert cells > 0
+
+    history = google_sheets.get_history(athlete)
+    assert len(history.dates) == sets
+    assert sorted(google_sheets.get_archive(athlete).tabs) == years
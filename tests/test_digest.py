@@ -0,0 +1,74 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+import digest
+import google_sheets
+import scheduler
+from state_backend import get_backend
+from workout_history import WorkoutHistory
+
+
+def _history(cells: list[tuple[date, str]]) -> WorkoutHistory:
+    row = ["Жим"] + [f"{d.day}.{d.month}\n{sets}" for d, sets in cells]
+    history = WorkoutHistory()
+    history.add_grid([row], max(d for d, _ in cells))
+    return history
+
+
+def test_digest_ignores_workouts_after_week_end():
+    monday = date(2026, 10, 12)
+    history = _history(
+        [
+            (monday - timedelta(days=10), "60x5"),
+            (monday - timedelta(days=3), "65x5"),
+            (monday + timedelta(days=2), "80x5"),
+        ]
+    )
+    text = digest.build_digest("Атлет", history, monday)
+    assert "65 кг × 5" in text
+    assert "80 кг" not in text
+    assert "Тренировок за неделю: 1" in text
+
+
+def test_digest_midweek_uses_last_weekly_text(athlete, monkeypatch):
+    monday = date(2026, 10, 12)
+    thursday = monday + timedelta(days=3)
+    assert digest.week_end(thursday) == digest.week_end(monday) == monday
+
+    get_backend().set(
+        "digest",
+        athlete,
+        {"period": digest.period_key(monday), "until": "2026-10-12", "text": "готово"},
+    )
+    monkeypatch.setattr("athletes_config.snapshot", lambda: {athlete: "x"})
+
+    async def no_sheets(name):
+        raise AssertionError("сводка недели уже посчитана")
+
+    monkeypatch.setattr(google_sheets, "get_history_async", no_sheets)
+    messages = asyncio.run(digest.digest_messages(thursday))
+    assert messages == [f"📅 Сводка за неделю до {monday:%d.%m}\n\nготово"]
+
+
+def test_missed_weekly_run_is_caught_up():
+    ran = []
+
+    async def job():
+        ran.append(True)
+
+    tz = digest.DIGEST_TZ
+    now = datetime.now(tz)
+    name = f"test_job_{now.timestamp()}"
+    at = (now - timedelta(hours=1)).time().replace(second=0, microsecond=0)
+    get_backend().set("schedule", name, (now - timedelta(days=8)).isoformat())
+
+    async def run():
+        task = asyncio.create_task(
+            scheduler.run_weekly(name, now.weekday(), at, job, tz, catch_up=True)
+        )
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run())
+    assert ran == [True]
+    assert get_backend().get("schedule", name) > now.isoformat()[:10]
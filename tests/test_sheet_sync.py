@@ -0,0 +1,66 @@
+from urllib.parse import urlencode
+
+import fake_sheets
+import google_sheets
+import sheet_sync
+from conftest import hand_edit, spreadsheet
+from sheet_sync import SheetMirror, tail_batches, tail_ranges, trim_row
+
+
+def _sheet_rows(athlete_name):
+    return [
+        trim_row(row) for row in spreadsheet(athlete_name).sheets[0].rows
+    ]
+
+
+def test_resync_after_cells_deleted_mid_row(athlete):
+    google_sheets.get_history(athlete)
+
+    # Удалили B..F в строке 1 со сдвигом влево
+    hand_edit(athlete, lambda sheet: sheet.rows[0].__delitem__(slice(1, 6)))
+    google_sheets.CHANGES.check(athlete)
+
+    assert list(google_sheets.get_all_values(athlete)) == _sheet_rows(athlete)
+    history = google_sheets.get_history(athlete)
+    fresh = google_sheets.parse_grids([], _sheet_rows(athlete))
+    assert history.names == fresh.names
+    assert len(history.dates) == len(fresh.dates)
+
+
+def test_tail_batches_fit_query_limit_on_large_sheet():
+    mirror = SheetMirror([[f"Упражнение {i}", "1.1\nx5"] for i in range(1500)])
+    batches = tail_batches("Лист1", mirror, max_bytes=6000)
+
+    assert len(batches) > 1
+    for ranges in batches:
+        assert ranges[0] == "'Лист1'!A:A"
+        assert len(urlencode([("ranges", r) for r in ranges])) <= 6000
+    tails = [r for ranges in batches for r in ranges[1:]]
+    assert tails == tail_ranges("Лист1", mirror)
+
+
+def test_resync_large_sheet_in_several_requests(athlete, monkeypatch):
+    def grow(sheet):
+        sheet.rows += [[f"Доп {i}", "1.1\nx5"] for i in range(1500)]
+
+    hand_edit(athlete, grow)
+    google_sheets.get_all_values(athlete)
+
+    def append(sheet):
+        sheet.rows[1400].append("2.1\nx6")
+
+    hand_edit(athlete, append)
+    google_sheets.CHANGES.check(athlete)
+
+    requests = []
+    real = fake_sheets.handle
+
+    def counting(method, url, params, body):
+        if url.endswith("values:batchGet"):
+            requests.append(urlencode([("ranges", r) for r in params["ranges"]]))
+        return real(method, url, params, body)
+
+    monkeypatch.setattr(fake_sheets, "handle", counting)
+    assert list(google_sheets.get_all_values(athlete)) == _sheet_rows(athlete)
+    assert len(requests) > 1
+    assert all(len(query) <= sheet_sync.SYNC_QUERY_BYTES for query in requests)
@@ -0,0 +1,58 @@
+import pytest
+
+import fake_sheets
+import google_sheets
+from conftest import hand_edit, spreadsheet, today_lines
+
+
+def _row_of(athlete_name, exercise_name):
+    for row in spreadsheet(athlete_name).sheets[0].rows:
+        if row and row[0] == exercise_name:
+            return fake_sheets._trim(row)
+    raise AssertionError(exercise_name)
+
+
+def test_undo_cell_after_row_inserted_above(athlete):
+    google_sheets.get_all_values(athlete)
+    _, undo = google_sheets.add_workout_cell(
+        athlete, "Упражнение 4", today_lines("50x5")
+    )
+    assert undo["row"] == 4
+    neighbour = list(_row_of(athlete, "Упражнение 3"))
+
+    hand_edit(athlete, lambda sheet: sheet.rows.insert(0, ["Новое упражнение"]))
+    google_sheets.CHANGES.check(athlete)
+    google_sheets.undo_write(undo)
+
+    assert _row_of(athlete, "Упражнение 3") == neighbour
+    row = _row_of(athlete, "Упражнение 4")
+    assert undo["text"] not in row
+    assert google_sheets.get_all_values(athlete)[4] == row
+
+
+def test_undo_cell_refused_when_row_cannot_be_verified(athlete):
+    _, undo = google_sheets.add_workout_cell(
+        athlete, "Упражнение 4", today_lines("50x5")
+    )
+    # Кэшей нет: номер строки взять неоткуда, кроме записи отмены
+    google_sheets._evict(athlete)
+    google_sheets._ROWS.pop(athlete, None)
+    hand_edit(athlete, lambda sheet: sheet.rows.insert(0, ["Новое упражнение"]))
+    neighbour = list(_row_of(athlete, "Упражнение 3"))
+
+    with pytest.raises(ValueError):
+        google_sheets.undo_write(undo)
+    assert _row_of(athlete, "Упражнение 3") == neighbour
+    assert _row_of(athlete, "Упражнение 4")[-1] == undo["text"]
+
+
+def test_undo_exercise_refused_when_later_cells_exist(athlete):
+    undo = google_sheets.add_exercise_with_workout(
+        athlete, "Тяга", today_lines("60x8")
+    )
+    google_sheets.add_workout_cell(athlete, "Тяга", today_lines("62.5x8"))
+    google_sheets._evict(athlete)
+
+    with pytest.raises(ValueError):
+        google_sheets.undo_write(undo)
+    assert len(_row_of(athlete, "Тяга")) == 3
@@ -0,0 +1,166 @@
+# throttling.py — защита квоты Sheets от двойных нажатий и спама
+#
+# ThrottlingMiddleware (aiogram, outer-middleware на сообщения и callback):
+#   - одинаковое нажатие/сообщение того же пользователя в течение
+#     THROTTLE_DEBOUNCE_MS молча отбрасывается;
+#   - у пользователя не больше THROTTLE_USER_INFLIGHT действий одновременно,
+#     лишние получают "подожди" вместо похода в таблицу;
+#   - действия с одним атлетом идут не больше THROTTLE_ATHLETE_INFLIGHT сразу
+#     (по умолчанию по одному: свободная колонка считается по строке листа,
+#     две параллельные записи попали бы в одну ячейку), остальные ждут.
+#
+# SingleFlight: одинаковые чтения, запрошенные одновременно, выполняются
+# один раз — все ждут один и тот же future.
+#
+# Всё это — в памяти процесса: при нескольких процессах бота вместе со
+# STICKY_PEERS (все апдейты чата в одном процессе) защищает полностью.
+import asyncio
+import inspect
+import logging
+import os
+import time
+from collections import Counter
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message
+
+
+THROTTLE_DEBOUNCE_SEC = float(os.getenv("THROTTLE_DEBOUNCE_MS", 800)) / 1000
+THROTTLE_USER_INFLIGHT = int(os.getenv("THROTTLE_USER_INFLIGHT", 2))
+THROTTLE_ATHLETE_INFLIGHT = int(os.getenv("THROTTLE_ATHLETE_INFLIGHT", 1))
+
+BUSY_TEXT = "⏳ Предыдущее действие ещё выполняется"
+
+
+# -----------------------------
+# Одно чтение на всех (single-flight)
+# -----------------------------
+class SingleFlight:
+    def __init__(self):
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def run(self, func, *args):
+        """
+        Результат func(*args). Синхронная func выполняется в потоке.
+        Если такой же вызов уже идёт — ждём его, а не делаем второй.
+        """
+        key = (func.__module__, func.__qualname__, args)
+        future = self._inflight.get(key)
+        if future is None:
+            self.calls += 1
+            if inspect.iscoroutinefunction(func):
+                future = asyncio.ensure_future(func(*args))
+            else:
+                future = asyncio.ensure_future(asyncio.to_thread(func, *args))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.shared += 1
+        # shield: отменённый ожидающий не отменяет чтение для остальных
+        return await asyncio.shield(future)
+
+
+READS = SingleFlight()
+
+
+async def read_once(func, *args):
+    return await READS.run(func, *args)
+
+
+# -----------------------------
+# Middleware
+# -----------------------------
+def _event_key(event) -> tuple | None:
+    if isinstance(event, CallbackQuery):
+        message_id = event.message.message_id if event.message else None
+        return ("cb", message_id, event.data)
+    if isinstance(event, Message) and event.text:
+        return ("msg", event.text)
+    return None
+
+
+async def _reply(event, text: str | None):
+    if isinstance(event, CallbackQuery):
+        # Ответить на callback нужно в любом случае — иначе кнопка "крутится"
+        await event.answer(text)
+    elif text:
+        await event.answer(text)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(
+        self,
+        athlete_of=None,
+        debounce: float = THROTTLE_DEBOUNCE_SEC,
+        user_limit: int = THROTTLE_USER_INFLIGHT,
+        athlete_limit: int = THROTTLE_ATHLETE_INFLIGHT,
+    ):
+        """
+        athlete_of(event, user_id) -> имя атлета, с которым работает действие
+        (или None — тогда ограничение по атлету не применяется).
+        """
+        self.athlete_of = athlete_of
+        self.debounce = debounce
+        self.user_limit = user_limit
+        self.athlete_limit = athlete_limit
+        self._recent: dict[tuple, float] = {}
+        self._user_inflight: Counter = Counter()
+        self._athletes: dict[str, asyncio.Semaphore] = {}
+        self.dropped: Counter = Counter()
+
+    def _is_repeat(self, user_id: int, key: tuple, now: float) -> bool:
+        if len(self._recent) > 1000:
+            self._recent = {
+                k: t for k, t in self._recent.items() if now - t < self.debounce
+            }
+        last = self._recent.get((user_id, key))
+        self._recent[(user_id, key)] = now
+        return last is not None and now - last < self.debounce
+
+    def athlete_lock(self, athlete_name: str) -> asyncio.Semaphore:
+        """
+        Тот же семафор, что держат действия с атлетом, — для обработчиков,
+        которые сами работают с несколькими атлетами по очереди.
+        """
+        return self._athlete_semaphore(athlete_name)
+
+    def _athlete_semaphore(self, athlete_name: str) -> asyncio.Semaphore:
+        semaphore = self._athletes.get(athlete_name)
+        if semaphore is None:
+            semaphore = self._athletes[athlete_name] = asyncio.Semaphore(
+                self.athlete_limit
+            )
+        return semaphore
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        key = _event_key(event)
+        if key is not None and self._is_repeat(user.id, key, time.monotonic()):
+            self.dropped["debounce"] += 1
+            await _reply(event, None)
+            return None
+
+        if self._user_inflight[user.id] >= self.user_limit:
+            self.dropped["user"] += 1
+            logging.info(
+                f"Пользователь {user.id}: действие отклонено, уже выполняются другие"
+            )
+            await _reply(event, BUSY_TEXT)
+            return None
+
+        self._user_inflight[user.id] += 1
+        try:
+            athlete_name = self.athlete_of(event, user.id) if self.athlete_of else None
+            if athlete_name is None:
+                return await handler(event, data)
+            async with self._athlete_semaphore(athlete_name):
+                return await handler(event, data)
+        finally:
+            self._user_inflight[user.id] -= 1
+            if not self._user_inflight[user.id]:
+                del self._user_inflight[user.id]
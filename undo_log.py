@@ -0,0 +1,53 @@
+# undo_log.py — журнал последних записей пользователя для кнопки "↩️ Отменить"
+#
+# Каждая запись бота в таблицу (новая ячейка, новое упражнение) оставляет
+# запись с координатами: таблица, лист, строка, колонка и что сделать для
+# отмены. Журнал ограничен UNDO_KEEP записями на пользователя и хранится в
+# общем хранилище — кнопку можно нажать в любом процессе бота.
+import os
+import time
+import uuid
+
+from state_backend import get_backend
+
+
+UNDO_KEEP = int(os.getenv("UNDO_KEEP", 5))
+# Старые записи не отменяются: таблицу за это время могли править руками
+UNDO_MAX_AGE_SEC = int(os.getenv("UNDO_MAX_AGE_SEC", 24 * 3600))
+
+NAMESPACE = "undo_log"
+
+
+def record(user_id: int, entry: dict) -> str:
+    """
+    Добавить запись в журнал пользователя, вернуть её id для кнопки.
+    """
+    entry = dict(entry, id=uuid.uuid4().hex[:12], ts=time.time())
+    log = get_backend().get(NAMESPACE, user_id) or []
+    log = (log + [entry])[-UNDO_KEEP:]
+    get_backend().set(NAMESPACE, user_id, log)
+    return entry["id"]
+
+
+def take(user_id: int, entry_id: str) -> dict | None:
+    """
+    Забрать запись из журнала (повторное нажатие её уже не найдёт).
+    None — записи нет или она устарела.
+    """
+    log = get_backend().get(NAMESPACE, user_id) or []
+    entry = next((e for e in log if e["id"] == entry_id), None)
+    if entry is None:
+        return None
+    get_backend().set(NAMESPACE, user_id, [e for e in log if e["id"] != entry_id])
+    if time.time() - entry["ts"] > UNDO_MAX_AGE_SEC:
+        return None
+    return entry
+
+
+def put_back(user_id: int, entry: dict):
+    """
+    Вернуть запись, если отмена не удалась.
+    """
+    log = get_backend().get(NAMESPACE, user_id) or []
+    log = sorted(log + [entry], key=lambda e: e["ts"])[-UNDO_KEEP:]
+    get_backend().set(NAMESPACE, user_id, log)
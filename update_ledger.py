@@ -0,0 +1,180 @@
+# update_ledger.py — повторные апдейты и повторные записи не доходят до таблиц
+#
+# Два журнала (переживают перезапуск; при STATE_BACKEND=sqlite видны и всем
+# процессам бота):
+#   - update_id обработанных апдейтов. Telegram присылает апдейт повторно,
+#     если бот упал или не ответил на webhook вовремя, — второй раз он не
+#     обрабатывается. Апдейт, обработка которого упала с ошибкой, из журнала
+#     убирается: повторная доставка обработает его заново.
+#   - отпечатки недавних записей тренировок (атлет, упражнение, текст ячейки)
+#     вместе с ответом пользователю. Если ту же тренировку прислали ещё раз
+#     (сообщение "не дошло" и его отправили снова), ответ берётся из журнала,
+#     а таблица не трогается.
+#
+# Оба журнала ограничены: последние LEDGER_UPDATES_KEEP апдейтов и
+# LEDGER_WRITES_KEEP записей, запись считается повтором LEDGER_WRITE_WINDOW_SEC.
+#
+# Повторная доставка чаще всего случается как раз после перезапуска, поэтому
+# при STATE_BACKEND=memory журнал всё равно хранится на диске — в своём файле
+# SQLite LEDGER_DB. Пустой LEDGER_DB — журнал в памяти (только для тестов).
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from state_backend import MemoryBackend, SQLiteBackend, StateBackend, get_backend
+from workout_history import normalize_exercise_name
+
+
+LEDGER_UPDATES_KEEP = int(os.getenv("LEDGER_UPDATES_KEEP", 2000))
+LEDGER_WRITES_KEEP = int(os.getenv("LEDGER_WRITES_KEEP", 500))
+LEDGER_WRITE_WINDOW_SEC = int(os.getenv("LEDGER_WRITE_WINDOW_SEC", 30 * 60))
+
+LEDGER_DB = os.getenv("LEDGER_DB", "fitlogs_ledger.db")
+
+UPDATES_NAMESPACE = "update_ledger"
+WRITES_NAMESPACE = "write_ledger"
+
+
+_STORE: StateBackend | None = None
+
+
+def ledger_store() -> StateBackend:
+    """
+    Общее хранилище, если оно переживает перезапуск, иначе — файл LEDGER_DB.
+    """
+    global _STORE
+    if _STORE is None:
+        store = get_backend()
+        if isinstance(store, MemoryBackend):
+            if LEDGER_DB:
+                store = SQLiteBackend(LEDGER_DB)
+                logging.info(f"Журнал апдейтов: {LEDGER_DB}")
+            else:
+                logging.warning(
+                    "Журнал апдейтов в памяти: после перезапуска повторно "
+                    "доставленные апдейты и записи будут обработаны ещё раз"
+                )
+        _STORE = store
+    return _STORE
+
+
+def write_fingerprint(athlete_name: str, exercise_name: str, cell_text: str) -> str:
+    """
+    Отпечаток записи: одинаков для той же тренировки с другими пробелами
+    и регистром названия.
+    """
+    lines = [ln.strip() for ln in cell_text.split("\n") if ln.strip()]
+    key = "\x1f".join(
+        [athlete_name.strip(), normalize_exercise_name(exercise_name)] + lines
+    )
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+class _BoundedKeys:
+    """
+    Ключи журнала в хранилище в порядке добавления; лишние старые удаляются.
+    После перезапуска порядок восстанавливается из хранилища по order(item).
+    """
+
+    def __init__(self, namespace: str, keep: int, order):
+        self.namespace = namespace
+        self.keep = keep
+        self._order = order
+        self._keys: OrderedDict | None = None
+        self._lock = threading.Lock()
+
+    def _loaded(self) -> OrderedDict:
+        if self._keys is None:
+            items = sorted(ledger_store().items(self.namespace), key=self._order)
+            self._keys = OrderedDict((str(key), None) for key, _ in items)
+        return self._keys
+
+    def added(self, key):
+        with self._lock:
+            keys = self._loaded()
+            keys[str(key)] = None
+            keys.move_to_end(str(key))
+            while len(keys) > self.keep:
+                oldest, _ = keys.popitem(last=False)
+                ledger_store().delete(self.namespace, oldest)
+
+    def removed(self, key):
+        with self._lock:
+            self._loaded().pop(str(key), None)
+        ledger_store().delete(self.namespace, key)
+
+
+class UpdateLedger:
+    def __init__(self):
+        self._updates = _BoundedKeys(
+            UPDATES_NAMESPACE, LEDGER_UPDATES_KEEP, order=lambda item: int(item[0])
+        )
+        self._writes = _BoundedKeys(
+            WRITES_NAMESPACE, LEDGER_WRITES_KEEP, order=lambda item: item[1]["ts"]
+        )
+
+    # --- апдейты
+    def claim(self, update_id: int) -> bool:
+        """
+        True — апдейт новый и теперь числится обработанным. incr атомарен:
+        из двух процессов, получивших один апдейт, его возьмёт один.
+        """
+        if ledger_store().incr(UPDATES_NAMESPACE, update_id) > 1:
+            return False
+        self._updates.added(update_id)
+        return True
+
+    def release(self, update_id: int):
+        self._updates.removed(update_id)
+
+    async def middleware(self, handler, event, data):
+        """
+        Outer-middleware на апдейты: повторно доставленный апдейт пропускается.
+        """
+        if not self.claim(event.update_id):
+            logging.info(f"Апдейт {event.update_id} уже обработан, пропускаю")
+            return None
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.release(event.update_id)
+            raise
+
+    # --- записи тренировок
+    def recent_write(self, athlete_name, exercise_name, cell_text) -> dict | None:
+        """
+        Та же тренировка, записанная недавно: {"text", "undo_id"} ответа на неё.
+        """
+        fingerprint = write_fingerprint(athlete_name, exercise_name, cell_text)
+        entry = ledger_store().get(WRITES_NAMESPACE, fingerprint)
+        if entry is None or time.time() - entry["ts"] > LEDGER_WRITE_WINDOW_SEC:
+            return None
+        logging.info(
+            f"Повтор записи {athlete_name}: {exercise_name} — ответ из журнала"
+        )
+        return entry
+
+    def record_write(
+        self, athlete_name, exercise_name, cell_text, text: str, undo_id: str
+    ):
+        fingerprint = write_fingerprint(athlete_name, exercise_name, cell_text)
+        ledger_store().set(
+            WRITES_NAMESPACE,
+            fingerprint,
+            {"ts": time.time(), "text": text, "undo_id": undo_id},
+        )
+        self._writes.added(fingerprint)
+
+    def forget_write(self, athlete_name, exercise_name, cell_text):
+        """
+        Запись отменили — такую же тренировку снова можно записать.
+        """
+        self._writes.removed(
+            write_fingerprint(athlete_name, exercise_name, cell_text)
+        )
+
+
+LEDGER = UpdateLedger()
@@ -0,0 +1,319 @@
+# workout_history.py — разбор ячеек тренировок в колоночную историю
+import itertools
+import sys
+from array import array
+from datetime import date
+
+
+# Версии уникальны на весь процесс: кэши по (атлет, version) не перепутают
+# старую и новую историю после перезагрузки реестра
+_VERSIONS = itertools.count(1)
+
+
+# -----------------------------
+# Разбор даты и строк подходов
+# -----------------------------
+def parse_day_month(date_str: str):
+    """
+    '5.12', '05.12', '5/12' -> (5, 12). Для всего остального — None.
+    """
+    s = date_str.strip().replace(" ", "").replace("/", ".")
+    parts = s.split(".")
+    if len(parts) != 2 or not parts[0].isdigit() or not parts[1].isdigit():
+        return None
+
+    day, month = int(parts[0]), int(parts[1])
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return None
+    return day, month
+
+
+def _latest_date_not_after(day: int, month: int, limit: date):
+    """
+    Последняя дата day.month, которая не позже limit.
+    Перебираем несколько лет назад из-за 29.02.
+    """
+    for year in range(limit.year, limit.year - 5, -1):
+        try:
+            d = date(year, month, day)
+        except ValueError:
+            continue
+        if d <= limit:
+            return d
+    return None
+
+
+def parse_date_without_year(date_str: str, today: date | None = None):
+    """
+    Принимает строку вида '5.12' или '05.12', возвращает date с годом.
+    Если дата получается в будущем — считаем, что это прошлый год.
+    """
+    dm = parse_day_month(date_str)
+    if not dm:
+        return None
+
+    day, month = dm
+    return _latest_date_not_after(day, month, today or date.today())
+
+
+def parse_set_line(line: str):
+    """
+    '8x10' -> (8.0, 10), 'x10' -> (0.0, 10), '12,5х8' -> (12.5, 8).
+    Для строк не в формате весxповторы — None.
+    """
+    s = line.strip().lower().replace("х", "x").replace(",", ".")
+    weight_str, sep, reps_str = s.rpartition("x")
+    if not sep or not reps_str.isdigit():
+        return None
+
+    weight_str = weight_str.strip()
+    if weight_str in ("", "-"):
+        weight = 0.0
+    else:
+        try:
+            weight = float(weight_str)
+        except ValueError:
+            return None
+    return weight, int(reps_str)
+
+
+def split_cell(text: str) -> list[str]:
+    return [ln.strip() for ln in text.split("\n") if ln.strip()]
+
+
+def normalize_exercise_name(name: str) -> str:
+    """
+    Ключ упражнения: без пробелов по краям, без префикса '-', в нижнем регистре.
+    """
+    return name.strip().lstrip("-").strip().lower()
+
+
+# -----------------------------
+# Колоночное хранилище
+# -----------------------------
+class WorkoutHistory:
+    """
+    История подходов одного атлета в виде параллельных массивов.
+
+    Одна позиция во всех колонках = один подход:
+        dates        — date.toordinal() дня тренировки
+        exercise_ids — индекс в names
+        columns      — номер колонки ячейки в таблице (1-based)
+        set_indexes  — номер подхода внутри ячейки (с 0)
+        weights      — вес (0 для подходов без веса)
+        reps         — повторы
+
+    version меняется при каждом изменении — по нему кэшируется аналитика.
+    """
+
+    __slots__ = (
+        "names",
+        "inactive",
+        "dates",
+        "exercise_ids",
+        "columns",
+        "set_indexes",
+        "weights",
+        "reps",
+        "version",
+        "_ids",
+    )
+
+    def __init__(self):
+        self.names: list[str] = []
+        self.inactive = bytearray()
+        self.dates = array("l")
+        self.exercise_ids = array("I")
+        self.columns = array("H")
+        self.set_indexes = array("H")
+        self.weights = array("d")
+        self.reps = array("H")
+        self.version = 0
+        self._ids: dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.dates)
+
+    # --- упражнения
+    def exercise_id(self, name: str, create: bool = False):
+        key = normalize_exercise_name(name)
+        ex_id = self._ids.get(key)
+        if ex_id is None and create:
+            ex_id = len(self.names)
+            self._ids[key] = ex_id
+            self.names.append(sys.intern(name.strip().lstrip("-").strip()))
+            self.inactive.append(1 if name.strip().startswith("-") else 0)
+        return ex_id
+
+    def touch(self):
+        """
+        Выдать новую version (например, после получения истории из пула процессов:
+        счётчик версий у каждого процесса свой).
+        """
+        self.version = next(_VERSIONS)
+
+    def set_active(self, name: str, active: bool):
+        ex_id = self.exercise_id(name)
+        if ex_id is None:
+            return
+        self.inactive[ex_id] = 0 if active else 1
+        self.touch()
+
+    def active_exercises(self) -> list[str]:
+        return [n for i, n in enumerate(self.names) if not self.inactive[i]]
+
+    # --- добавление данных
+    def _append_sets(self, ex_id: int, column: int, day: date, sets) -> int:
+        ordinal = day.toordinal()
+        for set_idx, (weight, reps) in enumerate(sets):
+            self.dates.append(ordinal)
+            self.exercise_ids.append(ex_id)
+            self.columns.append(column)
+            self.set_indexes.append(set_idx)
+            self.weights.append(weight)
+            self.reps.append(reps)
+        return len(sets)
+
+    def append_cell(
+        self,
+        exercise_name: str,
+        column: int,
+        lines: list[str],
+        today: date | None = None,
+    ) -> int:
+        """
+        Дописать одну только что записанную ячейку (дата + подходы).
+        Возвращает количество добавленных подходов.
+        """
+        if not lines:
+            return 0
+        day = parse_date_without_year(lines[0], today)
+        if day is None:
+            return 0
+
+        sets = [s for s in map(parse_set_line, lines[1:]) if s]
+        ex_id = self.exercise_id(exercise_name, create=True)
+        added = self._append_sets(ex_id, column, day, sets)
+        self.touch()
+        return added
+
+    def add_grid(
+        self,
+        values: list[list[str]],
+        today: date | None = None,
+        archived: bool = False,
+    ):
+        """
+        Дописать подходы из листа (как из ws.get_all_values()) за один проход.
+        archived=True — лист архива: упражнения, которых нет в живом листе,
+        считаются неактуальными; признак актуальности задаёт живой лист.
+        """
+        for row in values:
+            name = row[0].strip() if row else ""
+            if not name:
+                continue
+            known = len(self.names)
+            ex_id = self.exercise_id(name, create=True)
+            if archived:
+                if ex_id >= known:
+                    self.inactive[ex_id] = 1
+            else:
+                self.inactive[ex_id] = 1 if name.startswith("-") else 0
+
+            for col, d, set_lines in dated_cells(row, today):
+                sets = [s for s in map(parse_set_line, set_lines) if s]
+                self._append_sets(ex_id, col, d, sets)
+
+        self.touch()
+
+
+def dated_cells(row: list[str], today: date | None = None):
+    """
+    Ячейки тренировок строки с восстановленным годом:
+    [(col, date, строки подходов), ...] слева направо.
+    """
+    cells = []
+    for col, text in enumerate(row[1:], start=2):
+        if not text.strip():
+            continue
+        lines = split_cell(text)
+        dm = parse_day_month(lines[0])
+        if dm:
+            cells.append((col, dm, lines[1:]))
+
+    # Год в ячейках не пишется: идём справа налево от сегодняшнего дня,
+    # ячейки в строке идут по времени.
+    days = [None] * len(cells)
+    next_day = None
+    for i in range(len(cells) - 1, -1, -1):
+        day_, month = cells[i][1]
+        d = _latest_date_not_after(day_, month, next_day or today or date.today())
+        if d is not None:
+            days[i] = next_day = d
+
+    return [
+        (col, d, set_lines)
+        for (col, _, set_lines), d in zip(cells, days)
+        if d is not None
+    ]
+
+
+def parse_grids(archives: list[tuple], values: list[list[str]]) -> WorkoutHistory:
+    """
+    Архив + живой лист одной историей. archives — [(год, значения листа), ...]
+    по возрастанию года: годы ячеек архива восстанавливаются от конца его года.
+    """
+    history = WorkoutHistory()
+    today = date.today()
+    for year, archive_values in archives:
+        history.add_grid(archive_values, min(date(year, 12, 31), today), archived=True)
+    history.add_grid(values, today)
+    return history
+
+
+# -----------------------------
+# Самые старые упражнения
+# -----------------------------
+def oldest_exercises_from_grid(
+    values: list[list[str]], limit: int, today: date | None = None
+):
+    """
+    Возвращает список из limit элементов вида:
+        (exercise_name, lines)
+    отсортированный по дате последней ячейки — от самой старой.
+
+    Упражнения, у которых название в столбце A начинается с '-', игнорируются.
+    """
+    items = []
+
+    for row in values:
+        exercise_name = (row[0].strip() if row else "")
+        if not exercise_name:
+            continue
+
+        # Игнорируем неактуальные упражнения
+        if exercise_name.startswith("-"):
+            continue
+
+        # последняя непустая ячейка в строке (кроме A)
+        last_text = ""
+        for val in reversed(row[1:]):
+            if val.strip():
+                last_text = val
+                break
+
+        if not last_text:
+            continue
+
+        lines = split_cell(last_text)
+        if not lines:
+            continue
+
+        d = parse_date_without_year(lines[0], today)
+        if not d:
+            continue
+
+        items.append((d, exercise_name, lines))
+
+    items.sort(key=lambda x: x[0])
+    return [(name, lines) for _, name, lines in items[:limit]]